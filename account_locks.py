@@ -0,0 +1,86 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+class LockManager:
+    """Per-key locks (accounts, transaction IDs) created on demand and dropped when unused.
+
+    `hold` acquires all requested keys in sorted order, so two payments touching the
+    same pair of accounts in opposite directions can never deadlock, while payments
+    on disjoint keys never contend.
+    """
+
+    def __init__(self):
+        self.guard = threading.Lock()
+        self.locks = {}  # key -> [lock, holders + waiters]
+
+    def _acquire(self, key):
+        with self.guard:
+            entry = self.locks.get(key)
+            if entry is None:
+                entry = self.locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        entry[0].acquire()
+
+    def _release(self, key):
+        with self.guard:
+            entry = self.locks[key]
+            entry[0].release()
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.locks[key]
+
+    @contextmanager
+    def hold(self, *keys):
+        """Locks every key for the duration of the `with` block."""
+        ordered = sorted(set(keys))
+        acquired = []
+        try:
+            for key in ordered:
+                self._acquire(key)
+                acquired.append(key)
+            yield
+        finally:
+            for key in reversed(acquired):
+                self._release(key)
+
+class AsyncLockManager:
+    """asyncio counterpart of LockManager for the grpc.aio gateway (single event loop)."""
+
+    def __init__(self):
+        self.locks = {}  # key -> [asyncio.Lock, holders + waiters]
+
+    async def _acquire(self, key):
+        entry = self.locks.get(key)
+        if entry is None:
+            entry = self.locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            await entry[0].acquire()
+        except BaseException:
+            self._drop(key)  # Cancelled while waiting
+            raise
+
+    def _drop(self, key):
+        entry = self.locks[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self.locks[key]
+
+    def _release(self, key):
+        self.locks[key][0].release()
+        self._drop(key)
+
+    @asynccontextmanager
+    async def hold(self, *keys):
+        """Locks every key, in sorted order, for the duration of the `async with` block."""
+        ordered = sorted(set(keys))
+        acquired = []
+        try:
+            for key in ordered:
+                await self._acquire(key)
+                acquired.append(key)
+            yield
+        finally:
+            for key in reversed(acquired):
+                self._release(key)
@@ -1,19 +1,46 @@
 import grpc
-import time
+import logging
+import os
+import threading
 import uuid
 from concurrent import futures
 import payment_pb2
 import payment_pb2_grpc
-from utils import load_users, generate_token, verify_token
+from utils import LOG_DIR, load_bank_users, generate_token
+from channel_pool import SERVER_OPTIONS
+from fault_injection import FaultInjector
+from metrics import serve_metrics
+from server_logging import configure_logging
+from interceptors import CallInterceptor, authenticated_user
+from participant_log import ALREADY_ABORTED, ALREADY_COMMITTED, COMMITTED, NOT_COMMITTED, NOT_IN_DOUBT, PREPARED, ParticipantLog
+
+log = logging.getLogger(__name__)
 
 TWO_PC_TIMEOUT = 5  # Timeout in seconds for the prepare phase
+PREPARE_EXPIRED = "Prepare deadline exceeded"
 
 class BankService(payment_pb2_grpc.BankServiceServicer):
-    def __init__(self, bank_name):
-        """Initialize the bank server with user accounts."""
+    def __init__(self, bank_name, faults=None):
+        """Initialize the bank server with its own user accounts."""
         self.bank_name = bank_name
-        self.users = load_users()
-        self.transactions = {}
+        self.users = load_bank_users(bank_name)  # ✅ Only this bank's shard; memory scales with its customers
+        self.held = {}  # username -> funds reserved by prepared (not yet committed) payments
+        self.lock = threading.Lock()  # Serializes state checks and balance updates across RPC threads
+        self.faults = faults or FaultInjector()  # ✅ No simulated delay or failures by default
+
+        # ♻️ Recover in-doubt 2PC transactions and balance changes from the participant log
+        self.participant_log = ParticipantLog(os.path.join(LOG_DIR, f"{bank_name}.participant.log"))
+        in_doubt = self.participant_log.recover()
+        for username, balance in self.participant_log.balances.items():
+            if username in self.users:
+                self.users[username]["balance"] = balance
+        for transaction_id, state in in_doubt.items():
+            transaction = self.participant_log.get(transaction_id)
+            if state == PREPARED and transaction["sender"] in self.users:
+                self._hold(transaction["sender"], transaction["amount"])
+        stats = self.participant_log.recovery_stats
+        log.info("♻️ %s recovered %d in-doubt transactions from %d log records in %.1f ms", bank_name, len(in_doubt),
+                 stats["records"], stats["seconds"] * 1000)
 
     def AuthenticateClient(self, request, context):
         """Authenticates a client and returns a JWT token."""
@@ -27,7 +54,7 @@ class BankService(payment_pb2_grpc.BankServiceServicer):
 
     def ViewBalance(self, request, context):
         """Returns the account balance of a verified user."""
-        username = verify_token(request.token)
+        username = authenticated_user(request.token)
         if not username or username not in self.users:
             return payment_pb2.BalanceResponse(balance=-1)
         return payment_pb2.BalanceResponse(balance=self.users[username]["balance"])
@@ -35,70 +62,181 @@ class BankService(payment_pb2_grpc.BankServiceServicer):
   
     def PrepareTransaction(self, request, context):
         """Phase 1: Prepare - Check if the transaction can be processed."""
+        self.faults.before_call("PrepareTransaction", context)
+        if self._expired(context):
+            return payment_pb2.PrepareResponse(success=False, message=PREPARE_EXPIRED)
+        return self._prepare(request)
+
+    def _expired(self, context):
+        """True if the caller gave up (cancelled, or its deadline passed) while this call was delayed."""
+        remaining = context.time_remaining()
+        return not context.is_active() or (remaining is not None and remaining <= 0)
+
+    def _prepare(self, request, wait=True):
         transaction_id = request.transaction_id
         amount = request.amount
 
-        # Simulate timeout if the bank is unresponsive
-        time.sleep(1)  # Simulating delay (remove or modify for testing)
+        if self.faults.should_fail("PrepareTransaction"):
+            return payment_pb2.PrepareResponse(success=False, message="Simulated prepare failure")
+
+        with self.lock:
+            if self.participant_log.state(transaction_id) is not None:
+                return payment_pb2.PrepareResponse(success=True, message="Transaction already prepared")
+            # ✅ A prepare that lost the race with its abort must not hold funds nobody will release
+            if self.participant_log.was_aborted(transaction_id):
+                return payment_pb2.PrepareResponse(success=False, message=ALREADY_ABORTED)
 
-        if transaction_id in self.transactions:
-            return payment_pb2.PrepareResponse(success=True, message="Transaction already prepared")
+            # ✅ The sender's bank reserves the funds, so concurrent prepares can't overdraw the account
+            if request.sender in self.users:
+                if self.users[request.sender]["balance"] - self.held.get(request.sender, 0) < amount:
+                    return payment_pb2.PrepareResponse(success=False, message="Insufficient funds")
+                self._hold(request.sender, amount)
 
-        if request.sender in self.users:
-            if self.users[request.sender]["balance"] < amount:
-                return payment_pb2.PrepareResponse(success=False, message="Insufficient funds")
+            seq = self.participant_log.prepare(transaction_id, request.sender, request.receiver, amount, wait=False)
 
-        self.transactions[transaction_id] = "PREPARED"
+        # ✅ A YES vote must survive a crash; concurrent votes share one fsync
+        if wait:
+            self.participant_log.wait_durable(seq)
         return payment_pb2.PrepareResponse(success=True, message="Transaction prepared")
 
+    def _hold(self, username, amount):
+        self.held[username] = self.held.get(username, 0) + amount
+
+    def _release(self, username, amount):
+        self.held[username] -= amount
+        if self.held[username] <= 1e-9:  # Ignore float residue
+            del self.held[username]
+
     def CommitTransaction(self, request, context):
         """Phase 2: Commit - Finalize the transaction if all participants agreed."""
+        self.faults.before_call("CommitTransaction", context)
+        return self._commit(request)
+
+    def _commit(self, request, wait=True):
         transaction_id = request.transaction_id
 
-        if transaction_id not in self.transactions or self.transactions[transaction_id] != "PREPARED":
-            return payment_pb2.CommitResponse(success=False, message="Transaction not prepared or already committed")
+        if self.faults.should_fail("CommitTransaction"):
+            return payment_pb2.CommitResponse(success=False, message="Simulated commit failure")
 
-        # Deduct from sender or add to receiver based on transaction type
-        self.transactions[transaction_id] = "COMMITTED"
-      
+        with self.lock:
+            transaction = self.participant_log.get(transaction_id)
+            if transaction is None:
+                return payment_pb2.CommitResponse(success=False, message=NOT_IN_DOUBT)
+            if transaction["state"] != PREPARED:
+                return payment_pb2.CommitResponse(success=False, message=ALREADY_COMMITTED)
+
+            # ✅ The sender's bank debits the reserved funds in the same record as the commit
+            sender, balance = transaction["sender"], None
+            if sender in self.users:
+                self._release(sender, transaction["amount"])
+                self.users[sender]["balance"] -= transaction["amount"]
+                balance = self.users[sender]["balance"]
+            else:
+                sender = None
+
+            # Only the receiver's bank has work left (the interbank credit)
+            if transaction["receiver"] in self.users:
+                seq = self.participant_log.commit(transaction_id, sender, balance, wait=False)
+            else:
+                seq = self.participant_log.done(transaction_id, sender, balance, wait=False)
+
+        if wait:
+            self.participant_log.wait_durable(seq)
         return payment_pb2.CommitResponse(success=True, message="Transaction committed")
 
     def AbortTransaction(self, request, context):
         """Rollback - Abort the transaction and revert any changes."""
+        self.faults.before_call("AbortTransaction", context)
+        return self._abort(request)
+
+    def _abort(self, request):
         transaction_id = request.transaction_id
 
-        if transaction_id in self.transactions:
-            del self.transactions[transaction_id]  # Remove prepared transaction
+        with self.lock:
+            transaction = self.participant_log.get(transaction_id)
+            if transaction is None or transaction["state"] == PREPARED:
+                if transaction is not None and transaction["sender"] in self.users:
+                    self._release(transaction["sender"], transaction["amount"])
+                # Forget the prepared transaction, but leave a tombstone in case its prepare is still on the way
+                self.participant_log.abort(transaction_id)
         return payment_pb2.AbortResponse(success=True, message="Transaction aborted")
 
     def InterbankTransfer(self, request, context):
         """Handles interbank fund transfers, ensuring idempotency."""
+        self.faults.before_call("InterbankTransfer", context)
+        return self._interbank_transfer(request)
+
+    def _interbank_transfer(self, request, wait=True):
         sender = request.sender
         receiver = request.receiver
         amount = request.amount
         transaction_id = request.transaction_id
 
-        print(f"🏦 {self.bank_name} received interbank transfer request: {sender} -> {receiver} (${amount})")
+        log.debug("🏦 %s received interbank transfer request: %s -> %s ($%s)", self.bank_name, sender, receiver, amount)
 
       
+        if self.faults.should_fail("InterbankTransfer"):
+            return payment_pb2.BankTransferResponse(success=False, message="Simulated transfer failure", transaction_id=transaction_id)
+
         # Validate the receiver exists
         if receiver not in self.users:
-            print(f"❌ ERROR: Receiver {receiver} not found in {self.bank_name}'s users!")
+            log.error("❌ Receiver %s not found in %s's users!", receiver, self.bank_name)
             return payment_pb2.BankTransferResponse(success=False, message="Invalid recipient", transaction_id=transaction_id)
 
-        print(f"✅ Before Transfer: {receiver}'s balance = ${self.users[receiver]['balance']}")
+        with self.lock:
+            # Crediting only committed transactions makes retried transfers harmless
+            state = self.participant_log.state(transaction_id)
+            if state != COMMITTED:
+                return payment_pb2.BankTransferResponse(success=False, message=NOT_IN_DOUBT if state is None else NOT_COMMITTED,
+                                                        transaction_id=transaction_id)
+
+            log.debug("✅ Before Transfer: %s's balance = $%s", receiver, self.users[receiver]["balance"])
+
+            # ✅ Ensure the funds are credited to the receiver
+            self.users[receiver]["balance"] += amount
+            seq = self.participant_log.credit(transaction_id, receiver, self.users[receiver]["balance"], wait=False)
 
-        # ✅ Ensure the funds are credited to the receiver
-        self.users[receiver]["balance"] += amount
+            log.debug("✅ After Transfer: %s's balance = $%s", receiver, self.users[receiver]["balance"])
 
-        print(f"✅ After Transfer: {receiver}'s balance = ${self.users[receiver]['balance']}")
-        self.transactions[transaction_id] = "COMPLETED"
+        if wait:
+            self.participant_log.wait_durable(seq)
 
         return payment_pb2.BankTransferResponse(success=True, message="Interbank transfer successful", transaction_id=transaction_id)
 
-def serve(bank_name, port):
-    """Starts the gRPC bank server with SSL/TLS."""
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    def PrepareTransactionBatch(self, request, context):
+        """Batched Phase 1: one round trip (and one simulated delay) for many transactions."""
+        self.faults.before_call("PrepareTransaction", context)
+        if self._expired(context):
+            return payment_pb2.PrepareBatchResponse(responses=[
+                payment_pb2.PrepareResponse(success=False, message=PREPARE_EXPIRED) for _ in request.requests])
+        responses = [self._prepare(r, wait=False) for r in request.requests]
+        self.participant_log.sync()  # One fsync for the whole batch
+        return payment_pb2.PrepareBatchResponse(responses=responses)
+
+    def CommitTransactionBatch(self, request, context):
+        """Batched Phase 2."""
+        self.faults.before_call("CommitTransaction", context)
+        responses = [self._commit(r, wait=False) for r in request.requests]
+        self.participant_log.sync()
+        return payment_pb2.CommitBatchResponse(responses=responses)
+
+    def AbortTransactionBatch(self, request, context):
+        """Batched rollback."""
+        self.faults.before_call("AbortTransaction", context)
+        return payment_pb2.AbortBatchResponse(responses=[self._abort(r) for r in request.requests])
+
+    def InterbankTransferBatch(self, request, context):
+        """Batched interbank credits."""
+        self.faults.before_call("InterbankTransfer", context)
+        responses = [self._interbank_transfer(r, wait=False) for r in request.requests]
+        self.participant_log.sync()
+        return payment_pb2.BankTransferBatchResponse(responses=responses)
+
+def serve(bank_name, port, faults=None, metrics_port=0):
+    """Starts the gRPC bank server with SSL/TLS (and a /metrics endpoint if `metrics_port` is set)."""
+    configure_logging()
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10), options=SERVER_OPTIONS,
+                         interceptors=[CallInterceptor()])
 
     # Load TLS credentials
     with open("server.crt", "rb") as f:
@@ -112,21 +250,32 @@ def serve(bank_name, port):
     credentials = grpc.ssl_server_credentials([(server_key, server_cert)], root_certificates=ca_cert)
 
     # Add BankService
-    payment_pb2_grpc.add_BankServiceServicer_to_server(BankService(bank_name), server)
+    payment_pb2_grpc.add_BankServiceServicer_to_server(BankService(bank_name, faults), server)
 
     # Use secure port
     server.add_secure_port(f"[::]:{port}", credentials)
     server.start()
-    print(f"🏦 {bank_name} Server running securely on port {port}...")
+    log.info("🏦 %s Server running securely on port %d...", bank_name, port)
+    serve_metrics(metrics_port)
     server.wait_for_termination()
 
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) != 3:
-        print("Usage: python bank_server.py <BANK_NAME> <PORT>")
-        sys.exit(1)
-
-    bank_name = sys.argv[1]
-    port = int(sys.argv[2])
-    serve(bank_name, port)
+    import argparse
+    parser = argparse.ArgumentParser(description="Run a bank server", epilog="Fault options default to the STRIFE_BANK_* environment variables.")
+    parser.add_argument("bank_name")
+    parser.add_argument("port", type=int)
+    parser.add_argument("--latency", help="simulated latency per RPC in ms, e.g. 20, uniform:5:50, exp:10, lognormal:10:0.5")
+    parser.add_argument("--drop-rate", type=float, help="fraction of RPCs aborted with UNAVAILABLE")
+    parser.add_argument("--fail-rate", type=float, help="fraction of prepares/commits/transfers answered with failure")
+    parser.add_argument("--fault-methods", help="comma-separated RPCs to affect (default: all)")
+    parser.add_argument("--fault-seed", type=int, help="seed for reproducible fault sequences")
+    parser.add_argument("--metrics-port", type=int, default=0, help="serve Prometheus metrics on this local port")
+    args = parser.parse_args()
+
+    faults = FaultInjector.from_env(latency=args.latency, drop_rate=args.drop_rate, fail_rate=args.fail_rate,
+                                    methods=args.fault_methods.split(",") if args.fault_methods else None,
+                                    seed=args.fault_seed)
+    configure_logging()
+    log.info("🧪 %s fault injection: %s", args.bank_name, faults)
+    serve(args.bank_name, args.port, faults, args.metrics_port)
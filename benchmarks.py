@@ -0,0 +1,998 @@
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent import futures
+from datetime import datetime, timedelta
+
+import grpc
+import jwt
+from google.protobuf import empty_pb2
+
+import payment_pb2
+from coordinator_log import CoordinatorLog
+from gateway_connection import GATEWAY_ADDRESS, GatewayConnection, load_credentials
+from idempotency_store import IdempotencyStore
+from metrics import Counter, Gauge, Histogram, Registry
+from log_writer import DURABILITY_MODES, TransactionLogWriter
+from participant_log import ParticipantLog
+from pending_payments import PendingPaymentQueue
+from server_logging import configure_logging, stop_logging
+from token_cache import TokenCache
+from transaction_id_check import ReplayIndex
+from transaction_id_generator import BLOCK_SIZE, TransactionIDGenerator
+
+def _write_synthetic_log(path, count):
+    """Writes `count` log entries in the format produced by `log_transaction`."""
+    template = {
+        "timestamp": "2025-03-17 19:40:54",
+        "username": "alice",
+        "receiver": "karun",
+        "sender_ip": "127.0.0.1",
+        "transaction_type": "interbank_transfer",
+        "amount": 10.0,
+        "sender_bank": "BankA",
+        "receiver_bank": "BankB",
+    }
+    with open(path, "w") as f:
+        batch = []
+        for i in range(count):
+            entry = dict(template, transaction_id=str(i), status="SUCCESS" if i % 2 == 0 else "FAILED: Insufficient Funds")
+            batch.append(json.dumps(entry) + "\n")
+            if len(batch) >= 10000:
+                f.writelines(batch)
+                batch.clear()
+        f.writelines(batch)
+
+def bench_replay(sizes, lookups):
+    """Measures replay-check latency as the transaction log grows."""
+    print(f"{'entries':>10} {'build (s)':>10} {'reload (s)':>11} {'lookup (us)':>12} {'old scan (us)':>14}")
+    for count in sizes:
+        workdir = tempfile.mkdtemp(prefix="replay_bench_")
+        try:
+            log_file = os.path.join(workdir, "transactions.log")
+            index_file = os.path.join(workdir, "replay.idx")
+            _write_synthetic_log(log_file, count)
+
+            start = time.perf_counter()
+            index = ReplayIndex(log_file, index_file)
+            index.catch_up()
+            build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            index = ReplayIndex(log_file, index_file)
+            index.catch_up()
+            reload = time.perf_counter() - start
+
+            ids = [str(random.randrange(count * 2)) for _ in range(lookups)]
+            start = time.perf_counter()
+            for transaction_id in ids:
+                transaction_id in index
+            lookup = (time.perf_counter() - start) / lookups * 1e6
+
+            # A single full scan is what every ProcessPayment used to pay
+            start = time.perf_counter()
+            with open(log_file, "r") as f:
+                for line in f:
+                    json.loads(line)
+            scan = (time.perf_counter() - start) * 1e6
+
+            print(f"{count:>10} {build:>10.3f} {reload:>11.3f} {lookup:>12.2f} {scan:>14.0f}")
+        finally:
+            shutil.rmtree(workdir)
+
+def bench_participant(sizes, in_doubt, accounts):
+    """Measures bank recovery time vs. the number of 2PC transactions the participant log has seen."""
+    print(f"{'history':>10} {'write (us)':>11} {'records':>9} {'recover (s)':>12} {'no compaction (s)':>18}")
+    for count in sizes:
+        workdir = tempfile.mkdtemp(prefix="participant_bench_")
+        try:
+            results = []
+            for compact_after in (None, float("inf")):
+                log_file = os.path.join(workdir, f"bank{len(results)}.log")
+                log = ParticipantLog(log_file, durable=False, **({"compact_after": compact_after} if compact_after else {}))
+                log.recover()
+
+                start = time.perf_counter()
+                for i in range(count):
+                    # Receiver's bank: prepare, commit, credit; the last `in_doubt` stay prepared
+                    transaction_id = str(i)
+                    log.prepare(transaction_id, "alice", f"user{i % accounts}", 1.0)
+                    if i < count - in_doubt:
+                        log.commit(transaction_id)
+                        log.credit(transaction_id, f"user{i % accounts}", 100.0 + i // accounts)
+                write = (time.perf_counter() - start) / count * 1e6
+                log.sync()
+
+                recovered = ParticipantLog(log_file)
+                assert len(recovered.recover()) == min(in_doubt, count)
+                results.append((write, recovered.recovery_stats))
+
+            (write, stats), (_, uncompacted) = results
+            print(f"{count:>10} {write:>11.1f} {stats['records']:>9} {stats['seconds']:>12.3f} {uncompacted['seconds']:>18.3f}")
+        finally:
+            shutil.rmtree(workdir)
+
+def _legacy_log_write(log_file, entry):
+    """The original log_transaction I/O: open, append one line, close, pretty-print."""
+    with open(log_file, "a") as file:
+        file.write(json.dumps(entry) + "\n")
+    print(json.dumps(entry, indent=4))
+
+def bench_pending(sizes, operations):
+    """Compares enqueue + acknowledge cost of rewriting pending_payments.json with the per-user journal."""
+    print(f"{'queued':>10} {'rewrite (us)':>13} {'journal (us)':>13}")
+    for count in sizes:
+        workdir = tempfile.mkdtemp(prefix="pending_bench_")
+        try:
+            # Everyone else's queued payments, spread over 1000 users
+            queued = defaultdict(list)
+            for i in range(count):
+                queued[f"user{i % 1000}"].append({"receiver": "bob", "amount": 1.0, "transaction_id": str(i)})
+
+            legacy_file = os.path.join(workdir, "pending_payments.json")
+            with open(legacy_file, "w") as f:
+                json.dump(queued, f, indent=4)
+
+            # What every save_pending_payment / remove_successful_payments used to do
+            rewrites = max(1, min(operations, 2000000 // count))
+            start = time.perf_counter()
+            for _ in range(rewrites):
+                with open(legacy_file, "r") as f:
+                    pending = json.load(f)
+                with open(legacy_file, "w") as f:
+                    json.dump(pending, f, indent=4)
+            rewrite = (time.perf_counter() - start) / rewrites * 1e6
+
+            queue = PendingPaymentQueue(os.path.join(workdir, "pending"), legacy_file)
+            start = time.perf_counter()
+            for i in range(operations):
+                queue.enqueue("alice", {"receiver": "bob", "amount": 1.0, "transaction_id": f"a{i}"})
+                queue.acknowledge("alice", [f"a{i}"])
+            journal = (time.perf_counter() - start) / operations * 1e6 / 2
+            assert not queue.pending("alice") and len(queue.pending("user0")) == len(queued["user0"])
+
+            print(f"{count:>10} {rewrite:>13.0f} {journal:>13.1f}")
+        finally:
+            shutil.rmtree(workdir)
+
+def bench_log(entries, threads):
+    """Compares transaction log throughput of the legacy writer with each group-commit mode."""
+    entry = {"timestamp": "2025-03-17 19:40:54", "transaction_id": "424570324907069440", "username": "alice",
+             "receiver": "karun", "sender_ip": "127.0.0.1", "transaction_type": "interbank_transfer",
+             "amount": 10.0, "status": "SUCCESS", "sender_bank": "BankA", "receiver_bank": "BankB"}
+    per_thread = entries // threads
+
+    def run(write, finish=lambda: None):
+        workers = [threading.Thread(target=lambda: [write(entry) for _ in range(per_thread)]) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        finish()  # Count the time until every entry is on disk
+        return time.perf_counter() - start
+
+    print(f"{'writer':>16} {'entries/s':>12} {'writes':>8} {'fsyncs':>8}")
+    workdir = tempfile.mkdtemp(prefix="log_bench_")
+    try:
+        log_file = os.path.join(workdir, "legacy.log")
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            elapsed = run(lambda e: _legacy_log_write(log_file, e))
+        print(f"{'legacy+echo':>16} {per_thread * threads / elapsed:>12.0f} {per_thread * threads:>8} {0:>8}")
+
+        for durability in DURABILITY_MODES:
+            writer = TransactionLogWriter(os.path.join(workdir, f"{durability}.log"), durability=durability)
+            elapsed = run(writer.write, writer.flush)
+            print(f"{durability:>16} {per_thread * threads / elapsed:>12.0f} "
+                  f"{writer.stats['writes']:>8} {writer.stats['fsyncs']:>8}")
+    finally:
+        shutil.rmtree(workdir)
+
+def bench_logging(payments, threads):
+    """Payment-thread cost of the success-path console output: print() against the queued, leveled logger."""
+    entry = {"timestamp": "2025-03-17 19:40:54", "transaction_id": "424570324907069440", "username": "alice",
+             "receiver": "karun", "amount": 10.0, "status": "SUCCESS", "sender_bank": "BankA", "receiver_bank": "BankB"}
+    log = logging.getLogger("bench")
+    per_thread = payments // threads
+
+    def printed():
+        print("⏳ Phase 1: Sending Prepare Request to BankA, BankB...")
+        print("✅ Phase 2: Committing Transaction...")
+        print(f"✅ Payment of ${entry['amount']} to {entry['receiver']} successful!")
+        print(json.dumps(entry, indent=4))
+
+    def logged():
+        log.debug("⏳ Phase 1: Sending Prepare Request to %s...", "BankA, BankB")
+        log.debug("✅ Phase 2: Committing Transaction %s...", entry["transaction_id"])
+        log.debug("✅ Payment of $%s to %s successful!", entry["amount"], entry["receiver"])
+
+    def run(payment):
+        workers = [threading.Thread(target=lambda: [payment() for _ in range(per_thread)]) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return (time.perf_counter() - start) / (per_thread * threads) * 1e6
+
+    workdir = tempfile.mkdtemp(prefix="logging_bench_")
+    try:
+        with open(os.path.join(workdir, "console.out"), "w") as console:
+            with contextlib.redirect_stdout(console):
+                print_us = run(printed)
+            configure_logging(level=logging.INFO, stream=console)
+            info_us = run(logged)
+            logging.getLogger().setLevel(logging.DEBUG)
+            debug_us = run(logged)
+            stop_logging()
+        print(f"payments: {payments}, threads: {threads} (console is a file; a terminal is slower)")
+        print(f"print() per payment:           {print_us:8.2f} us")
+        print(f"logger at INFO per payment:    {info_us:8.2f} us")
+        print(f"logger at DEBUG per payment:   {debug_us:8.2f} us (formatted and written by the listener)")
+    finally:
+        shutil.rmtree(workdir)
+
+def bench_auth(calls):
+    """Compares per-RPC token verification cost with and without the verified-token cache."""
+    secret = "benchmark_secret_key_with_32_bytes!"
+    token = jwt.encode({"username": "alice", "exp": datetime.utcnow() + timedelta(hours=1)}, secret, algorithm="HS256")
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        jwt.decode(token, secret, algorithms=["HS256"])["username"]
+    decode = (time.perf_counter() - start) / calls * 1e6
+
+    cache = TokenCache()
+    payload = jwt.decode(token, secret, algorithms=["HS256"])
+    cache.put(token, payload["username"], payload["exp"])
+    start = time.perf_counter()
+    for _ in range(calls):
+        cache.get(token)
+    cached = (time.perf_counter() - start) / calls * 1e6
+
+    print(f"jwt.decode per RPC: {decode:.2f} us")
+    print(f"cache hit per RPC:  {cached:.2f} us ({cache.stats()['hits']} hits)")
+
+def bench_ids(count, thread_counts):
+    """Compares a lease per ID (a lock per call, as before) with block leasing, and checks uniqueness."""
+    print(f"{'threads':>8} {'block':>6} {'IDs/s':>12} {'borrowed ms':>12} {'throttled':>10} {'unique':>7}")
+    for threads in thread_counts:
+        for block_size in (1, BLOCK_SIZE):
+            generator = TransactionIDGenerator(datacenter_id=0, machine_id=0, block_size=block_size)
+            per_thread = count // threads
+            results = [None] * threads
+
+            def worker(index):
+                generate = generator.generate_transaction_id
+                results[index] = [generate() for _ in range(per_thread)]
+
+            workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+            start = time.perf_counter()
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+            unique = len({transaction_id for ids in results for transaction_id in ids}) == per_thread * threads
+            print(f"{threads:>8} {block_size:>6} {per_thread * threads / elapsed:>12.0f} "
+                  f"{generator.borrowed_millis:>12} {generator.throttled:>10} {str(unique):>7}")
+
+def bench_idempotency(payments, max_size, lookups):
+    """Compares memory and duplicate-lookup cost of the old unbounded response dict with IdempotencyStore."""
+    responses = [(str(i), payment_pb2.PaymentResponse(success=True, message="Payment successful", transaction_id=str(i),
+                                                     receiver="bob", sender_bank="BankA", receiver_bank="BankB"))
+                 for i in range(payments)]
+    workdir = tempfile.mkdtemp(prefix="idempotency_bench_")
+    try:
+        tracemalloc.start()
+        old = {}
+        for transaction_id, response in responses:
+            old[transaction_id] = payment_pb2.PaymentResponse.FromString(response.SerializeToString())
+        old_memory = tracemalloc.get_traced_memory()[0]
+        del old
+        tracemalloc.stop()
+
+        store_file = os.path.join(workdir, "idempotency.db")
+        tracemalloc.start()
+        store = IdempotencyStore(store_file, max_size=max_size)
+        start = time.perf_counter()
+        for transaction_id, response in responses:
+            store.put(transaction_id, response.SerializeToString())
+        put = (time.perf_counter() - start) / payments * 1e6
+        store_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        def lookup(store, ids):
+            start = time.perf_counter()
+            for transaction_id in ids:
+                payment_pb2.PaymentResponse.FromString(store.get(transaction_id))
+            return (time.perf_counter() - start) / len(ids) * 1e6
+
+        recent = [str(payments - 1 - random.randrange(min(max_size, payments))) for _ in range(lookups)]
+        evicted = [str(random.randrange(max(1, payments - max_size))) for _ in range(lookups)]
+        memory_hit = lookup(store, recent)
+        disk_hit = lookup(store, evicted)
+        restarted = lookup(IdempotencyStore(store_file, max_size=max_size), recent)
+
+        print(f"responses: {payments}, memory tier: {max_size}")
+        print(f"old dict memory:    {old_memory / 2**20:8.1f} MiB")
+        print(f"store memory:       {store_memory / 2**20:8.1f} MiB")
+        print(f"put:                {put:8.1f} us")
+        print(f"memory-tier hit:    {memory_hit:8.1f} us")
+        print(f"disk-tier hit:      {disk_hit:8.1f} us")
+        print(f"hit after restart:  {restarted:8.1f} us")
+    finally:
+        shutil.rmtree(workdir)
+
+def bench_metrics(operations, thread_counts):
+    """Per-operation cost of the metrics primitives, what one payment records, and the cost of a scrape."""
+    registry = Registry()
+    histogram = Histogram("bench_latency_seconds", "Benchmark latency.", ("phase",), registry=registry)
+    counter = Counter("bench_total", "Benchmark counter.", ("status",), registry=registry)
+    gauge = Gauge("bench_in_flight", "Benchmark gauge.", registry=registry)
+
+    def timed():
+        with histogram.labels("commit").time():
+            pass
+
+    def in_progress():
+        with gauge.in_progress():
+            pass
+
+    operations_by_name = {
+        "counter inc": lambda: counter.labels("SUCCESS").inc(),
+        "histogram observe": lambda: histogram.labels("prepare").observe(0.003),
+        "histogram timer": timed,
+        "gauge in_progress": in_progress,
+    }
+
+    print(f"{'operation':>18} {'threads':>8} {'ns/op':>8}")
+    cost = {}
+    for name, operation in operations_by_name.items():
+        for threads in thread_counts:
+            per_thread = operations // threads
+
+            def worker():
+                for _ in range(per_thread):
+                    operation()
+
+            workers = [threading.Thread(target=worker) for _ in range(threads)]
+            start = time.perf_counter()
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            ns = (time.perf_counter() - start) / (per_thread * threads) * 1e9
+            cost.setdefault(name, ns)
+            print(f"{name:>18} {threads:>8} {ns:>8.0f}")
+
+    # One interbank ProcessPayment: RPC timer and in-flight gauges, three phase timers, four bank calls, one status
+    per_payment = (cost["histogram timer"] * 4 + cost["gauge in_progress"] * 2 + cost["histogram observe"] * 4
+                   + cost["counter inc"])
+    print(f"instrumentation per payment: {per_payment / 1000:.1f} us")
+
+    for bank in range(8):
+        for method in range(12):
+            histogram.labels(f"BankX{bank}-{method}").observe(0.01)
+    start = time.perf_counter()
+    body = registry.render()
+    print(f"scrape of {body.count(chr(10))} lines: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class _PeerContext:
+    """Stands in for a grpc.ServicerContext when calling servicers in-process."""
+
+    def peer(self):
+        return "ipv4:127.0.0.1:50000"
+
+    def is_active(self):
+        return True
+
+    def time_remaining(self):
+        return None
+
+class _LocalBankMethod:
+    """One BankService RPC served in-process after a fixed delay, callable directly or via `.future()`."""
+
+    executor = futures.ThreadPoolExecutor(max_workers=256)
+
+    def __init__(self, latency, handler):
+        self.latency = latency
+        self.handler = handler
+
+    def __call__(self, request, timeout=None):
+        time.sleep(self.latency)
+        return self.handler(request, _PeerContext())
+
+    def future(self, request, timeout=None):
+        return self.executor.submit(self, request)
+
+class _LocalBankStub:
+    """Calls a BankService directly, in place of a channel to a real bank server."""
+
+    METHODS = ("AuthenticateClient", "ViewBalance", "PrepareTransaction", "CommitTransaction", "AbortTransaction",
+               "InterbankTransfer")
+
+    def __init__(self, service, latency):
+        for name in self.METHODS:
+            setattr(self, name, self._method(latency, getattr(service, name)))
+
+    def _method(self, latency, handler):
+        return _LocalBankMethod(latency, handler)
+
+class _LocalBankPool:
+    """One in-process BankService per bank. Participant logs skip fsync: the gateway is what's measured."""
+
+    stub_type = _LocalBankStub
+
+    def __init__(self, latency, banks=("BankA", "BankB")):
+        from bank_server import BankService  # Imported late for the same reason as utils
+
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            self.services = {bank_name: BankService(bank_name) for bank_name in banks}
+        for service in self.services.values():
+            service.participant_log.durable = False
+        self.stubs = {bank_name: self.stub_type(service, latency) for bank_name, service in self.services.items()}
+
+    def get_stub(self, bank_name):
+        return self.stubs[bank_name]
+
+    def is_healthy(self, bank_name):
+        return True
+
+    def reset(self, bank_name):
+        pass
+
+    def balances(self):
+        """username -> balance, as the banks hold them."""
+        return {username: user["balance"] for service in self.services.values() for username, user in service.users.items()}
+
+    def held(self):
+        """Funds still reserved by prepared payments, across the banks."""
+        return sum(sum(service.held.values()) for service in self.services.values())
+
+class _LocalAsyncBankStub(_LocalBankStub):
+    def _method(self, latency, handler):
+        async def call(request, timeout=None):
+            await asyncio.sleep(latency)
+            return handler(request, _PeerContext())
+        return call
+
+class _LocalAsyncBankPool(_LocalBankPool):
+    stub_type = _LocalAsyncBankStub
+
+def _write_users(usernames, banks=("BankA", "BankB"), balance=1000):
+    """Writes data.json with a synthetic account (password "pw") per username, spread over `banks`."""
+    users = {username: {"password": "pw", "account_no": str(i), "balance": balance, "bank_name": banks[i % len(banks)]}
+             for i, username in enumerate(usernames)}
+    with open("data.json", "w") as f:
+        json.dump(users, f)
+
+@contextlib.contextmanager
+def _gateway_sandbox(accounts=None, files=("ca.crt",), source_dir=REPO_DIR, durable_logs=False):
+    """Runs in a scratch directory with copies of `files` and, unless `accounts` is None, that many accounts.
+
+    Unless `durable_logs`, the transaction log is neither echoed nor fsynced.
+    """
+    workdir = tempfile.mkdtemp(prefix="gateway_bench_")
+    cwd = os.getcwd()
+    if not durable_logs:
+        os.environ.setdefault("STRIFE_LOG_ECHO", "0")
+        os.environ.setdefault("STRIFE_LOG_DURABILITY", "none")
+    try:
+        for name in files:
+            shutil.copy(os.path.join(source_dir, name), workdir)
+        os.chdir(workdir)
+        if accounts is not None:
+            _write_users([f"user{i}" for i in range(accounts)])
+        yield
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+def _coordinator_log():
+    """The sandbox gateway's decision log, without fsync to match STRIFE_LOG_DURABILITY=none."""
+    return CoordinatorLog(os.path.join("logs", "coordinator.log"), durable=False)
+
+def bench_stress(payments, accounts, worker_counts, bank_latency):
+    """Fires concurrent ProcessPayment calls; fails unless every balance matches the payments that succeeded."""
+    with _gateway_sandbox(accounts):
+        # Imported here: utils binds data.json and logs/ relative to the working directory on import
+        from payment_gateway import PaymentGatewayServicer
+        from utils import generate_token
+
+        print(f"{'workers':>8} {'payments/s':>11} {'succeeded':>10} {'balanced':>10}")
+        for workers in worker_counts:
+            banks = _LocalBankPool(bank_latency)
+            gateway = PaymentGatewayServicer(bank_channels=banks, coordinator_log=_coordinator_log())
+            tokens = {username: generate_token(username) for username in gateway.user_banks}
+            before = banks.balances()
+
+            transfers, requests = [], []
+            for i in range(payments):
+                sender, receiver = random.sample(sorted(tokens), 2)
+                transfers.append((sender, receiver, random.randint(1, 50)))
+                requests.append(payment_pb2.PaymentRequest(sender=tokens[sender], receiver=receiver,
+                                                           amount=transfers[-1][2], transaction_id=f"{workers}-{i}"))
+
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+                    start = time.perf_counter()
+                    responses = list(pool.map(lambda r: gateway.ProcessPayment(r, _PeerContext()), requests))
+                    elapsed = time.perf_counter() - start
+
+            # Every account must end up exactly where the successful payments (and only those) put it
+            expected = dict(before)
+            for (sender, receiver, amount), response in zip(transfers, responses):
+                if response.success:
+                    expected[sender] -= amount
+                    expected[receiver] += amount
+            after = banks.balances()
+            wrong = sorted(username for username in expected if abs(after.get(username, 0) - expected[username]) > 1e-6)
+            overdrawn = sorted(username for username, balance in after.items() if balance < 0)
+            held = banks.held()
+            balanced = not wrong and not overdrawn and not held
+            succeeded = sum(response.success for response in responses)
+            print(f"{workers:>8} {payments / elapsed:>11.0f} {succeeded:>10} {str(balanced):>10}")
+            if not balanced:
+                raise SystemExit(f"❌ Balances don't add up with {workers} workers: {len(wrong)} accounts off "
+                                 f"(e.g. {wrong[:3]}), {len(overdrawn)} overdrawn, {held} still held; "
+                                 f"total {sum(before.values())} -> {sum(after.values())}")
+
+def bench_aio(payments, accounts, bank_latency, workers):
+    """Compares in-flight capacity of the threaded gateway with the grpc.aio gateway."""
+    with _gateway_sandbox(accounts):
+        from payment_gateway import PaymentGatewayServicer
+        from payment_gateway_aio import AsyncPaymentGatewayServicer
+        from utils import generate_token
+
+        def make_requests(gateway, prefix):
+            tokens = {username: generate_token(username) for username in gateway.user_banks}
+            requests = []
+            for i in range(payments):
+                sender, receiver = random.sample(sorted(tokens), 2)
+                requests.append(payment_pb2.PaymentRequest(sender=tokens[sender], receiver=receiver, amount=1,
+                                                           transaction_id=f"{prefix}-{i}"))
+            return requests
+
+        print(f"{'gateway':>14} {'payments/s':>11} {'succeeded':>10}")
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            gateway = PaymentGatewayServicer(bank_channels=_LocalBankPool(bank_latency), coordinator_log=_coordinator_log())
+            requests = make_requests(gateway, "threaded")
+            with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+                start = time.perf_counter()
+                responses = list(pool.map(lambda r: gateway.ProcessPayment(r, _PeerContext()), requests))
+                threaded = time.perf_counter() - start
+            threaded_ok = sum(response.success for response in responses)
+
+            async def run_async():
+                gateway = AsyncPaymentGatewayServicer(bank_channels=_LocalAsyncBankPool(bank_latency),
+                                                      coordinator_log=_coordinator_log())
+                requests = make_requests(gateway, "aio")
+                start = time.perf_counter()
+                responses = await asyncio.gather(*(gateway.ProcessPayment(r, _PeerContext()) for r in requests))
+                return time.perf_counter() - start, sum(response.success for response in responses)
+
+            aio, aio_ok = asyncio.run(run_async())
+
+        print(f"{f'threads={workers}':>14} {payments / threaded:>11.0f} {threaded_ok:>10}")
+        print(f"{'grpc.aio':>14} {payments / aio:>11.0f} {aio_ok:>10}")
+
+LOAD_BALANCE = 10**9  # Per synthetic account, so a long run never fails payments for lack of funds
+STARTUP_TIMEOUT = 30  # Seconds for a bank or the gateway to start accepting connections
+
+def _port_in_use(address):
+    host, _, port = address.rpartition(":")
+    with socket.socket() as sock:
+        return sock.connect_ex((host, int(port))) == 0
+
+def _wait_until_serving(address, process, name):
+    """Blocks until `address` accepts a TLS connection; exits with the server's output if it never does."""
+    channel = grpc.secure_channel(address, load_credentials("ca.crt"))
+    try:
+        grpc.channel_ready_future(channel).result(timeout=STARTUP_TIMEOUT)
+    except grpc.FutureTimeoutError:
+        process.kill()
+        with open(f"{name}.out") as f:
+            output = f.read()[-2000:]
+        raise SystemExit(f"❌ {name} did not start serving on {address}:\n{output}")
+    finally:
+        channel.close()
+
+@contextlib.contextmanager
+def _local_cluster(bank_names, gateway_script, bank_args, banks):
+    """Starts bank_server.py for each bank and then the gateway, as subprocesses of the sandbox directory.
+
+    `banks` is the gateway's bank_name -> address map; each server's output goes to <name>.out.
+    """
+    addresses = [banks[bank_name] for bank_name in bank_names] + [GATEWAY_ADDRESS]
+    busy = [address for address in addresses if _port_in_use(address)]
+    if busy:
+        raise SystemExit(f"❌ Already in use: {', '.join(busy)}. Stop the running servers first.")
+
+    processes = []
+    try:
+        for bank_name in bank_names:
+            port = banks[bank_name].rpartition(":")[2]
+            with open(f"{bank_name}.out", "w") as out:
+                processes.append(subprocess.Popen(
+                    [sys.executable, os.path.join(REPO_DIR, "bank_server.py"), bank_name, port, *bank_args],
+                    stdout=out, stderr=subprocess.STDOUT))
+        for bank_name, process in zip(bank_names, processes):
+            _wait_until_serving(banks[bank_name], process, bank_name)
+        with open("gateway.out", "w") as out:
+            processes.append(subprocess.Popen([sys.executable, os.path.join(REPO_DIR, gateway_script)],
+                                              stdout=out, stderr=subprocess.STDOUT))
+        _wait_until_serving(GATEWAY_ADDRESS, processes[-1], "gateway")
+        yield
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+def _parse_mix(mix):
+    """{"payment": 80.0, ...} from "payment=80,balance=15,id=5"."""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in LOAD_OPERATIONS:
+            raise SystemExit(f"❌ Unknown operation {name.strip()!r} in --mix (choose from {', '.join(LOAD_OPERATIONS)})")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+def _pay(stub, accounts, rng, i):
+    sender = rng.randrange(len(accounts))
+    receiver = (sender + rng.randrange(1, len(accounts))) % len(accounts)
+    response = stub.ProcessPayment(payment_pb2.PaymentRequest(sender=accounts[sender][1], receiver=accounts[receiver][0],
+                                                              amount=1, transaction_id=f"load-{i}"), timeout=30)
+    return response.success
+
+def _view_balance(stub, accounts, rng, i):
+    return stub.ViewBalance(payment_pb2.BalanceRequest(token=rng.choice(accounts)[1]), timeout=30).balance >= 0
+
+def _generate_id(stub, accounts, rng, i):
+    return bool(stub.GenerateTransactionID(empty_pb2.Empty(), timeout=30).transaction_id)
+
+LOAD_OPERATIONS = {"payment": _pay, "balance": _view_balance, "id": _generate_id}
+
+def _percentile(latencies, q):
+    """Nearest-rank percentile of a sorted list."""
+    return latencies[max(0, math.ceil(q * len(latencies)) - 1)]
+
+def _drive(schedule, concurrency, seed=None):
+    """Runs operations from `concurrency` threads and returns per-operation latencies, failures and errors.
+
+    schedule(i, rng) returns operation i as (due, measured, name, call), or None once there are no
+    more. A thread sleeps until `due` and then runs `call()`, which returns whether it succeeded.
+    Latency is measured from `due`, not from when a thread got to it, so time spent waiting for a
+    free thread counts and a saturated gateway shows up in the percentiles.
+    """
+    next_index = itertools.count()  # next() on a count is atomic in CPython, so threads can share it
+
+    def worker(number):
+        rng = random.Random(None if seed is None else seed * 1000 + number)
+        latencies = defaultdict(list)
+        failed = defaultdict(int)
+        errors = defaultdict(int)
+        while True:
+            operation = schedule(next(next_index), rng)
+            if operation is None:
+                break
+            due, measured, name, call = operation
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                ok = call()
+            except grpc.RpcError as e:
+                if measured:
+                    errors[(name, e.code().name)] += 1
+                continue
+            if measured:
+                latencies[name].append(time.perf_counter() - due)
+                if not ok:
+                    failed[name] += 1
+        return latencies, failed, errors
+
+    with futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+    latencies, failed, errors = defaultdict(list), defaultdict(int), defaultdict(int)
+    for worker_latencies, worker_failed, worker_errors in results:
+        for name, values in worker_latencies.items():
+            latencies[name].extend(values)
+        for name, count in worker_failed.items():
+            failed[name] += count
+        for key, count in worker_errors.items():
+            errors[key] += count
+    return {name: sorted(values) for name, values in latencies.items()}, failed, errors
+
+def _report(names, latencies, failed, errors, duration, output, config):
+    """Prints count, throughput and latency percentiles per operation and overall; `output` also gets them as JSON."""
+    print(f"{'operation':>21} {'count':>8} {'ops/s':>8} {'failed':>7} {'errors':>7} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'p999 ms':>8} {'max ms':>8}")
+    summary = {}
+    for name in [*names, "all"]:
+        if name == "all":
+            values = sorted(itertools.chain.from_iterable(latencies.values()))
+            name_failed, name_errors = sum(failed.values()), sum(errors.values())
+        else:
+            values = latencies.get(name, [])
+            name_failed = failed[name]
+            name_errors = sum(count for (operation, _), count in errors.items() if operation == name)
+        row = {"count": len(values), "ops_per_second": len(values) / duration, "failed": name_failed,
+               "errors": name_errors}
+        if values:
+            row.update({f"{label}_ms": _percentile(values, q) * 1000
+                        for label, q in (("p50", 0.5), ("p99", 0.99), ("p999", 0.999), ("max", 1.0))})
+            print(f"{name:>21} {row['count']:>8} {row['ops_per_second']:>8.0f} {name_failed:>7} {name_errors:>7} "
+                  f"{row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['p999_ms']:>8.2f} {row['max_ms']:>8.2f}")
+        else:
+            print(f"{name:>21} {0:>8} {0:>8} {name_failed:>7} {name_errors:>7}")
+        summary[name] = row
+    for (name, code), count in sorted(errors.items()):
+        print(f"⚠️ {count} {name} calls failed with {code}")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(dict(config, results=summary), f, indent=2)
+
+@contextlib.contextmanager
+def _logged_in_cluster(usernames, gateway_script, bank_count, bank_args, certs_dir):
+    """Local bank servers and gateway holding an account per username; yields (gateway stub, username -> token)."""
+    server_files = ("ca.crt", "server.crt", "server.key")
+    # Logs stay durable: the servers are measured as configured, STRIFE_* variables included
+    with _gateway_sandbox(files=server_files, source_dir=certs_dir, durable_logs=True):
+        from payment_gateway import BANKS  # Imported here, like the in-process benchmarks, to keep utils out of the repo
+
+        bank_names = sorted(BANKS)[:bank_count]
+        if len(bank_names) < bank_count:
+            raise SystemExit(f"❌ The gateway knows {len(BANKS)} banks; --banks {bank_count} is too many")
+        _write_users(usernames, bank_names, LOAD_BALANCE)
+
+        with _local_cluster(bank_names, gateway_script, bank_args, BANKS):
+            stub = GatewayConnection(ca_cert_file="ca.crt").stub
+
+            def login(username):
+                response = stub.AuthenticateClient(payment_pb2.UserCredentials(username=username, password="pw"),
+                                                   timeout=30)
+                if not response.success:
+                    raise SystemExit(f"❌ Login failed for {username}: {response.token}")
+                return username, response.token
+
+            with futures.ThreadPoolExecutor(max_workers=32) as pool:
+                tokens = dict(pool.map(login, usernames))
+            yield stub, tokens
+
+def bench_load(gateway_script, bank_count, accounts, mix, rate, duration, warmup, concurrency, bank_args, certs_dir,
+               seed, output):
+    """Drives real bank servers and a gateway over TLS with a mix of RPCs; reports throughput and tail latency."""
+    mix = _parse_mix(mix)
+    if accounts < 2:
+        raise SystemExit("❌ Payments need at least 2 accounts")
+    names, weights = list(mix), list(mix.values())
+
+    with _logged_in_cluster([f"user{i}" for i in range(accounts)], gateway_script, bank_count, bank_args,
+                            certs_dir) as (stub, tokens):
+        logged_in = list(tokens.items())
+        start = time.perf_counter() + 0.05
+        measure_from, stop_at = start + warmup, start + warmup + duration
+
+        def schedule(i, rng):
+            # With a target rate, operation i is due in its slot whether or not earlier ones have finished
+            due = start + i / rate if rate else time.perf_counter()
+            if due >= stop_at:
+                return None
+            name = rng.choices(names, weights)[0]
+            return due, due >= measure_from, name, lambda: LOAD_OPERATIONS[name](stub, logged_in, rng, i)
+
+        latencies, failed, errors = _drive(schedule, concurrency, seed)
+
+    print(f"{gateway_script}, {bank_count} banks, {accounts} accounts, {concurrency} threads, "
+          f"target {f'{rate:.0f}/s' if rate else 'max'}, {duration:.0f}s after {warmup:.0f}s warm-up")
+    _report(names, latencies, failed, errors, duration, output,
+            {"gateway": gateway_script, "banks": bank_count, "accounts": accounts, "mix": mix, "rate": rate,
+             "duration": duration, "concurrency": concurrency, "bank_args": bank_args})
+
+# Client calls a trace can hold; anything else (e.g. RegisterClient) is skipped
+REPLAYED_METHODS = ("AuthenticateClient", "GenerateTransactionID", "GenerateTransactionIDs", "ProcessPayment",
+                    "ViewBalance", "ProcessPaymentBatch", "ProcessPaymentStream")
+
+def _replay_call(stub, method, messages, start, speed):
+    """Sends one traced RPC. Returns whether every response succeeded (calls without a success flag always do)."""
+    if method == "ProcessPaymentStream":
+        def paced():
+            for offset, message in messages:  # Each message goes out at its own offset, as it arrived
+                wait = start + offset / speed - time.perf_counter() if speed else 0
+                if wait > 0:
+                    time.sleep(wait)
+                yield message
+        return all(response.success for response in stub.ProcessPaymentStream(paced(), timeout=60))
+    if method == "ProcessPaymentBatch":
+        return all(response.success for response in stub.ProcessPaymentBatch(messages[0][1], timeout=60))
+    response = getattr(stub, method)(messages[0][1], timeout=30)
+    if method == "ViewBalance":
+        return response.balance >= 0  # Banks signal failure with -1 and leave `success` unset
+    return getattr(response, "success", True)
+
+def bench_traffic(trace, speed, concurrency, gateway_script, bank_count, bank_args, certs_dir, output):
+    """Replays a captured trace against local bank servers and a gateway, with its timing scaled by `speed`."""
+    from traffic_capture import read_trace, restore_request, trace_users
+
+    entries = read_trace(trace)
+    if not entries:
+        raise SystemExit(f"❌ {trace} holds no requests")
+    calls, streams, skipped = [], {}, defaultdict(int)  # calls: (offset, method, [(offset, entry)]), oldest first
+    for entry in entries:
+        if entry["method"] not in REPLAYED_METHODS:
+            skipped[entry["method"]] += 1
+            continue
+        offset = entry["t"] - entries[0]["t"]
+        if "call" not in entry:
+            calls.append((offset, entry["method"], [(offset, entry)]))
+        elif entry["call"] in streams:
+            streams[entry["call"]][2].append((offset, entry))
+        else:
+            streams[entry["call"]] = (offset, entry["method"], [(offset, entry)])
+            calls.append(streams[entry["call"]])
+
+    with _logged_in_cluster(sorted(trace_users(entries)), gateway_script, bank_count, bank_args,
+                            certs_dir) as (stub, tokens):
+        # Rebuilt up front, so replaying only sends
+        calls = [(offset, method, [(message_offset, restore_request(message, tokens, "pw"))
+                                   for message_offset, message in messages])
+                 for offset, method, messages in calls]
+        began = time.perf_counter()
+        start = began + 0.05
+
+        def schedule(i, rng):
+            if i >= len(calls):
+                return None
+            offset, method, messages = calls[i]
+            due = start + offset / speed if speed else time.perf_counter()
+            return due, True, method, lambda: _replay_call(stub, method, messages, start, speed)
+
+        latencies, failed, errors = _drive(schedule, concurrency)
+        elapsed = time.perf_counter() - began
+
+    span = entries[-1]["t"] - entries[0]["t"]
+    print(f"{trace}: {len(calls)} calls over {span:.1f}s, replayed {f'at {speed:g}x' if speed else 'at max speed'} "
+          f"in {elapsed:.1f}s on {gateway_script}, {bank_count} banks, {concurrency} threads")
+    for method, count in sorted(skipped.items()):
+        print(f"⏭️ Skipped {count} {method} requests")
+    _report(sorted({method for _, method, _ in calls}), latencies, failed, errors, elapsed, output,
+            {"trace": trace, "speed": speed, "gateway": gateway_script, "banks": bank_count,
+             "concurrency": concurrency, "bank_args": bank_args})
+
+def main():
+    parser = argparse.ArgumentParser(description="Strife micro-benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    replay = subparsers.add_parser("replay", help="replay detection latency vs. log size")
+    replay.add_argument("--sizes", default="1000,10000,100000,1000000",
+                        help="comma-separated log sizes (e.g. add 10000000)")
+    replay.add_argument("--lookups", type=int, default=100000)
+
+    participant = subparsers.add_parser("participant", help="bank participant log recovery time vs. transaction history")
+    participant.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated transaction counts")
+    participant.add_argument("--in-doubt", type=int, default=100, help="transactions left prepared at the crash")
+    participant.add_argument("--accounts", type=int, default=10000, help="distinct receivers credited")
+
+    pending = subparsers.add_parser("pending", help="offline payment queue: whole-file rewrite vs. per-user journal")
+    pending.add_argument("--sizes", default="100,10000,1000000", help="comma-separated counts of other users' queued payments")
+    pending.add_argument("--operations", type=int, default=5000)
+
+    log = subparsers.add_parser("log", help="transaction log throughput: legacy vs. group commit")
+    log.add_argument("--entries", type=int, default=50000)
+    log.add_argument("--threads", type=int, default=10, help="concurrent writers (the gateway has 10 workers)")
+
+    logging_parser = subparsers.add_parser("logging", help="success-path console output: print() vs. the queued logger")
+    logging_parser.add_argument("--payments", type=int, default=20000)
+    logging_parser.add_argument("--threads", type=int, default=10)
+
+    auth = subparsers.add_parser("auth", help="JWT verification cost with and without the token cache")
+    auth.add_argument("--calls", type=int, default=100000)
+
+    ids = subparsers.add_parser("ids", help="transaction ID generation throughput with and without block leasing")
+    ids.add_argument("--count", type=int, default=2000000)
+    ids.add_argument("--threads", default="1,4,16", help="comma-separated thread counts")
+
+    idempotency = subparsers.add_parser("idempotency", help="duplicate-payment response store: memory and lookup cost")
+    idempotency.add_argument("--payments", type=int, default=500000)
+    idempotency.add_argument("--max-size", type=int, default=100000, help="responses kept in memory")
+    idempotency.add_argument("--lookups", type=int, default=20000)
+
+    metrics = subparsers.add_parser("metrics", help="cost of recording latency histograms, counters and gauges")
+    metrics.add_argument("--operations", type=int, default=1000000)
+    metrics.add_argument("--threads", default="1,10", help="comma-separated thread counts")
+
+    stress = subparsers.add_parser("stress", help="concurrent ProcessPayment calls against in-process banks")
+    stress.add_argument("--payments", type=int, default=5000)
+    stress.add_argument("--accounts", type=int, default=1000)
+    stress.add_argument("--workers", default="1,10,50", help="comma-separated worker pool sizes")
+    stress.add_argument("--bank-latency", type=float, default=0.002, help="seconds per simulated bank RPC")
+
+    aio = subparsers.add_parser("aio", help="threaded vs. grpc.aio gateway under many in-flight payments")
+    aio.add_argument("--payments", type=int, default=2000)
+    aio.add_argument("--accounts", type=int, default=10000)
+    aio.add_argument("--bank-latency", type=float, default=0.05, help="seconds per simulated bank RPC")
+    aio.add_argument("--workers", type=int, default=10, help="threaded gateway pool size (serve() uses 10)")
+
+    load = subparsers.add_parser("load", help="end-to-end load on bank servers and a gateway started locally over TLS")
+    load.add_argument("--gateway", default="payment_gateway.py", choices=("payment_gateway.py", "payment_gateway_aio.py"))
+    load.add_argument("--banks", type=int, default=2, help="bank servers to start (BankA, BankB, ...)")
+    load.add_argument("--accounts", type=int, default=1000, help="synthetic accounts, spread over the banks")
+    load.add_argument("--mix", default="payment=80,balance=15,id=5",
+                      help="operation weights: payment (ProcessPayment), balance (ViewBalance), id (GenerateTransactionID)")
+    load.add_argument("--rate", type=float, default=0, help="target operations per second (0: as fast as possible)")
+    load.add_argument("--duration", type=float, default=10, help="seconds measured")
+    load.add_argument("--warmup", type=float, default=2, help="seconds of load before measuring")
+    load.add_argument("--concurrency", type=int, default=32, help="client threads (the most operations in flight)")
+    load.add_argument("--bank-args", default="", help='extra bank_server.py arguments, e.g. --bank-args="--latency 5"')
+    load.add_argument("--certs", default=REPO_DIR, help="directory with ca.crt, server.crt and server.key")
+    load.add_argument("--seed", type=int, help="seed for reproducible operation sequences")
+    load.add_argument("--output", help="also write the results to this JSON file")
+
+    traffic = subparsers.add_parser("traffic", help="replay a trace captured with STRIFE_CAPTURE_FILE on local servers")
+    traffic.add_argument("trace", help="JSON-lines trace written by the gateway")
+    traffic.add_argument("--speed", type=float, default=1.0, help="time scale: 1 as recorded, 2 twice as fast, 0 as fast as possible")
+    traffic.add_argument("--concurrency", type=int, default=64, help="client threads (the most calls in flight)")
+    traffic.add_argument("--gateway", default="payment_gateway.py", choices=("payment_gateway.py", "payment_gateway_aio.py"))
+    traffic.add_argument("--banks", type=int, default=2, help="bank servers to start; traced users are spread over them")
+    traffic.add_argument("--bank-args", default="", help='extra bank_server.py arguments, e.g. --bank-args="--latency 5"')
+    traffic.add_argument("--certs", default=REPO_DIR, help="directory with ca.crt, server.crt and server.key")
+    traffic.add_argument("--output", help="also write the results to this JSON file")
+
+    args = parser.parse_args()
+    if args.benchmark == "replay":
+        bench_replay([int(s) for s in args.sizes.split(",")], args.lookups)
+    elif args.benchmark == "participant":
+        bench_participant([int(s) for s in args.sizes.split(",")], args.in_doubt, args.accounts)
+    elif args.benchmark == "pending":
+        bench_pending([int(s) for s in args.sizes.split(",")], args.operations)
+    elif args.benchmark == "log":
+        bench_log(args.entries, args.threads)
+    elif args.benchmark == "logging":
+        bench_logging(args.payments, args.threads)
+    elif args.benchmark == "auth":
+        bench_auth(args.calls)
+    elif args.benchmark == "ids":
+        bench_ids(args.count, [int(t) for t in args.threads.split(",")])
+    elif args.benchmark == "idempotency":
+        bench_idempotency(args.payments, args.max_size, args.lookups)
+    elif args.benchmark == "metrics":
+        bench_metrics(args.operations, [int(t) for t in args.threads.split(",")])
+    elif args.benchmark == "stress":
+        bench_stress(args.payments, args.accounts, [int(w) for w in args.workers.split(",")], args.bank_latency)
+    elif args.benchmark == "aio":
+        bench_aio(args.payments, args.accounts, args.bank_latency, args.workers)
+    elif args.benchmark == "load":
+        bench_load(args.gateway, args.banks, args.accounts, args.mix, args.rate, args.duration, args.warmup,
+                   args.concurrency, args.bank_args.split(), os.path.abspath(args.certs), args.seed,
+                   args.output and os.path.abspath(args.output))
+    elif args.benchmark == "traffic":
+        bench_traffic(os.path.abspath(args.trace), args.speed, args.concurrency, args.gateway, args.banks,
+                      args.bank_args.split(), os.path.abspath(args.certs), args.output and os.path.abspath(args.output))
+
+if __name__ == "__main__":
+    main()
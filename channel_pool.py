@@ -0,0 +1,127 @@
+import asyncio
+import grpc
+import threading
+import payment_pb2_grpc
+from metrics import BANK_CHANNEL_REQUESTS, BANK_CHANNELS_CREATED
+
+# Keep idle bank connections alive and reconnect quickly after a bank restarts
+CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.initial_reconnect_backoff_ms", 200),
+    ("grpc.max_reconnect_backoff_ms", 5000),
+]
+
+# Seconds a replaced channel stays open for the calls still using it; longer than any bank call's deadline
+CLOSE_GRACE = 10
+
+# Servers accept those keepalive pings on idle connections instead of answering GOAWAY (too_many_pings)
+SERVER_OPTIONS = [
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.min_ping_interval_without_data_ms", 10000),
+]
+
+class BankChannelPool:
+    """Long-lived secure channels to each bank, created once and shared by all requests.
+
+    `interceptor`, if given, is called with a bank name and returns the client
+    interceptor for that bank's channel.
+    """
+
+    def __init__(self, banks, ca_cert_file="ca.crt", options=CHANNEL_OPTIONS, interceptor=None):
+        with open(ca_cert_file, "rb") as f:
+            self.credentials = grpc.ssl_channel_credentials(root_certificates=f.read())
+        self.banks = dict(banks)
+        self.options = options
+        self.interceptor = interceptor
+        self.lock = threading.Lock()
+        self.channels = {}
+        self.stubs = {}
+        self.states = {}
+        # Channel reuse, exported as metrics; children are looked up once so get_stub stays lock-free
+        self.requests = {bank_name: BANK_CHANNEL_REQUESTS.labels(bank_name) for bank_name in self.banks}
+        self.channels_created = {bank_name: BANK_CHANNELS_CREATED.labels(bank_name) for bank_name in self.banks}
+
+        for bank_name in self.banks:
+            self._connect(bank_name)
+
+    def _connect(self, bank_name):
+        """Opens (or re-opens) the channel for a bank. Caller must hold the lock or be in __init__."""
+        channel = grpc.secure_channel(self.banks[bank_name], self.credentials, options=self.options)
+        self.channels[bank_name] = channel
+        if self.interceptor is not None:
+            self.stubs[bank_name] = payment_pb2_grpc.BankServiceStub(grpc.intercept_channel(channel, self.interceptor(bank_name)))
+        else:
+            self.stubs[bank_name] = payment_pb2_grpc.BankServiceStub(channel)
+        channel.subscribe(lambda state: self._on_state_change(bank_name, channel, state), try_to_connect=True)
+        self.channels_created[bank_name].inc()
+
+    def _on_state_change(self, bank_name, channel, state):
+        if self.channels.get(bank_name) is channel:  # Ignore late events from replaced channels
+            self.states[bank_name] = state
+
+    def _state(self, bank_name):
+        return self.states.get(bank_name)
+
+    def get_stub(self, bank_name):
+        """Returns the shared BankService stub for a bank."""
+        self.requests[bank_name].inc()
+        return self.stubs[bank_name]
+
+    def is_healthy(self, bank_name):
+        """False while the bank's channel is failing to (re)connect."""
+        return self._state(bank_name) != grpc.ChannelConnectivity.TRANSIENT_FAILURE
+
+    def reset(self, bank_name):
+        """Replaces a bank's channel, e.g. after the bank came back with a new address or cert.
+
+        New calls get the new channel at once; the old one is closed after CLOSE_GRACE, so
+        calls already in flight on it can finish.
+        """
+        with self.lock:
+            old_channel = self.channels.get(bank_name)
+            self._connect(bank_name)
+        if old_channel is not None:
+            closer = threading.Timer(CLOSE_GRACE, old_channel.close)
+            closer.daemon = True
+            closer.start()
+
+    def close(self):
+        with self.lock:
+            for channel in self.channels.values():
+                channel.close()
+            self.channels.clear()
+            self.stubs.clear()
+
+class AsyncBankChannelPool(BankChannelPool):
+    """grpc.aio flavour of BankChannelPool; create it from inside the running event loop."""
+
+    def _connect(self, bank_name):
+        interceptors = [self.interceptor(bank_name)] if self.interceptor is not None else None
+        channel = grpc.aio.secure_channel(self.banks[bank_name], self.credentials, options=self.options,
+                                          interceptors=interceptors)
+        self.channels[bank_name] = channel
+        self.stubs[bank_name] = payment_pb2_grpc.BankServiceStub(channel)
+        self.channels_created[bank_name].inc()
+        channel.get_state(try_to_connect=True)  # Start the TLS handshake before the first payment
+
+    def _state(self, bank_name):
+        channel = self.channels.get(bank_name)
+        return channel.get_state() if channel is not None else None
+
+    def reset(self, bank_name):
+        with self.lock:
+            old_channel = self.channels.get(bank_name)
+            self._connect(bank_name)
+        if old_channel is not None:
+            asyncio.ensure_future(old_channel.close(grace=CLOSE_GRACE))  # Returns once its calls are done
+
+    async def close(self):
+        with self.lock:
+            channels = list(self.channels.values())
+            self.channels.clear()
+            self.stubs.clear()
+        for channel in channels:
+            await channel.close()
@@ -1,77 +1,28 @@
 import grpc
 import json
 import os
-import time
 import payment_pb2
-import payment_pb2_grpc
-from google.protobuf import empty_pb2  # ✅ Import Empty from protobuf
-import threading
-from pending_payments import save_pending_payment, get_user_pending_payments, remove_successful_payments
+from gateway_connection import get_connection
+from pending_payments import save_pending_payment
+from retry_scheduler import PERMANENT_FAILURES, RetryScheduler
+from transaction_id_pool import TransactionIDPool
+
+# ✅ Secure gRPC connection, shared by the whole process
+def get_secure_channel():
+    """Returns the process's SSL/TLS channel to the gateway (keepalive, retries, cached credentials)."""
+    return get_connection().channel
 
-# ✅ Secure gRPC connection
 def get_secure_stub():
-    """Creates a secure gRPC client connection with SSL/TLS."""
-    with open("ca.crt", "rb") as f:
-        ca_cert = f.read()
-    credentials = grpc.ssl_channel_credentials(root_certificates=ca_cert)
-    channel = grpc.secure_channel("localhost:50051", credentials)
-    return payment_pb2_grpc.PaymentGatewayStub(channel)
-
-# ✅ Generate a new transaction ID
-def generate_transaction_id(stub):
-    """Requests a new transaction ID from the server."""
-    try:
-        response = stub.GenerateTransactionID(empty_pb2.Empty())  
-        return response.transaction_id
-    except grpc.RpcError as e:
-        print(f"❌ Failed to generate Transaction ID: {e.details()}")
-        return None
+    return get_connection().stub
 
 # ✅ Retry pending payments for a specific user
-def retry_pending_payments(stub, token, username):
-    """Retries only the logged-in user's pending payments."""
-    pending_payments = get_user_pending_payments(username)
-    
-    if not pending_payments:
-        print(f"✅ No pending payments for {username}.")
+def retry_pending_payments(scheduler):
+    """Retries the logged-in user's pending payments that are due now (the scheduler also does this in the background)."""
+    succeeded, failed, rejected = scheduler.drain()
+    if not succeeded and not failed and not rejected:
+        print(f"✅ No pending payments due for retry for {scheduler.username}.")
         return
-
-    print(f"🔄 Retrying {len(pending_payments)} pending payments for {username}...")
-
-    successful_transactions = set()  
-
-    for payment_data in pending_payments:
-        transaction_id = payment_data.get("transaction_id")
-
-        if not transaction_id:
-            print(f"⚠️ Missing transaction_id for payment to {payment_data['receiver']}. Generating new one.")
-            transaction_id = generate_transaction_id(stub)
-            if not transaction_id:
-                print("❌ Could not generate transaction ID. Skipping this payment.")
-                continue
-            payment_data["transaction_id"] = transaction_id
-
-        try:
-            payment_response = stub.ProcessPayment(payment_pb2.PaymentRequest(
-                sender=token,
-                receiver=payment_data["receiver"],
-                amount=payment_data["amount"],
-                transaction_id=transaction_id
-            ))
-
-            if payment_response.success:
-                print(f"✅ Payment Successful! (Transaction ID: {payment_response.transaction_id})")
-                successful_transactions.add(transaction_id)
-
-            else:
-                print(f"❌ Payment Failed: {payment_response.message}")
-
-        except grpc.RpcError as e:
-            print(f"❌ gRPC Error: {e.details()}")
-
-    # ✅ Remove successfully processed transactions
-    remove_successful_payments(username, successful_transactions)
-    print("✅ Pending payments retry complete.")
+    print(f"✅ Pending payments retry complete: {succeeded} succeeded, {failed} will be retried, {rejected} rejected.")
 
 # ✅ Check balance before processing payment
 def check_balance(stub, token):
@@ -88,9 +39,17 @@ def check_balance(stub, token):
         print(f"❌ gRPC Error: {e.details()}")
         return None
 
+# ✅ Revoke the session token on logout
+def logout(stub, token):
+    """Revokes the session token at the gateway, so it can't be reused before it expires."""
+    try:
+        stub.Logout(payment_pb2.LogoutRequest(token=token), timeout=5)
+    except grpc.RpcError as e:
+        print(f"⚠️ Could not revoke the session at the gateway: {e.details()}")
+
 # ✅ Process a payment and queue failed transactions
-def process_payment(stub, token, username):
-    """Handles user payments securely with balance checks and offline queuing."""
+def process_payment(stub, token, username, id_pool):
+    """Handles user payments securely with offline queuing; the bank checks funds during prepare."""
     receiver = input("Enter Receiver's Username: ").strip()
     amount = input("Enter Amount: ").strip()
 
@@ -104,18 +63,12 @@ def process_payment(stub, token, username):
         return
 
 
-    # ✅ Generate a unique transaction ID
-    transaction_id = generate_transaction_id(stub)
+    # ✅ Take a unique transaction ID from the local pool (no round trip)
+    transaction_id = id_pool.get()
     if not transaction_id:
         print("❌ Could not generate a Transaction ID. Saving for retry.")
         save_pending_payment(username, {"receiver": receiver, "amount": amount, "transaction_id": None})
         return
-    
-    # ✅ Check user balance before proceeding
-    balance = check_balance(stub, token)
-    if balance is None or balance < amount:
-        print("❌ Error: Insufficient funds. Transaction aborted.")
-        return
 
     print(f"🔍 Debug: Sending payment request with Token → {token}")
     print(f"🔄 Generated Transaction ID: {transaction_id}")
@@ -131,6 +84,9 @@ def process_payment(stub, token, username):
 
         if payment_response.success:
             print(f"✅ Payment Successful! (Transaction ID: {payment_response.transaction_id})")
+        elif payment_response.message in PERMANENT_FAILURES:
+            # ✅ The sender's bank checks funds during prepare, so no separate balance check is needed
+            print(f"❌ Error: {payment_response.message}. Transaction aborted.")
         else:
             print(f"❌ Payment Failed: {payment_response.message}")
             save_pending_payment(username, {"receiver": receiver, "amount": amount, "transaction_id": transaction_id})  # ✅ Secure retry queue
@@ -164,28 +120,20 @@ def authenticate_client(stub):
         if input("Retry? (yes/no): ").strip().lower() != "yes":
             return None, None  
 
-# ✅ Background thread for auto-retrying failed transactions
-def auto_retry_loop(stub, token, username):
-    """Retries pending payments every 60 seconds in a background thread."""
-    while True:
-        retry_pending_payments(stub, token, username) 
-        time.sleep(60)
-
 # ✅ Start the client
 def main():
+    channel = get_secure_channel()
     stub = get_secure_stub()
+    id_pool = TransactionIDPool(stub)  # ✅ Starts fetching transaction IDs in the background
 
     token, username = authenticate_client(stub)
     if not token:
         print("❌ Exiting due to authentication failure.")
         return
 
-    # ✅ Start auto-retry loop
-    retry_thread = threading.Thread(target=auto_retry_loop, args=(stub, token, username), daemon=True)
-    retry_thread.start()
-
-    # ✅ Check and retry payments immediately on login
-    retry_pending_payments(stub, token, username)
+    # ✅ Drain pending payments now and in the background (with backoff, and right after reconnecting)
+    scheduler = RetryScheduler(stub, channel, token, username, id_pool)
+    scheduler.start()
 
     while True:
         print("\n📌 Main Menu:")
@@ -199,10 +147,12 @@ def main():
         if user_choice == "1":
             check_balance(stub, token)
         elif user_choice == "2":
-            process_payment(stub, token, username)  # ✅ Pass username
+            process_payment(stub, token, username, id_pool)  # ✅ Pass username
         elif user_choice == "3":
-            retry_pending_payments(stub, token, username) 
+            retry_pending_payments(scheduler)
         elif user_choice == "4":
+            scheduler.stop()  # ✅ No retries with a revoked token; queued payments wait for the next login
+            logout(stub, token)
             print("👋 Logging out... Goodbye!")
             break
         else:
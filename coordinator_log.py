@@ -0,0 +1,93 @@
+from wal import WriteAheadLog
+
+# Coordinator states
+STARTED = "STARTED"      # Prepares may be out; no decision yet (presumed abort)
+COMMITTED = "COMMITTED"  # Commit decided; commits and the interbank credit may still be owed
+ABORTED = "ABORTED"      # Abort decided; not every participant has confirmed it yet
+
+class CoordinatorLog(WriteAheadLog):
+    """Write-ahead log of the gateway's two-phase-commit decisions.
+
+    Each line is a JSON record:
+      ["S", id, sender, receiver, amount, participants, receiver_bank]  about to prepare
+      ["C", id] / ["A", id]                                             commit / abort decided
+      ["D", id]                                                         every participant is done
+    A transaction stays in the log until it is done. Entries are claimed by whoever
+    is driving them: the live payment path from `start` on, and the recovery worker
+    for everything else (e.g. leftovers from a crash), so the two never race.
+    """
+
+    def _reset(self):
+        self.pending = {}  # transaction_id -> {"state", "sender", "receiver", "amount", "participants", "receiver_bank"}
+        self.claimed = set()
+
+    def recover(self):
+        """Loads the transactions a previous run left unfinished; returns {transaction_id: state}."""
+        super().recover()
+        with self.lock:
+            self.recovery_stats["in_doubt"] = len(self.pending)
+            return {transaction_id: entry["state"] for transaction_id, entry in self.pending.items()}
+
+    def _apply(self, record):
+        kind, transaction_id = record[0], record[1]
+        if kind == "S":
+            self.pending[transaction_id] = {"state": STARTED, "sender": record[2], "receiver": record[3],
+                                            "amount": record[4], "participants": record[5], "receiver_bank": record[6]}
+        elif kind in ("C", "A"):
+            if transaction_id in self.pending:
+                self.pending[transaction_id]["state"] = COMMITTED if kind == "C" else ABORTED
+        elif kind == "D":
+            self.pending.pop(transaction_id, None)
+        else:
+            raise ValueError(f"Unknown coordinator record: {kind!r}")
+
+    def _snapshot(self):
+        records = []
+        for transaction_id, entry in self.pending.items():
+            records.append(["S", transaction_id, entry["sender"], entry["receiver"], entry["amount"],
+                            entry["participants"], entry["receiver_bank"]])
+            if entry["state"] != STARTED:
+                records.append(["C" if entry["state"] == COMMITTED else "A", transaction_id])
+        return records
+
+    def _live_size(self):
+        return len(self.pending)
+
+    def state(self, transaction_id):
+        """STARTED, COMMITTED, ABORTED or None once the transaction is done (or unknown)."""
+        with self.lock:
+            entry = self.pending.get(transaction_id)
+            return entry["state"] if entry else None
+
+    def start(self, transaction_id, sender, receiver, amount, participants, receiver_bank, wait=True):
+        """Records a transaction before any participant is asked to prepare, and claims it."""
+        with self.lock:
+            self.claimed.add(transaction_id)
+        return self._append(["S", transaction_id, sender, receiver, amount, list(participants), receiver_bank], wait)
+
+    def commit(self, transaction_id, wait=True):
+        """Records the commit decision; it must be durable before any participant hears it."""
+        return self._append(["C", transaction_id], wait)
+
+    def abort(self, transaction_id, wait=False):
+        return self._append(["A", transaction_id], wait)
+
+    def done(self, transaction_id, wait=False):
+        return self._append(["D", transaction_id], wait)
+
+    def claim(self, limit):
+        """Claims up to `limit` unclaimed transactions; returns copies with their transaction_id."""
+        with self.lock:
+            claimed = []
+            for transaction_id, entry in self.pending.items():
+                if len(claimed) >= limit:
+                    break
+                if transaction_id not in self.claimed:
+                    self.claimed.add(transaction_id)
+                    claimed.append(dict(entry, transaction_id=transaction_id))
+            return claimed
+
+    def release(self, *transaction_ids):
+        """Hands unfinished transactions over to the recovery worker."""
+        with self.lock:
+            self.claimed.difference_update(transaction_ids)
@@ -0,0 +1,82 @@
+import os
+import random
+import time
+import grpc
+
+class FaultInjector:
+    """Simulated latency, dropped RPCs and failed votes for load-testing against BankService.
+
+    Latency specs (milliseconds):
+      "0" / "fixed:MS"          constant delay (the default is no delay)
+      "uniform:LOW:HIGH"        uniformly distributed
+      "normal:MEAN:STDDEV"      normally distributed, clipped at zero
+      "exp:MEAN"                exponential, for bursty queues
+      "lognormal:MEDIAN:SIGMA"  long-tailed, for realistic p99s
+    A dropped RPC is aborted with UNAVAILABLE after its delay; a failed one returns the
+    method's normal failure response (e.g. a NO vote in PrepareTransaction).
+    """
+
+    def __init__(self, latency="0", drop_rate=0.0, fail_rate=0.0, methods=None, seed=None):
+        self.latency_spec = latency
+        self.sample_latency = self._parse_latency(latency)
+        self.drop_rate = drop_rate
+        self.fail_rate = fail_rate
+        self.methods = set(methods) if methods else None  # None means every RPC
+        self.random = random.Random(seed)
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """Builds an injector from STRIFE_BANK_* environment variables; explicit overrides win."""
+        methods = os.getenv("STRIFE_BANK_FAULT_METHODS")
+        config = {
+            "latency": os.getenv("STRIFE_BANK_LATENCY", "0"),
+            "drop_rate": float(os.getenv("STRIFE_BANK_DROP_RATE", "0")),
+            "fail_rate": float(os.getenv("STRIFE_BANK_FAIL_RATE", "0")),
+            "methods": methods.split(",") if methods else None,
+            "seed": int(os.environ["STRIFE_BANK_FAULT_SEED"]) if "STRIFE_BANK_FAULT_SEED" in os.environ else None,
+        }
+        config.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(**config)
+
+    def _parse_latency(self, spec):
+        kind, _, args = spec.partition(":")
+        if not args:
+            kind, args = "fixed", kind
+        try:
+            params = [float(arg) / 1000 for arg in args.split(":")]
+        except ValueError:
+            raise ValueError(f"Invalid latency spec: {spec!r}")
+
+        if kind == "fixed" and len(params) == 1:
+            return lambda: params[0]
+        if kind == "uniform" and len(params) == 2:
+            return lambda: self.random.uniform(*params)
+        if kind == "normal" and len(params) == 2:
+            return lambda: max(0.0, self.random.gauss(*params))
+        if kind == "exp" and len(params) == 1:
+            return lambda: self.random.expovariate(1 / params[0]) if params[0] else 0.0
+        if kind == "lognormal" and len(params) == 2:
+            # SIGMA is unitless, so undo the millisecond scaling applied above
+            return lambda: self.random.lognormvariate(0, params[1] * 1000) * params[0]
+        raise ValueError(f"Invalid latency spec: {spec!r}")
+
+    def applies_to(self, method):
+        return self.methods is None or method in self.methods
+
+    def before_call(self, method, context):
+        """Delays the RPC and may abort it as if the bank had dropped the connection."""
+        if not self.applies_to(method):
+            return
+        delay = self.sample_latency()
+        if delay > 0:
+            time.sleep(delay)
+        if self.drop_rate and self.random.random() < self.drop_rate:
+            context.abort(grpc.StatusCode.UNAVAILABLE, f"Simulated drop in {method}")
+
+    def should_fail(self, method):
+        """True if this call (or batch item) should report failure."""
+        return bool(self.fail_rate) and self.applies_to(method) and self.random.random() < self.fail_rate
+
+    def __str__(self):
+        return (f"latency={self.latency_spec}ms drop_rate={self.drop_rate} fail_rate={self.fail_rate} "
+                f"methods={','.join(sorted(self.methods)) if self.methods else 'all'}")
@@ -0,0 +1,79 @@
+import json
+import os
+import threading
+import grpc
+import payment_pb2_grpc
+from channel_pool import CHANNEL_OPTIONS
+
+GATEWAY_ADDRESS = "localhost:50051"
+CA_CERT_FILE = "ca.crt"
+NEVER_IDLE_MS = 2**31 - 1  # Keep the connection (and its TLS session) open between payments
+
+# Calls that fail before reaching the gateway are retried by gRPC itself. This is safe for payments
+# because each one carries its transaction ID; the throttle stops retries while most calls fail.
+RETRY_POLICY = {
+    "maxAttempts": 4,
+    "initialBackoff": "0.2s",
+    "maxBackoff": "2s",
+    "backoffMultiplier": 2,
+    "retryableStatusCodes": ["UNAVAILABLE"],
+}
+RETRY_THROTTLING = {"maxTokens": 10, "tokenRatio": 0.1}
+
+def service_config(wait_for_ready=False):
+    """gRPC service config for PaymentGateway calls; wait_for_ready queues calls until the gateway is up."""
+    return json.dumps({
+        "methodConfig": [{
+            "name": [{"service": "payment.PaymentGateway"}],
+            "retryPolicy": RETRY_POLICY,
+            "waitForReady": wait_for_ready,
+        }],
+        "retryThrottling": RETRY_THROTTLING,
+    })
+
+_credentials = {}
+_credentials_lock = threading.Lock()
+
+def load_credentials(ca_cert_file=CA_CERT_FILE):
+    """TLS credentials for a CA certificate, read from disk only once per process."""
+    with _credentials_lock:
+        if ca_cert_file not in _credentials:
+            with open(ca_cert_file, "rb") as f:
+                _credentials[ca_cert_file] = grpc.ssl_channel_credentials(root_certificates=f.read())
+        return _credentials[ca_cert_file]
+
+class GatewayConnection:
+    """The client process's one secure channel to the payment gateway.
+
+    The channel sends keepalive pings and never idles out, so a client that sits
+    between payments keeps its connection and skips the reconnect and TLS handshake
+    on the next call. Its service config retries calls that fail with UNAVAILABLE
+    and can make calls wait for the gateway instead of failing fast.
+    """
+
+    def __init__(self, address=GATEWAY_ADDRESS, ca_cert_file=CA_CERT_FILE, wait_for_ready=False):
+        options = CHANNEL_OPTIONS + [
+            ("grpc.client_idle_timeout_ms", NEVER_IDLE_MS),
+            ("grpc.enable_retries", 1),
+            ("grpc.service_config", service_config(wait_for_ready)),
+        ]
+        self.channel = grpc.secure_channel(address, load_credentials(ca_cert_file), options=options)
+        self.stub = payment_pb2_grpc.PaymentGatewayStub(self.channel)
+
+    def close(self):
+        self.channel.close()
+
+_connection = None
+_connection_lock = threading.Lock()
+
+def get_connection():
+    """Returns the process-wide gateway connection, opening it on first use.
+
+    Set STRIFE_CLIENT_WAIT_FOR_READY=1 to have calls wait for an unreachable gateway.
+    """
+    global _connection
+    if _connection is None:
+        with _connection_lock:
+            if _connection is None:
+                _connection = GatewayConnection(wait_for_ready=os.getenv("STRIFE_CLIENT_WAIT_FOR_READY", "0") == "1")
+    return _connection
@@ -0,0 +1,105 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+STORE_FILE = os.path.join("logs", "idempotency.db")
+MAX_CACHED = 100000  # Responses kept in memory (roughly 350 bytes each)
+CACHE_TTL = 3600  # Seconds a response stays in memory
+RETENTION = 7 * 24 * 3600  # Seconds a response stays on disk; older duplicates are still caught as replays
+PRUNE_EVERY = 10000  # Writes between purges of responses past their retention
+PRUNE_BATCH = 1000  # Rows deleted per purge transaction, so writes never wait long for SQLite's write lock
+
+class IdempotencyStore:
+    """Serialized responses of completed payments, keyed by transaction_id.
+
+    Recent responses live in a bounded in-memory LRU with a TTL, so memory use is
+    capped at `max_size` entries. Every response is also written to an SQLite table
+    (WAL mode, no fsync per write) and kept for `retention` seconds, so a duplicate
+    gets its original response back with one primary-key lookup, even after a
+    restart. Every `PRUNE_EVERY` writes, a background thread purges responses past
+    their retention in small batches on its own connection.
+    """
+
+    def __init__(self, store_file=STORE_FILE, max_size=MAX_CACHED, ttl=CACHE_TTL, retention=RETENTION):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.retention = retention
+        self.entries = OrderedDict()  # transaction_id -> (stored_at, response bytes)
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.store_file = store_file
+        self.purge_wanted = threading.Event()
+        self.purger = None
+
+        self.db = sqlite3.connect(store_file, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")  # The transaction log remains the durable record
+        self.db.execute("CREATE TABLE IF NOT EXISTS responses "
+                        "(transaction_id TEXT PRIMARY KEY, response BLOB NOT NULL, stored_at REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_by_age ON responses (stored_at)")
+
+    def get(self, transaction_id):
+        """Returns the stored response bytes, or None if the transaction hasn't completed (or was purged)."""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(transaction_id)
+            if entry is not None:
+                if entry[0] + self.ttl > now:
+                    self.entries.move_to_end(transaction_id)
+                    self.hits += 1
+                    return entry[1]
+                del self.entries[transaction_id]
+
+            row = self.db.execute("SELECT stored_at, response FROM responses WHERE transaction_id = ?",
+                                  (transaction_id,)).fetchone()
+            if row is None or row[0] + self.retention <= now:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._cache(transaction_id, now, row[1])
+            return row[1]
+
+    def put(self, transaction_id, response):
+        """Stores the response bytes of a completed payment."""
+        now = time.time()
+        with self.lock:
+            self._cache(transaction_id, now, response)
+            self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (transaction_id, response, now))
+            self.writes += 1
+            if self.writes % PRUNE_EVERY == 0:
+                if self.purger is None:
+                    self.purger = threading.Thread(target=self._purge_loop, daemon=True)
+                    self.purger.start()
+                self.purge_wanted.set()
+
+    def _purge_loop(self):
+        db = sqlite3.connect(self.store_file, isolation_level=None)
+        while True:
+            self.purge_wanted.wait()
+            self.purge_wanted.clear()
+            cutoff = time.time() - self.retention
+            try:
+                while db.execute("DELETE FROM responses WHERE rowid IN "
+                                 "(SELECT rowid FROM responses WHERE stored_at <= ? LIMIT ?)",
+                                 (cutoff, PRUNE_BATCH)).rowcount == PRUNE_BATCH:
+                    pass
+            except sqlite3.Error as e:
+                log.warning("⚠️ Purging expired responses failed, retrying after the next %d writes: %s", PRUNE_EVERY, e)
+
+    def _cache(self, transaction_id, stored_at, response):
+        self.entries[transaction_id] = (stored_at, response)
+        self.entries.move_to_end(transaction_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "cached": len(self.entries)}
@@ -0,0 +1,273 @@
+import collections
+import contextvars
+import inspect
+import logging
+import os
+import time
+import uuid
+import zlib
+import grpc
+from metrics import BANK_CALL_LATENCY, RPC_LATENCY, RPCS_IN_FLIGHT
+from server_logging import log_request_id
+from utils import verify_token
+
+REQUEST_ID_HEADER = "x-request-id"  # Sent back to the caller and forwarded on every bank call
+SLOW_CALL_SECONDS = float(os.getenv("STRIFE_SLOW_CALL_MS", "1000")) / 1000
+# Fraction of slow calls logged, chosen by request ID so the gateway and the banks log the same ones
+SLOW_CALL_SAMPLE_RATE = float(os.getenv("STRIFE_SLOW_CALL_SAMPLE_RATE", "1.0"))
+MAX_TRACED_BANK_CALLS = 50  # Bank calls remembered per RPC for its slow-call line (streams can make many)
+log = logging.getLogger(__name__)
+# Request field holding the caller's session token, per method; batch payments each carry their own
+TOKEN_FIELDS = {"ProcessPayment": "sender", "ViewBalance": "token"}
+
+class _Call:
+    """What the interceptors know about the RPC being handled."""
+
+    __slots__ = ("method", "request_id", "users", "bank_calls")
+
+    def __init__(self, method, request_id):
+        self.method = method
+        self.request_id = request_id
+        self.users = {}  # token -> username (None if invalid), each verified once per call
+        self.bank_calls = []  # (bank_name, method, seconds)
+
+_current_call = contextvars.ContextVar("current_call", default=None)
+
+def current_request_id():
+    """The request ID of the RPC being handled, or None outside of one (e.g. in the recovery worker)."""
+    call = _current_call.get()
+    return call.request_id if call is not None else None
+
+def authenticated_user(token):
+    """verify_token, but a token is only checked once per RPC however many payments it signs."""
+    call = _current_call.get()
+    if call is None:
+        return verify_token(token)
+    if token not in call.users:
+        call.users[token] = verify_token(token)
+    return call.users[token]
+
+def is_sampled(request_id):
+    return zlib.crc32(request_id.encode()) < SLOW_CALL_SAMPLE_RATE * 2**32
+
+def _method_names(full_method):
+    """("PaymentGateway", "ProcessPayment") for "/payment.PaymentGateway/ProcessPayment"."""
+    if isinstance(full_method, bytes):
+        full_method = full_method.decode()
+    service, _, method = full_method.rpartition("/")
+    return service.rpartition(".")[2], method
+
+class _Method:
+    """Per-method state shared by all of its calls: names, metrics children and the token field."""
+
+    __slots__ = ("name", "latency", "in_flight", "token_field", "capture")
+
+    def __init__(self, full_method, capture=None):
+        service, self.name = _method_names(full_method)
+        self.latency = RPC_LATENCY.labels(service, self.name)
+        self.in_flight = RPCS_IN_FLIGHT.labels(service, self.name)
+        self.token_field = TOKEN_FIELDS.get(self.name)
+        self.capture = capture
+
+def _begin(method, request, context):
+    """Request ID, then auth: adopts the caller's request ID (or makes one) and verifies a unary call's token."""
+    request_id = None
+    for key, value in context.invocation_metadata() or ():
+        if key == REQUEST_ID_HEADER:
+            request_id = value
+            break
+    call = _Call(method.name, request_id or uuid.uuid4().hex)
+    context.set_trailing_metadata(((REQUEST_ID_HEADER, call.request_id),))
+    if method.token_field is not None and request is not None:
+        token = getattr(request, method.token_field)
+        call.users[token] = verify_token(token)
+    method.in_flight.inc()
+    return call
+
+def _end(method, call, started):
+    """Timing: records the RPC's latency and logs it if it was slow and its request ID is sampled."""
+    elapsed = time.perf_counter() - started
+    method.in_flight.dec()
+    method.latency.observe(elapsed)
+    if elapsed >= SLOW_CALL_SECONDS and is_sampled(call.request_id):
+        users = ", ".join(sorted({user for user in call.users.values() if user}))
+        bank_calls = ", ".join(f"{bank_name}.{name} {seconds * 1000:.0f} ms"
+                               for bank_name, name, seconds in list(call.bank_calls))
+        log.warning("🐢 Slow %s: %.0f ms (request %s%s)%s", method.name, elapsed * 1000, call.request_id,
+                    f", user {users}" if users else "", f" | {bank_calls}" if bank_calls else "")
+
+def _wrap(method, behavior, handler):
+    def call_with(request, context):
+        started = time.perf_counter()
+        call = _begin(method, None if handler.request_streaming else request, context)
+        _current_call.set(call)
+        log_request_id.set(call.request_id)
+        if method.capture is not None:
+            if handler.request_streaming:
+                request = method.capture.stream(method.name, request, call.request_id)
+            else:
+                method.capture.record(method.name, request)
+        return call, started, request
+
+    if handler.response_streaming:
+        def intercepted(request, context):
+            call, started, request = call_with(request, context)
+            try:
+                yield from behavior(request, context)
+            finally:
+                _current_call.set(None)  # The worker thread goes on to other RPCs
+                log_request_id.set(None)
+                _end(method, call, started)
+    else:
+        def intercepted(request, context):
+            call, started, request = call_with(request, context)
+            try:
+                return behavior(request, context)
+            finally:
+                _current_call.set(None)
+                log_request_id.set(None)
+                _end(method, call, started)
+    return intercepted
+
+def _wrap_async(method, behavior, handler):
+    # Each grpc.aio RPC runs in its own task (and context), so the current call needs no reset
+    def call_with(request, context):
+        call = _begin(method, None if handler.request_streaming else request, context)
+        _current_call.set(call)
+        log_request_id.set(call.request_id)
+        if method.capture is not None:
+            if handler.request_streaming:
+                request = method.capture.stream_async(method.name, request, call.request_id)
+            else:
+                method.capture.record(method.name, request)
+        return call, request
+
+    if inspect.isasyncgenfunction(behavior):
+        async def intercepted(request, context):
+            started = time.perf_counter()
+            call, request = call_with(request, context)
+            try:
+                async for response in behavior(request, context):
+                    yield response
+            finally:
+                _end(method, call, started)
+    elif inspect.iscoroutinefunction(behavior):
+        async def intercepted(request, context):
+            started = time.perf_counter()
+            call, request = call_with(request, context)
+            try:
+                return await behavior(request, context)
+            finally:
+                _end(method, call, started)
+    else:
+        return _wrap(method, behavior, handler)
+    return intercepted
+
+_HANDLER_FACTORIES = {
+    (False, False): ("unary_unary", grpc.unary_unary_rpc_method_handler),
+    (False, True): ("unary_stream", grpc.unary_stream_rpc_method_handler),
+    (True, False): ("stream_unary", grpc.stream_unary_rpc_method_handler),
+    (True, True): ("stream_stream", grpc.stream_stream_rpc_method_handler),
+}
+
+def _intercepted_handler(full_method, handler, wrap, capture):
+    attribute, factory = _HANDLER_FACTORIES[(handler.request_streaming, handler.response_streaming)]
+    behavior = wrap(_Method(full_method, capture), getattr(handler, attribute), handler)
+    return factory(behavior, request_deserializer=handler.request_deserializer,
+                   response_serializer=handler.response_serializer)
+
+class CallInterceptor(grpc.ServerInterceptor):
+    """The interceptor stack shared by the gateway and the banks, applied in one wrapper per call.
+
+    1. Request ID: taken from the caller's `x-request-id` metadata (or generated),
+       returned in the trailing metadata and forwarded on the bank calls made for it.
+    2. Auth: a unary call's session token is verified once, up front; handlers read
+       the result through authenticated_user().
+    3. Timing: latency and in-flight metrics per method, plus a log line for slow
+       calls (sampled by request ID) listing the bank calls they made.
+    4. Capture: with a TrafficCapture, every request is also appended to its trace.
+    """
+
+    wrap = staticmethod(_wrap)
+
+    def __init__(self, capture=None):
+        self.capture = capture
+        self.handlers = {}  # method -> (original handler, intercepted handler), built once per method
+
+    def _intercepted(self, handler_call_details, handler):
+        cached = self.handlers.get(handler_call_details.method)
+        if cached is None or cached[0] is not handler:
+            cached = (handler, _intercepted_handler(handler_call_details.method, handler, self.wrap, self.capture))
+            self.handlers[handler_call_details.method] = cached
+        return cached[1]
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        return self._intercepted(handler_call_details, handler) if handler is not None else None
+
+class AsyncCallInterceptor(CallInterceptor, grpc.aio.ServerInterceptor):
+    """CallInterceptor for grpc.aio servers."""
+
+    wrap = staticmethod(_wrap_async)
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        return self._intercepted(handler_call_details, handler) if handler is not None else None
+
+class _ClientCallDetails(collections.namedtuple("_ClientCallDetails", ("method", "timeout", "metadata", "credentials",
+                                                                      "wait_for_ready", "compression")),
+                         grpc.ClientCallDetails):
+    pass
+
+class _BankCalls:
+    """Shared by the bank channel interceptors: tags a call with the request ID and times it."""
+
+    def __init__(self, bank_name):
+        self.bank_name = bank_name
+        self.methods = {}  # full method -> (method name, latency histogram child)
+
+    def _method(self, full_method):
+        method = self.methods.get(full_method)
+        if method is None:
+            name = _method_names(full_method)[1]
+            method = self.methods[full_method] = (name, BANK_CALL_LATENCY.labels(self.bank_name, name))
+        return method
+
+    def _on_done(self, full_method, call_state, started):
+        name, latency = self._method(full_method)
+
+        def done(_):
+            elapsed = time.perf_counter() - started
+            latency.observe(elapsed)
+            if call_state is not None and len(call_state.bank_calls) < MAX_TRACED_BANK_CALLS:
+                call_state.bank_calls.append((self.bank_name, name, elapsed))
+        return done
+
+class BankCallInterceptor(_BankCalls, grpc.UnaryUnaryClientInterceptor):
+    """Forwards the current request ID to a bank and records each call's latency, `.future()` calls included."""
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        call_state = _current_call.get()
+        if call_state is not None:
+            client_call_details = _ClientCallDetails(
+                client_call_details.method, client_call_details.timeout,
+                tuple(client_call_details.metadata or ()) + ((REQUEST_ID_HEADER, call_state.request_id),),
+                client_call_details.credentials, client_call_details.wait_for_ready,
+                getattr(client_call_details, "compression", None))
+        started = time.perf_counter()
+        call = continuation(client_call_details, request)
+        call.add_done_callback(self._on_done(client_call_details.method, call_state, started))
+        return call
+
+class AsyncBankCallInterceptor(_BankCalls, grpc.aio.UnaryUnaryClientInterceptor):
+    """BankCallInterceptor for grpc.aio channels."""
+
+    async def intercept_unary_unary(self, continuation, client_call_details, request):
+        call_state = _current_call.get()
+        if call_state is not None:
+            client_call_details = client_call_details._replace(metadata=grpc.aio.Metadata(
+                *(client_call_details.metadata or ()), (REQUEST_ID_HEADER, call_state.request_id)))
+        started = time.perf_counter()
+        call = await continuation(client_call_details, request)
+        call.add_done_callback(self._on_done(client_call_details.method, call_state, started))
+        return call
@@ -0,0 +1,119 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+# Durability modes
+DURABILITY_SYNC = "sync"    # Callers wait until their entry is fsynced (concurrent entries share one fsync)
+DURABILITY_GROUP = "group"  # Callers return at once; the writer fsyncs at most once per group window
+DURABILITY_NONE = "none"    # Best effort: entries are written but never fsynced
+DURABILITY_MODES = (DURABILITY_SYNC, DURABILITY_GROUP, DURABILITY_NONE)
+
+log = logging.getLogger(__name__)
+
+class LogWriteError(OSError):
+    """Raised in sync mode when an entry could not be written or fsynced."""
+
+class _Done(threading.Event):
+    """Set once a sync-mode entry is handled; `error` holds what kept it from being durable."""
+    error = None
+
+class TransactionLogWriter:
+    """Asynchronous, group-committing writer for the JSON-lines transaction log.
+
+    Entries go into a bounded queue and a single background thread appends everything
+    queued so far with one write (and at most one fsync). A full queue blocks callers,
+    which bounds memory when the disk can't keep up. With `echo`, entries are also
+    logged as compact JSON at DEBUG level.
+    """
+
+    def __init__(self, log_file, durability=DURABILITY_GROUP, group_window=0.01, max_queue=10000,
+                 max_batch=1000, echo=False):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Durability must be one of {DURABILITY_MODES}")
+        self.log_file = log_file
+        self.durability = durability
+        self.group_window = group_window
+        self.max_batch = max_batch
+        self.echo = echo
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = None
+        self.start_lock = threading.Lock()
+        self.stats = {"entries": 0, "writes": 0, "fsyncs": 0}
+
+    def _start(self):
+        with self.start_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+                atexit.register(self.flush)
+
+    def write(self, entry):
+        """Queues a log entry; in sync mode, blocks until it is durable."""
+        if self.thread is None:
+            self._start()
+        done = _Done() if self.durability == DURABILITY_SYNC else None
+        self.queue.put((entry, done))
+        if done is not None:
+            done.wait()
+            if done.error is not None:
+                raise LogWriteError(f"Transaction log entry is not durable: {done.error}") from done.error
+
+    def flush(self):
+        """Blocks until every queued entry has been written (and fsynced unless best effort)."""
+        if self.thread is not None:
+            self.queue.put((None, None))  # Forces an fsync of whatever is pending
+            self.queue.join()
+
+    def _run(self):
+        with open(self.log_file, "a") as f:
+            unsynced = False
+            last_sync = time.monotonic()
+            while True:
+                try:
+                    timeout = self.group_window if unsynced else None
+                    batch = [self.queue.get(timeout=timeout)]
+                except queue.Empty:
+                    batch = []
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                entries = [entry for entry, _ in batch if entry is not None]
+                force_sync = not batch or len(entries) < len(batch)
+                error = None
+                try:
+                    if entries:
+                        f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+                        f.flush()
+                        self.stats["entries"] += len(entries)
+                        self.stats["writes"] += 1
+                        unsynced = True
+
+                    if unsynced and self.durability != DURABILITY_NONE and (
+                            force_sync or self.durability == DURABILITY_SYNC
+                            or time.monotonic() - last_sync >= self.group_window):
+                        os.fsync(f.fileno())
+                        self.stats["fsyncs"] += 1
+                        unsynced = False
+                        last_sync = time.monotonic()
+                    elif self.durability == DURABILITY_NONE:
+                        unsynced = False
+                except Exception as e:
+                    log.error("❌ Failed to write to log file: %s", e)
+                    error = e
+
+                for entry, done in batch:
+                    if done is not None:
+                        done.error = error  # Sync callers raise it instead of assuming their entry is durable
+                        done.set()
+                    self.queue.task_done()
+
+                if self.echo and log.isEnabledFor(logging.DEBUG):
+                    for entry in entries:
+                        log.debug("%s", json.dumps(entry))
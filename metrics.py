@@ -0,0 +1,243 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger(__name__)
+
+METRICS_HOST = os.getenv("STRIFE_METRICS_HOST", "127.0.0.1")  # Scrapers are expected on the same host
+# Seconds; from a cached duplicate (well under 1ms) up to a bank call running into its 5s deadline
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """A named metric with one child per combination of label values, created on first use."""
+
+    kind = None
+    child_methods = ()  # An unlabelled metric is used directly through these, e.g. PAYMENTS_IN_FLIGHT.inc()
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            child = self.children[()] = self._new_child()
+            for method in self.child_methods:
+                setattr(self, method, getattr(child, method))
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values):
+        """The child for these label values (in `labelnames` order)."""
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self.lock:
+                child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self.children.items()):
+            lines.extend(child.samples(self.name, self.labelnames, values))
+        return lines
+
+class _Value:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+class _GaugeValue(_Value):
+    __slots__ = ()
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def in_progress(self, amount=1):
+        """Context manager that counts whatever runs inside it."""
+        return _InProgress(self, amount)
+
+class _InProgress:
+    __slots__ = ("gauge", "amount")
+
+    def __init__(self, gauge, amount):
+        self.gauge = gauge
+        self.amount = amount
+
+    def __enter__(self):
+        self.gauge.inc(self.amount)
+
+    def __exit__(self, *exc_info):
+        self.gauge.dec(self.amount)
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum", "lock")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)  # The last bucket is +Inf
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.upper_bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager that observes how long its body took, in seconds."""
+        return _Timer(self)
+
+    def samples(self, name, labelnames, values):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        lines, cumulative = [], 0
+        for upper_bound, count in zip(self.upper_bounds + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if upper_bound == float("inf") else repr(float(upper_bound))
+            bucket_labels = _format_labels(labelnames, values, f'le="{le}"')
+            lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {total!r}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+        return lines
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+class Counter(_Metric):
+    kind = "counter"
+    child_methods = ("inc",)
+
+    def _new_child(self):
+        return _Value()
+
+class Gauge(_Metric):
+    kind = "gauge"
+    child_methods = ("inc", "dec", "set", "in_progress")
+
+    def _new_child(self):
+        return _GaugeValue()
+
+class Histogram(_Metric):
+    kind = "histogram"
+    child_methods = ("observe", "time")
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+class Registry:
+    """The metrics a process exposes, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics)
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+REGISTRY = Registry()
+
+# Shared by the gateways and the banks; each process exposes the series it records
+RPC_LATENCY = Histogram("strife_rpc_duration_seconds", "Time to handle an RPC, streams until the last response.",
+                        ("service", "method"))
+RPCS_IN_FLIGHT = Gauge("strife_rpcs_in_flight", "RPCs being handled.", ("service", "method"))
+PHASE_LATENCY = Histogram("strife_2pc_phase_duration_seconds",
+                          "Time the gateway spends in one 2PC phase for a payment (single) or a micro-batch (batch).",
+                          ("phase", "mode"))
+BANK_CALL_LATENCY = Histogram("strife_bank_call_duration_seconds", "Round trip of a gateway call to a bank.",
+                              ("bank", "method"))
+BANK_CHANNEL_REQUESTS = Counter("strife_bank_channel_requests_total", "Bank calls made over the gateway's pooled channels.",
+                                ("bank",))
+BANK_CHANNELS_CREATED = Counter("strife_bank_channels_created_total",
+                                "Channels the gateway opened to a bank; requests per channel is the reuse ratio.", ("bank",))
+TRANSACTIONS = Counter("strife_transactions_total", "Transaction log entries by type and status.", ("type", "status"))
+TOKEN_CACHE_LOOKUPS = Counter("strife_token_cache_lookups_total", "Session token lookups in the verified-token cache.",
+                              ("result",))
+PAYMENTS_IN_FLIGHT = Gauge("strife_payments_in_flight", "Payments accepted by the gateway and not yet answered.")
+
+def status_label(status):
+    """Transaction log status without per-payment details, e.g. "PENDING: Timeout in transaction"."""
+    return ":".join(status.split(":", 2)[:2])
+
+def start_metrics_server(port, host=METRICS_HOST, registry=REGISTRY):
+    """Serves GET /metrics on a background thread. Returns the HTTP server (port 0 picks a free one)."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.partition("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # One line per scrape would drown out the server's own output
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def serve_metrics(port):
+    """Starts the metrics endpoint unless `port` is 0; a port already in use only costs the metrics."""
+    if not port:
+        return None
+    try:
+        server = start_metrics_server(port)
+    except OSError as e:
+        log.warning("⚠️ Metrics endpoint not started on port %s: %s", port, e)
+        return None
+    log.info("📈 Metrics on http://%s:%d/metrics", METRICS_HOST, server.server_address[1])
+    return server
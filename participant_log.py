@@ -0,0 +1,127 @@
+import time
+from wal import WriteAheadLog
+
+# Participant states
+PREPARED = "PREPARED"
+COMMITTED = "COMMITTED"  # Committed, but this bank still has to credit the receiver
+
+# BankService refusals the coordinator tells apart; finished and aborted transactions are forgotten, so for a
+# payment the coordinator decided to commit (and every bank prepared), "not in doubt" means already done
+ALREADY_COMMITTED = "Transaction already committed"
+NOT_IN_DOUBT = "Transaction not in doubt"
+NOT_COMMITTED = "Transaction not committed yet"
+ALREADY_ABORTED = "Transaction already aborted"
+
+ABORT_TOMBSTONE_TTL = 600  # Seconds an aborted ID is remembered, so a prepare arriving after its abort votes NO
+
+class ParticipantLog(WriteAheadLog):
+    """Write-ahead log of a bank's two-phase-commit participant state and balance changes.
+
+    Each line is a JSON record:
+      ["P", id, sender, receiver, amount]  voted YES (prepared)
+      ["C", id]                            committed, credit still to apply
+      ["A", id, aborted_at]                aborted (kept as a tombstone for ABORT_TOMBSTONE_TTL)
+      ["D", id]                            nothing left to do
+      ["C"|"D", id, username, balance]     as above, plus the account's new absolute balance
+      ["B", username, balance]             balance carried over by compaction
+    A debit or credit shares one record with the state change that causes it, so a
+    crash can never apply it twice or lose it. Only in-doubt transactions and changed
+    balances are kept, along with recent abort tombstones, so recovery time does not
+    grow with the number of transactions the bank has ever seen.
+    """
+
+    def __init__(self, log_file, abort_ttl=ABORT_TOMBSTONE_TTL, **kwargs):
+        super().__init__(log_file, **kwargs)
+        self.abort_ttl = abort_ttl
+
+    def _reset(self):
+        self.in_doubt = {}  # transaction_id -> {"state", "sender", "receiver", "amount"}
+        self.balances = {}  # username -> balance for every account changed through this log
+        self.aborted = {}  # transaction_id -> time it was aborted, oldest first
+
+    def recover(self):
+        """Rebuilds in-doubt transactions and changed balances from disk; returns {transaction_id: state}."""
+        super().recover()
+        with self.lock:
+            self.recovery_stats["in_doubt"] = len(self.in_doubt)
+            return {transaction_id: entry["state"] for transaction_id, entry in self.in_doubt.items()}
+
+    def _apply(self, record):
+        kind = record[0]
+        if kind == "P":
+            self.in_doubt[record[1]] = {"state": PREPARED, "sender": record[2], "receiver": record[3],
+                                        "amount": record[4]}
+        elif kind == "A":
+            self.in_doubt.pop(record[1], None)
+            self.aborted.pop(record[1], None)  # Re-inserted, so the dict stays in abort order
+            self.aborted[record[1]] = record[2]
+            self._expire_tombstones()
+        elif kind in ("C", "D"):
+            if kind == "C":
+                if record[1] in self.in_doubt:
+                    self.in_doubt[record[1]]["state"] = COMMITTED
+            else:
+                self.in_doubt.pop(record[1], None)
+            if len(record) == 4:
+                self.balances[record[2]] = record[3]
+        elif kind == "B":
+            self.balances[record[1]] = record[2]
+        else:
+            raise ValueError(f"Unknown participant record: {kind!r}")
+
+    def _expire_tombstones(self):
+        cutoff = time.time() - self.abort_ttl
+        while self.aborted:
+            transaction_id, aborted_at = next(iter(self.aborted.items()))
+            if aborted_at > cutoff:
+                break
+            del self.aborted[transaction_id]
+
+    def _snapshot(self):
+        self._expire_tombstones()
+        records = [["B", username, balance] for username, balance in self.balances.items()]
+        for transaction_id, entry in self.in_doubt.items():
+            records.append(["P", transaction_id, entry["sender"], entry["receiver"], entry["amount"]])
+            if entry["state"] == COMMITTED:
+                records.append(["C", transaction_id])
+        records.extend(["A", transaction_id, aborted_at] for transaction_id, aborted_at in self.aborted.items())
+        return records
+
+    def _live_size(self):
+        return len(self.in_doubt) + len(self.balances) + len(self.aborted)
+
+    def get(self, transaction_id):
+        """The in-doubt record for a transaction (a copy), or None."""
+        with self.lock:
+            entry = self.in_doubt.get(transaction_id)
+            return dict(entry) if entry else None
+
+    def state(self, transaction_id):
+        """PREPARED, COMMITTED or None if the transaction is not in doubt here."""
+        entry = self.get(transaction_id)
+        return entry["state"] if entry else None
+
+    def prepare(self, transaction_id, sender, receiver, amount, wait=True):
+        """Records a YES vote."""
+        return self._append(["P", transaction_id, sender, receiver, amount], wait)
+
+    def commit(self, transaction_id, account=None, balance=None, wait=False):
+        """Records a commit that still owes the receiver a credit (and the sender's debit, if any)."""
+        return self._append(["C", transaction_id] + ([account, balance] if account else []), wait)
+
+    def was_aborted(self, transaction_id):
+        """True if the transaction was aborted here within the last `abort_ttl` seconds."""
+        with self.lock:
+            return transaction_id in self.aborted
+
+    def abort(self, transaction_id, wait=False):
+        """Records an abort; the ID stays as a tombstone so a late prepare for it is refused."""
+        return self._append(["A", transaction_id, time.time()], wait)
+
+    def done(self, transaction_id, account=None, balance=None, wait=False):
+        """Records that this bank has nothing left to do for the transaction (and the sender's debit, if any)."""
+        return self._append(["D", transaction_id] + ([account, balance] if account else []), wait)
+
+    def credit(self, transaction_id, receiver, balance, wait=True):
+        """Records a credit (as the receiver's new balance) and finishes the transaction."""
+        return self._append(["D", transaction_id, receiver, balance], wait)
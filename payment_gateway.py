@@ -1,17 +1,48 @@
+import contextvars
 import grpc
+import logging
+import os
+import queue
+import threading
 import time
 import uuid
 import random
 from concurrent import futures
 import payment_pb2
 import payment_pb2_grpc
-from utils import load_users, save_users, generate_token, verify_token, log_transaction
+from utils import LOG_DIR, load_account_index, log_transaction, peer_ip, revoke_token, verify_token
 from google.protobuf import empty_pb2  # ✅ Import Empty
 import socket  # ✅ Import socket to get sender's IP address
 from transaction_id_generator import TransactionIDGenerator  # ✅ Import the generator
 from transaction_id_check import is_transaction_replay
+from channel_pool import SERVER_OPTIONS, BankChannelPool
+from account_locks import LockManager
+from coordinator_log import COMMITTED, STARTED, CoordinatorLog
+from idempotency_store import IdempotencyStore
+from participant_log import ALREADY_COMMITTED, NOT_IN_DOUBT
+from server_logging import configure_logging
+from metrics import PAYMENTS_IN_FLIGHT, PHASE_LATENCY, serve_metrics
+from interceptors import BankCallInterceptor, CallInterceptor, authenticated_user
+from traffic_capture import TrafficCapture
+
+log = logging.getLogger(__name__)
 
 TRANSACTION_TIMEOUT = 5
+COORDINATOR_LOG_FILE = os.path.join(LOG_DIR, "coordinator.log")  # 2PC decisions, for recovery after a crash
+RECOVERY_INTERVAL = 1.0  # Seconds between recovery passes when there is nothing left to resolve
+RECOVERY_BATCH_SIZE = 500  # In-doubt transactions resolved per batched round of bank calls
+METRICS_PORT = int(os.getenv("STRIFE_METRICS_PORT", "9151"))  # Local /metrics endpoint; 0 turns it off
+MAX_BATCH_SIZE = 500  # Payments grouped into one round of batched bank calls
+SERVER_THREADS = 10  # RPCs the gateway serves at once
+# Batched 2PC phases, in order, and the request message each one takes
+BATCH_PHASES = ("PrepareTransactionBatch", "CommitTransactionBatch", "InterbankTransferBatch")
+PHASE_NAMES = {"PrepareTransactionBatch": "prepare", "CommitTransactionBatch": "commit", "InterbankTransferBatch": "interbank_transfer"}
+BATCH_REQUEST_TYPES = {
+    "PrepareTransactionBatch": payment_pb2.PrepareBatchRequest,
+    "CommitTransactionBatch": payment_pb2.CommitBatchRequest,
+    "AbortTransactionBatch": payment_pb2.AbortBatchRequest,
+    "InterbankTransferBatch": payment_pb2.BankTransferBatchRequest,
+}
 # Define known banks and their gRPC addresses
 BANKS = {
     "BankA": "localhost:50052",
@@ -27,6 +58,37 @@ BANKS = {
 # Track online banks (Assume all banks are online at startup)
 ONLINE_BANKS = set(BANKS.keys())
 
+# Each open stream is served by a server thread, so one reader per server thread never leaves a stream waiting
+_stream_readers = futures.ThreadPoolExecutor(max_workers=SERVER_THREADS, thread_name_prefix="stream-reader")
+
+def micro_batches(request_iterator, max_size=MAX_BATCH_SIZE):
+    """Groups a stream of requests into lists of whatever has arrived, without waiting for more."""
+    pending = queue.Queue()
+
+    def read():
+        try:
+            for request in request_iterator:
+                pending.put(request)
+        finally:
+            pending.put(None)
+
+    _stream_readers.submit(contextvars.copy_context().run, read)  # Keeps the RPC's request ID for logging
+    while True:
+        request = pending.get()
+        if request is None:
+            return
+        batch = [request]
+        while len(batch) < max_size:
+            try:
+                request = pending.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                yield batch
+                return
+            batch.append(request)
+        yield batch
+
 def generate_account_number(existing_accounts):
     """Generates a unique 10-digit account number."""
     while True:
@@ -35,183 +97,510 @@ def generate_account_number(existing_accounts):
             return account_no
 
 class PaymentGatewayServicer(payment_pb2_grpc.PaymentGatewayServicer):
-    def __init__(self):
-        self.users = load_users()
-        self.transactions = {}  # Track completed transactions to prevent duplicates
-        self.transaction_id_generator = TransactionIDGenerator(datacenter_id=1, machine_id=1)  # ✅ Initialize generator
-
+    def __init__(self, bank_channels=None, coordinator_log=None, idempotency_store=None):
+        self.user_banks = load_account_index()  # ✅ username -> bank_name only; accounts live at their banks
+        self.idempotency_store = idempotency_store or IdempotencyStore()  # ✅ Bounded, survives restarts
+        self.transaction_id_generator = TransactionIDGenerator(datacenter_id=1)  # ✅ Machine ID is leased per process
+        self.bank_channels = bank_channels or BankChannelPool(BANKS, interceptor=BankCallInterceptor)  # ✅ One long-lived TLS channel per bank
+        self.account_locks = LockManager()  # ✅ Serializes payments per account, not globally
+        self.transaction_locks = LockManager()
+
+        # ♻️ Transactions a previous run left in doubt are resolved by the recovery worker
+        self.coordinator_log = coordinator_log or CoordinatorLog(COORDINATOR_LOG_FILE)
+        in_doubt = self.coordinator_log.recover()
+        if in_doubt:
+            log.info("♻️ %d in-doubt transactions to resolve (%d committed)", len(in_doubt),
+                     sum(state == COMMITTED for state in in_doubt.values()))
     
     def AuthenticateClient(self, request, context):
-        """Authenticates a client and returns a JWT token if the user's bank is online."""
-        user = self.users.get(request.username)
+        """Authenticates a client with their bank and returns a JWT token if the bank is online."""
+        early_response = self._check_login(request)
+        if early_response is not None:
+            return early_response
 
-        if not user or user["password"] != request.password:
+        user_bank = self.user_banks[request.username]
+        try:
+            response = self.bank_channels.get_stub(user_bank).AuthenticateClient(request, timeout=TRANSACTION_TIMEOUT)
+        except grpc.RpcError as e:
+            self._on_rpc_error(user_bank, e)
+            return payment_pb2.AuthResponse(success=False, token="Bank is unreachable")
+        return self._login_result(request, response)
+
+    def _check_login(self, request):
+        """Routes a login to the user's bank. Returns a response if the login stops here."""
+        user_bank = self.user_banks.get(request.username)
+        if not user_bank:
             return payment_pb2.AuthResponse(success=False, token="Invalid credentials")
 
-        user_bank = user["bank_name"]
-
         # 🚫 Reject authentication if the user's bank is offline
         if user_bank not in ONLINE_BANKS:
-            print(f"🚫 Login blocked: {request.username} (Bank: {user_bank} is OFFLINE)")
+            log.warning("🚫 Login blocked: %s (Bank: %s is OFFLINE)", request.username, user_bank)
             return payment_pb2.AuthResponse(success=False, token="Bank is offline")
+        return None
 
-        print(f"✅ Login successful: {request.username} (Bank: {user_bank} is ONLINE)")
-        token = generate_token(request.username)
-        return payment_pb2.AuthResponse(success=True, token=token)
+    def _login_result(self, request, response):
+        if not response.success:
+            return payment_pb2.AuthResponse(success=False, token="Invalid credentials")
+        log.debug("✅ Login successful: %s (Bank: %s is ONLINE)", request.username, self.user_banks[request.username])
+        return response
 
     def GenerateTransactionID(self, request, context):
         """Generates a globally unique transaction ID."""
         transaction_id = self.transaction_id_generator.generate_transaction_id()
         return payment_pb2.TransactionResponse(transaction_id=str(transaction_id))  # ✅ Ensure ID is string
 
+    def GenerateTransactionIDs(self, request, context):
+        """Leases a contiguous range of transaction IDs, so clients need no round trip per payment."""
+        first_id, end_id = self.transaction_id_generator.lease(max(1, request.count))
+        return payment_pb2.TransactionIDRange(first_id=first_id, count=end_id - first_id)
+
 
     def ProcessPayment(self, request, context):
         """Processes a payment from sender to receiver, ensuring idempotency."""
-        sender = verify_token(request.sender)
+        transaction_id = request.transaction_id or str(uuid.uuid4())  # ✅ Generate if empty
+
+        # ✅ Retries of the same transaction are handled one at a time
+        with PAYMENTS_IN_FLIGHT.in_progress(), self.transaction_locks.hold(transaction_id):
+            return self._process_payment(request, context, transaction_id)
+
+    def _process_payment(self, request, context, transaction_id):
+        sender = authenticated_user(request.sender)
+        client_ip = peer_ip(context)
+
+        early_response = self._check_payment(request, transaction_id, sender, client_ip)
+        if early_response is not None:
+            return early_response
+
+        # ✅ Lock both accounts (in a fixed order) so payments between them are sent to the banks in order
+        with self.account_locks.hold(sender, request.receiver):
+            return self._transfer(sender, request.receiver, request.amount, transaction_id, client_ip)
+
+    def _check_payment(self, request, transaction_id, sender, client_ip):
+        """Runs the duplicate, replay, token and account checks. Returns a response if the payment stops here."""
         receiver = request.receiver
         amount = request.amount
-        transaction_id = request.transaction_id or str(uuid.uuid4())  # ✅ Generate if empty
 
-        # ✅ Check if the transaction has already been processed
         # ✅ Check if the transaction has already been processed (cached response)
-        if transaction_id in self.transactions:
+        cached_response = self.idempotency_store.get(transaction_id)
+        if cached_response is not None:
             log_transaction(sender, "transfer", amount, "FAILED: Duplicate Transaction", transaction_id,
-                            receiver=receiver, sender_bank=self.users[sender]["bank_name"] if sender in self.users else "UNKNOWN",
-                            receiver_bank=self.users[receiver]["bank_name"] if receiver in self.users else "UNKNOWN")
+                            receiver=receiver, sender_bank=self.user_banks[sender] if sender in self.user_banks else "UNKNOWN",
+                            receiver_bank=self.user_banks[receiver] if receiver in self.user_banks else "UNKNOWN", sender_ip=client_ip)
 
-            print(f"🔁 Duplicate transaction detected: {transaction_id}. Returning cached response.")
-            return payment_pb2.PaymentResponse(
-                success=True,
-                message="DUPLICATE TRANSACTION - This payment has already been processed.",
-                transaction_id=transaction_id,
-                receiver=receiver
-            )
+            log.info("🔁 Duplicate transaction detected: %s. Returning cached response.", transaction_id)
+            return payment_pb2.PaymentResponse.FromString(cached_response)
 
         # 🚨 Check for replay attacks
         if is_transaction_replay(transaction_id):
             log_transaction(sender, "transfer", amount, "FAILED: Replay Attack Detected", transaction_id,
-                            receiver=receiver, sender_bank=self.users[sender]["bank_name"] if sender in self.users else "UNKNOWN",
-                            receiver_bank=self.users[receiver]["bank_name"] if receiver in self.users else "UNKNOWN")
+                            receiver=receiver, sender_bank=self.user_banks[sender] if sender in self.user_banks else "UNKNOWN",
+                            receiver_bank=self.user_banks[receiver] if receiver in self.user_banks else "UNKNOWN", sender_ip=client_ip)
 
-            print(f"⚠️ Replay Attack Detected: Transaction ID {transaction_id} already processed successfully.")
+            log.warning("⚠️ Replay Attack Detected: Transaction ID %s already processed successfully.", transaction_id)
             return payment_pb2.PaymentResponse(success=False, message="Duplicate transaction detected!", transaction_id=transaction_id)
 
+        # ⏳ An earlier attempt is still in doubt; the recovery worker decides its outcome first
+        if self.coordinator_log.state(transaction_id) is not None:
+            return payment_pb2.PaymentResponse(success=False, message="Previous attempt is still being resolved, retry later",
+                                               transaction_id=transaction_id, receiver=receiver)
+
         if not sender:
             log_transaction("UNKNOWN", "transfer", amount, "FAILED: Invalid Token", transaction_id, 
-                            receiver=receiver)
+                            receiver=receiver, sender_ip=client_ip)
             return payment_pb2.PaymentResponse(success=False, message="Invalid or expired token",
                                             transaction_id=transaction_id, receiver=receiver)
 
-        if sender not in self.users or receiver not in self.users:
+        if sender not in self.user_banks or receiver not in self.user_banks:
             log_transaction(sender, "transfer", amount, "FAILED: Invalid Account", transaction_id,
-                            receiver=receiver)
+                            receiver=receiver, sender_ip=client_ip)
             return payment_pb2.PaymentResponse(success=False, message="Invalid account(s)",
                                             transaction_id=transaction_id, receiver=receiver)
 
-        sender_bank = self.users[sender]["bank_name"]
-        receiver_bank = self.users[receiver]["bank_name"]
-        # ✅ Ensure the sender has enough balance
-        if self.users[sender]["balance"] < amount:
-            log_transaction(sender, "transfer", amount, "FAILED: Insufficient Funds", transaction_id, receiver=receiver, sender_bank=sender_bank, receiver_bank=receiver_bank)
-            return payment_pb2.PaymentResponse(success=False, message="Insufficient funds", transaction_id=transaction_id, receiver=receiver, sender_bank=sender_bank, receiver_bank=receiver_bank)
+        return None
+
+    def _check_transfer(self, sender, receiver, amount, transaction_id, client_ip):
+        """Checks bank availability (funds are checked by the sender's bank). Returns a response if the payment stops here."""
+        sender_bank = self.user_banks[sender]
+        receiver_bank = self.user_banks[receiver]
 
         # ✅ Ensure the receiver's bank is online
         if receiver_bank not in ONLINE_BANKS:
             log_transaction(sender, "transfer", amount, f"FAILED: {receiver_bank} is offline", transaction_id,
-                            receiver=receiver, sender_bank=sender_bank, receiver_bank=receiver_bank)
+                            receiver=receiver, sender_bank=sender_bank, receiver_bank=receiver_bank, sender_ip=client_ip)
             return payment_pb2.PaymentResponse(success=False, message=f"{receiver_bank} is offline",
                                             transaction_id=transaction_id, receiver=receiver, 
                                             sender_bank=sender_bank, receiver_bank=receiver_bank)
 
         if receiver_bank not in BANKS:
             log_transaction(sender, "transfer", amount, "FAILED: Unknown Bank", transaction_id,
-                            receiver=receiver, sender_bank=sender_bank)
+                            receiver=receiver, sender_bank=sender_bank, sender_ip=client_ip)
             return payment_pb2.PaymentResponse(success=False, message="Unknown bank",
                                             transaction_id=transaction_id, receiver=receiver, 
                                             sender_bank=sender_bank, receiver_bank=receiver_bank)
 
-        receiver_bank_address = BANKS[receiver_bank]
+        return None
 
-        # ✅ Load CA certificate for SSL verification
-        with open("ca.crt", "rb") as f:
-            ca_cert = f.read()
+    def _transfer(self, sender, receiver, amount, transaction_id, client_ip):
+        """Runs 2PC for a validated payment. Caller holds the sender and receiver locks."""
+        early_response = self._check_transfer(sender, receiver, amount, transaction_id, client_ip)
+        if early_response is not None:
+            return early_response
 
-        credentials = grpc.ssl_channel_credentials(root_certificates=ca_cert)
-
-        print(f"🔍 Debug: Connecting to {receiver_bank_address}")
+        sender_bank = self.user_banks[sender]
+        receiver_bank = self.user_banks[receiver]
+        participants = self._participants(sender_bank, receiver_bank)
 
+        # ✅ Logged before any bank hears of it, so a crash can't leave funds held forever
+        self.coordinator_log.start(transaction_id, sender, receiver, amount, participants, receiver_bank)
         try:
-            with grpc.secure_channel(receiver_bank_address, credentials) as channel:
-                stub = payment_pb2_grpc.BankServiceStub(channel)
-
-                # **🔹 PHASE 1: PREPARE PHASE**
-                print("⏳ Phase 1: Sending Prepare Request...")
-                prepare_response = stub.PrepareTransaction(
-                    payment_pb2.PrepareRequest(transaction_id=transaction_id, sender=sender, receiver=receiver, amount=amount)
-                )
-
-                if not prepare_response.success:
-                    log_transaction(sender, "interbank_transfer", amount, "FAILED: Prepare phase failed", transaction_id,
-                                    receiver=receiver, sender_bank=sender_bank, receiver_bank=receiver_bank)
-                    
-                    return payment_pb2.PaymentResponse(
-                        success=False,
-                        message="Prepare phase failed",
-                        transaction_id=transaction_id
-                    )
-
-                # **🔹 PHASE 2: COMMIT PHASE**
-                print("✅ Phase 2: Committing Transaction...")
-                commit_response = stub.CommitTransaction(
-                    payment_pb2.CommitRequest(transaction_id=transaction_id)
-                )
-
-                if commit_response.success:
-                    self.users[sender]["balance"] -= amount
-                    
-           
-                    # ✅ Ensure funds are credited to the receiver
-                    interbank_response = stub.InterbankTransfer(
-                        payment_pb2.BankTransferRequest(sender=sender, receiver=receiver, amount=amount, transaction_id=transaction_id)
+            # **🔹 PHASE 1: PREPARE PHASE** (all participant banks vote in parallel)
+            log.debug("⏳ Phase 1: Sending Prepare Request to %s...", ", ".join(participants))
+            with PHASE_LATENCY.labels("prepare", "single").time():
+                rejected_by = self.prepare_transaction(participants, payment_pb2.PrepareRequest(
+                    transaction_id=transaction_id, sender=sender, receiver=receiver, amount=amount))
+
+            if rejected_by:
+                return self._prepare_rejected(sender, receiver, amount, transaction_id, client_ip, *rejected_by)
+
+            # **🔹 PHASE 2: COMMIT PHASE** (from here on the payment completes, if need be in the background)
+            log.debug("✅ Phase 2: Committing Transaction %s...", transaction_id)
+            self.coordinator_log.commit(transaction_id)
+            with PHASE_LATENCY.labels("commit", "single").time():
+                committed = self.commit_transaction(participants, transaction_id)
+            if committed:
+                # ✅ Ensure funds are credited to the receiver
+                with PHASE_LATENCY.labels("interbank_transfer", "single").time():
+                    interbank_response = self.bank_channels.get_stub(receiver_bank).InterbankTransfer(
+                        payment_pb2.BankTransferRequest(sender=sender, receiver=receiver, amount=amount, transaction_id=transaction_id),
+                        timeout=TRANSACTION_TIMEOUT
                     )
 
-                    if not interbank_response.success:
-                        print(f"❌ Interbank Transfer Failed: {interbank_response.message}")
-                        log_transaction(sender, "interbank_transfer", amount, "FAILED: Receiver Bank Issue", transaction_id, receiver=receiver)
-                        return payment_pb2.PaymentResponse(success=False, message="Interbank transfer failed", transaction_id=transaction_id)
-                    
-                    self.users[receiver]["balance"] += amount
-                    save_users(self.users)
-
-                    transaction_type = "interbank_transfer" if sender_bank != receiver_bank else "transfer"
-
-                    log_transaction(sender, transaction_type, amount, "SUCCESS", transaction_id,
-                                    receiver=receiver, sender_bank=sender_bank, receiver_bank=receiver_bank)
+                if not interbank_response.success:
+                    log.warning("❌ Interbank Transfer Failed: %s", interbank_response.message)
+                    return self._completion_pending(sender, receiver, amount, transaction_id, client_ip, "Interbank transfer failed")
 
-                    print(f"✅ Payment of ${amount} to {receiver} successful!")
-                    payment_response = payment_pb2.PaymentResponse(success=True, message="Payment successful", transaction_id=transaction_id, receiver=receiver, sender_bank=sender_bank, receiver_bank=receiver_bank)
-                    self.transactions[transaction_id] = payment_response
-                    return payment_response
-                
-                log_transaction(sender, "interbank_transfer", amount, "FAILED: Commit phase failed", transaction_id,
-                receiver=receiver, sender_bank=sender_bank, receiver_bank=receiver_bank)
+                return self._finish_payment(sender, receiver, amount, transaction_id, client_ip)
 
-                return payment_pb2.PaymentResponse(success=False, message="Commit phase failed", transaction_id=transaction_id)
+            return self._completion_pending(sender, receiver, amount, transaction_id, client_ip, "Commit phase failed")
 
         except grpc.RpcError as e:
             error_message = f"Timeout in transaction: {e.details()}"
+            if self.coordinator_log.state(transaction_id) == COMMITTED:
+                return self._completion_pending(sender, receiver, amount, transaction_id, client_ip, error_message)
+
             log_transaction(sender, "interbank_transfer", amount, "FAILED: Timeout in transaction", transaction_id,
-                            receiver=receiver, sender_bank=sender_bank, receiver_bank=receiver_bank)
+                            receiver=receiver, sender_bank=sender_bank, receiver_bank=receiver_bank, sender_ip=client_ip)
 
             return payment_pb2.PaymentResponse(success=False, message=error_message, transaction_id=transaction_id)
+        finally:
+            self.coordinator_log.release(transaction_id)  # Whatever is unfinished goes to the recovery worker
+
+    def _participants(self, sender_bank, receiver_bank):
+        """Banks that take part in the 2PC for a payment (a same-bank payment has one)."""
+        return sorted({bank_name for bank_name in (sender_bank, receiver_bank) if bank_name in BANKS})
+
+    def _prepare_rejected(self, sender, receiver, amount, transaction_id, client_ip, bank_name, message):
+        """Response to a NO vote; a sender's bank that is short of funds is reported as such."""
+        sender_bank = self.user_banks[sender]
+        receiver_bank = self.user_banks[receiver]
+        if message == "Insufficient funds":
+            log_transaction(sender, "transfer", amount, "FAILED: Insufficient Funds", transaction_id, receiver=receiver, sender_bank=sender_bank, receiver_bank=receiver_bank, sender_ip=client_ip)
+            return payment_pb2.PaymentResponse(success=False, message="Insufficient funds", transaction_id=transaction_id, receiver=receiver, sender_bank=sender_bank, receiver_bank=receiver_bank)
 
+        log_transaction(sender, "interbank_transfer", amount, "FAILED: Prepare phase failed", transaction_id,
+                        receiver=receiver, sender_bank=sender_bank, receiver_bank=receiver_bank, sender_ip=client_ip)
+        return payment_pb2.PaymentResponse(success=False, message=f"Prepare phase failed ({bank_name} voted NO)",
+                                           transaction_id=transaction_id)
+
+    def _completion_pending(self, sender, receiver, amount, transaction_id, client_ip, reason):
+        """Response for a committed payment that the recovery worker has to finish."""
+        log_transaction(sender, "interbank_transfer", amount, f"PENDING: {reason}", transaction_id, receiver=receiver,
+                        sender_bank=self.user_banks[sender], receiver_bank=self.user_banks[receiver], sender_ip=client_ip)
+        return payment_pb2.PaymentResponse(success=False, message=f"{reason}; the payment is committed and will complete in the background",
+                                           transaction_id=transaction_id)
+
+    def _on_rpc_error(self, bank_name, error):
+        # Reconnect now instead of waiting out the backoff, unless the bank itself answered UNAVAILABLE
+        if error.code() == grpc.StatusCode.UNAVAILABLE and not self.bank_channels.is_healthy(bank_name):
+            self.bank_channels.reset(bank_name)
+
+    def _finish_payment(self, sender, receiver, amount, transaction_id, client_ip):
+        """Logs and caches the result once both banks are done (they hold and persist the balances)."""
+        sender_bank = self.user_banks[sender]
+        receiver_bank = self.user_banks[receiver]
+        self.coordinator_log.done(transaction_id)
+
+        transaction_type = "interbank_transfer" if sender_bank != receiver_bank else "transfer"
+
+        payment_response = payment_pb2.PaymentResponse(success=True, message="Payment successful", transaction_id=transaction_id, receiver=receiver, sender_bank=sender_bank, receiver_bank=receiver_bank)
+        # ✅ Cached first: if the log write fails and the client retries, it gets this response instead of paying twice
+        self.idempotency_store.put(transaction_id, payment_response.SerializeToString())
+
+        log_transaction(sender, transaction_type, amount, "SUCCESS", transaction_id,
+                        receiver=receiver, sender_bank=sender_bank, receiver_bank=receiver_bank, sender_ip=client_ip)
+
+        log.debug("✅ Payment of $%s to %s successful!", amount, receiver)
+        return payment_response
+
+    def ProcessPaymentBatch(self, request, context):
+        """Processes many payments with one batched 2PC round per bank, streaming back the results of each round."""
+        for start in range(0, len(request.payments), MAX_BATCH_SIZE):
+            yield from self._process_batch(request.payments[start:start + MAX_BATCH_SIZE], context)
+
+    def ProcessPaymentStream(self, request_iterator, context):
+        """Bidirectional variant of ProcessPaymentBatch: payments are grouped as they arrive."""
+        for batch in micro_batches(request_iterator):
+            yield from self._process_batch(batch, context)
+
+    def _process_batch(self, requests, context):
+        """Runs one batch of payments. Returns their responses once its locks are released, so a slow reader holds none."""
+        client_ip = peer_ip(context)
+        transaction_ids = [request.transaction_id or str(uuid.uuid4()) for request in requests]
+
+        with PAYMENTS_IN_FLIGHT.in_progress(len(requests)), self.transaction_locks.hold(*transaction_ids):
+            candidates, responses = self._select_batch(requests, transaction_ids, client_ip)
+
+            accounts = {account for request, _, sender in candidates for account in (sender, request.receiver)}
+            with self.account_locks.hold(*accounts):
+                payments, routing_responses = self._route_batch(candidates, client_ip)
+                responses += routing_responses
+
+                self.coordinator_log.wait_durable(self._start_batch(payments))
+                started = [payment["transaction_id"] for payment in payments]
+                try:
+                    # **🔹 PREPARE → COMMIT → INTERBANK TRANSFER**, one batched RPC per bank and phase
+                    for method in BATCH_PHASES:
+                        requests_by_bank = self._group_batch(method, payments)
+                        with PHASE_LATENCY.labels(PHASE_NAMES[method], "batch").time():
+                            results = self._call_banks_batched(method, requests_by_bank)
+                        payments, failed, phase_responses = self._settle_batch(method, payments, requests_by_bank, results,
+                                                                               client_ip)
+                        responses += phase_responses
+                        if method == "PrepareTransactionBatch":
+                            if failed:
+                                self._abort_batch(failed)
+                            self.coordinator_log.wait_durable(self._commit_batch(payments))
+                finally:
+                    self.coordinator_log.release(*started)
+        return responses
+
+    def _select_batch(self, requests, transaction_ids, client_ip):
+        """Runs the per-payment checks for a batch. Returns (candidates, early responses)."""
+        candidates, responses = [], []
+        seen = set()
+        for request, transaction_id in zip(requests, transaction_ids):
+            if transaction_id in seen:
+                responses.append(payment_pb2.PaymentResponse(success=False, message="Duplicate transaction in batch",
+                                                             transaction_id=transaction_id, receiver=request.receiver))
+                continue
+            seen.add(transaction_id)
+
+            sender = authenticated_user(request.sender)
+            early_response = self._check_payment(request, transaction_id, sender, client_ip)
+            if early_response is not None:
+                responses.append(early_response)
+                continue
+            candidates.append((request, transaction_id, sender))
+        return candidates, responses
+
+    def _route_batch(self, candidates, client_ip):
+        """Checks banks and works out each payment's participants. Caller holds the account locks."""
+        payments, responses = [], []
+        for request, transaction_id, sender in candidates:
+            early_response = self._check_transfer(sender, request.receiver, request.amount, transaction_id, client_ip)
+            if early_response is not None:
+                responses.append(early_response)
+                continue
+            sender_bank = self.user_banks[sender]
+            receiver_bank = self.user_banks[request.receiver]
+            payments.append({
+                "transaction_id": transaction_id, "sender": sender, "receiver": request.receiver, "amount": request.amount,
+                "sender_bank": sender_bank, "receiver_bank": receiver_bank,
+                "participants": self._participants(sender_bank, receiver_bank),
+            })
+        return payments, responses
+
+    def _start_batch(self, payments):
+        """Logs every payment ahead of the prepares. Returns the record to wait on, so the batch shares one fsync."""
+        seq = 0
+        for payment in payments:
+            seq = self.coordinator_log.start(payment["transaction_id"], payment["sender"], payment["receiver"],
+                                             payment["amount"], payment["participants"], payment["receiver_bank"], wait=False)
+        return seq
+
+    def _commit_batch(self, payments):
+        """Logs the commit decisions, which must be durable before any bank hears them. Returns the record to wait on."""
+        seq = 0
+        for payment in payments:
+            seq = self.coordinator_log.commit(payment["transaction_id"], wait=False)
+        return seq
+
+    def _abort_batch(self, payments):
+        """Records the abort decisions and tells the participants. Returns how many were confirmed by every bank."""
+        self._record_aborts(payments)
+        requests_by_bank = self._group_batch("AbortTransactionBatch", payments)
+        results = self._call_banks_batched("AbortTransactionBatch", requests_by_bank)
+        return self._aborted_batch(payments, requests_by_bank, results)
+
+    def _record_aborts(self, payments):
+        for payment in payments:
+            if self.coordinator_log.state(payment["transaction_id"]) == STARTED:
+                self.coordinator_log.abort(payment["transaction_id"])
+
+    def _aborted_batch(self, payments, requests_by_bank, results):
+        aborted = 0
+        for payment, outcome in zip(payments, self._batch_outcomes(payments, requests_by_bank, results)):
+            if outcome is None:
+                self.coordinator_log.done(payment["transaction_id"])
+                aborted += 1
+        return aborted
+
+    def _group_batch(self, method, payments):
+        """Builds {bank_name: [(payment index, request)]} for one batched phase."""
+        requests_by_bank = {}
+        for index, payment in enumerate(payments):
+            if method == "PrepareTransactionBatch":
+                request = payment_pb2.PrepareRequest(transaction_id=payment["transaction_id"], sender=payment["sender"],
+                                                     receiver=payment["receiver"], amount=payment["amount"])
+            elif method == "CommitTransactionBatch":
+                request = payment_pb2.CommitRequest(transaction_id=payment["transaction_id"])
+            elif method == "AbortTransactionBatch":
+                request = payment_pb2.AbortRequest(transaction_id=payment["transaction_id"])
+            else:
+                request = payment_pb2.BankTransferRequest(sender=payment["sender"], receiver=payment["receiver"],
+                                                          amount=payment["amount"], transaction_id=payment["transaction_id"])
+            banks = [payment["receiver_bank"]] if method == "InterbankTransferBatch" else payment["participants"]
+            for bank_name in banks:
+                requests_by_bank.setdefault(bank_name, []).append((index, request))
+        return requests_by_bank
+
+    def _call_banks_batched(self, method, requests_by_bank):
+        """Sends one batched RPC per bank, concurrently. Returns {bank_name: responses or grpc.RpcError}."""
+        calls = {bank_name: getattr(self.bank_channels.get_stub(bank_name), method).future(
+                     BATCH_REQUEST_TYPES[method](requests=[request for _, request in entries]), timeout=TRANSACTION_TIMEOUT)
+                 for bank_name, entries in requests_by_bank.items()}
+        results = {}
+        for bank_name, call in calls.items():
+            try:
+                results[bank_name] = call.result().responses
+            except grpc.RpcError as e:
+                self._on_rpc_error(bank_name, e)
+                results[bank_name] = e
+        return results
+
+    def _settle_batch(self, method, payments, requests_by_bank, results, client_ip):
+        """Applies one phase's bank results. Returns (payments still going, payments that failed, responses)."""
+        succeeded, failed, responses = [], [], []
+        for payment, outcome in zip(payments, self._batch_outcomes(payments, requests_by_bank, results)):
+            if outcome is None:
+                if method == "InterbankTransferBatch":
+                    responses.append(self._finish_payment(payment["sender"], payment["receiver"], payment["amount"],
+                                                          payment["transaction_id"], client_ip))
+                else:
+                    succeeded.append(payment)
+                continue
+
+            failed.append(payment)
+            if method != "PrepareTransactionBatch":
+                # Committed: the recovery worker finishes the payment
+                if isinstance(outcome, grpc.RpcError):
+                    reason = f"Timeout in transaction: {outcome.details()}"
+                else:
+                    reason = "Commit phase failed" if method == "CommitTransactionBatch" else "Interbank transfer failed"
+                responses.append(self._completion_pending(payment["sender"], payment["receiver"], payment["amount"],
+                                                          payment["transaction_id"], client_ip, reason))
+            elif isinstance(outcome, grpc.RpcError):
+                log_transaction(payment["sender"], "interbank_transfer", payment["amount"], "FAILED: Timeout in transaction",
+                                payment["transaction_id"], receiver=payment["receiver"], sender_bank=payment["sender_bank"],
+                                receiver_bank=payment["receiver_bank"], sender_ip=client_ip)
+                responses.append(payment_pb2.PaymentResponse(success=False, message=f"Timeout in transaction: {outcome.details()}",
+                                                             transaction_id=payment["transaction_id"]))
+            else:
+                responses.append(self._prepare_rejected(payment["sender"], payment["receiver"], payment["amount"],
+                                                        payment["transaction_id"], client_ip, *outcome))
+        return succeeded, failed, responses
+
+    def _batch_outcomes(self, payments, requests_by_bank, results):
+        """Per payment: None if every bank succeeded, else the grpc.RpcError or (bank that said no, its message)."""
+        outcomes = [None] * len(payments)
+        for bank_name, entries in requests_by_bank.items():
+            result = results[bank_name]
+            for position, (index, _) in enumerate(entries):
+                if isinstance(result, grpc.RpcError):
+                    outcomes[index] = outcomes[index] or result
+                elif position >= len(result) or not result[position].success:
+                    outcomes[index] = outcomes[index] or (bank_name, result[position].message if position < len(result) else "")
+        return outcomes
+
+    def start_recovery(self):
+        """Starts the background worker that resolves in-doubt transactions alongside live traffic."""
+        threading.Thread(target=self._recovery_loop, daemon=True).start()
+
+    def _recovery_loop(self):
+        while True:
+            try:
+                resolved = self.resolve_in_doubt()
+            except Exception as e:
+                log.exception("❌ Recovery pass failed: %s", e)
+                resolved = 0
+            if not resolved:
+                time.sleep(RECOVERY_INTERVAL)
+
+    def resolve_in_doubt(self):
+        """Drives one batch of in-doubt transactions to COMMIT or ABORT. Returns how many were finished."""
+        payments = self.coordinator_log.claim(RECOVERY_BATCH_SIZE)
+        if not payments:
+            return 0
+        transaction_ids = [payment["transaction_id"] for payment in payments]
+        try:
+            with self.transaction_locks.hold(*transaction_ids):
+                # Presumed abort: without a commit decision, nobody can have committed
+                aborting = [payment for payment in payments if payment["state"] != COMMITTED]
+                committing = [payment for payment in payments if payment["state"] == COMMITTED]
+                resolved = self._abort_batch(aborting) if aborting else 0
+                if committing:
+                    resolved += self._recommit_batch(committing)
+            log.info("♻️ Recovery: resolved %d of %d in-doubt transactions", resolved, len(payments))
+            return resolved
+        finally:
+            self.coordinator_log.release(*transaction_ids)
+
+    def _recommit_batch(self, payments):
+        """Re-sends commits and interbank credits for committed payments. Returns how many completed."""
+        requests_by_bank = self._group_batch("CommitTransactionBatch", payments)
+        payments = self._past_commit(payments, requests_by_bank, self._call_banks_batched("CommitTransactionBatch", requests_by_bank))
+        requests_by_bank = self._group_batch("InterbankTransferBatch", payments)
+        return self._credited_batch(payments, requests_by_bank, self._call_banks_batched("InterbankTransferBatch", requests_by_bank))
+
+    def _past_commit(self, payments, requests_by_bank, results):
+        """Payments every bank has committed, now or before; any other refusal leaves a payment in doubt for a retry."""
+        outcomes = self._batch_outcomes(payments, requests_by_bank, results)
+        return [payment for payment, outcome in zip(payments, outcomes)
+                if outcome is None or (not isinstance(outcome, grpc.RpcError) and outcome[1] in (ALREADY_COMMITTED, NOT_IN_DOUBT))]
+
+    def _credited_batch(self, payments, requests_by_bank, results):
+        completed = 0
+        for payment, outcome in zip(payments, self._batch_outcomes(payments, requests_by_bank, results)):
+            if outcome is None or (not isinstance(outcome, grpc.RpcError) and outcome[1] == NOT_IN_DOUBT):
+                self._finish_payment(payment["sender"], payment["receiver"], payment["amount"], payment["transaction_id"], None)
+                completed += 1
+        return completed
 
     def ViewBalance(self, request, context):
-        """Retrieves account balance using token authentication."""
-        user = verify_token(request.token)
-        if not user or user not in self.users:
+        """Retrieves account balance from the user's bank using token authentication."""
+        user = authenticated_user(request.token)
+        if not user or user not in self.user_banks:
             return payment_pb2.BalanceResponse(balance=-1)
-        return payment_pb2.BalanceResponse(balance=self.users[user]["balance"])
+        try:
+            return self.bank_channels.get_stub(self.user_banks[user]).ViewBalance(request, timeout=TRANSACTION_TIMEOUT)
+        except grpc.RpcError as e:
+            self._on_rpc_error(self.user_banks[user], e)
+            return payment_pb2.BalanceResponse(balance=-1)
+
+    def Logout(self, request, context):
+        """Revokes a session token, so it stops working before it expires."""
+        revoke_token(request.token)
+        return empty_pb2.Empty()
 
     def CheckBankStatus(self, request, context):
         """Checks if a bank is online."""
@@ -226,30 +615,77 @@ class PaymentGatewayServicer(payment_pb2_grpc.PaymentGatewayServicer):
         else:
             ONLINE_BANKS.discard(bank_name)
         return payment_pb2.StatusResponse(success=True, message="Bank status updated")
-    def prepare_transaction(self, bank_name, user, amount, transaction_id, stub=None):
-        """Sends a prepare request to a bank and waits for a response."""
-        if bank_name == self.users[user]["bank_name"]:  # If sender's bank is local
-            print(f"🔹 {bank_name}: Approved transaction.")
-            return True
-
-        try:
-            print(f"🔹 Sending Prepare request to {bank_name} for {amount}...")
-            response = stub.PrepareTransaction(payment_pb2.PrepareRequest(transaction_id=transaction_id, amount=amount))
-            return response.success
-        except grpc.RpcError as e:
-            print(f"❌ {bank_name}: PREPARE FAILED! ({e.details()})")
-            return False
-
-def abort_transaction(self, bank_name, user, amount, transaction_id):
-    """Handles rollback for a failed 2PC transaction."""
-    if user in self.users:
-        self.users[user]["balance"] += amount  # Refund sender if rollback needed
-        save_users(self.users)
-        print(f"🔄 {bank_name}: Rolled back {amount} due to failed transaction {transaction_id}.")
+    def prepare_transaction(self, participants, prepare_request):
+        """Phase 1: sends PrepareTransaction to every participant at once, each with a deadline.
+
+        Returns None if every bank voted YES, or (bank_name, message) of the first NO vote. On a
+        NO vote or RPC error the outstanding prepares are cancelled and all participants are
+        told to abort; RPC errors are then re-raised.
+        """
+        votes = queue.Queue()
+        calls = {}
+        for bank_name in participants:
+            call = self.bank_channels.get_stub(bank_name).PrepareTransaction.future(prepare_request, timeout=TRANSACTION_TIMEOUT)
+            call.add_done_callback(lambda call, bank_name=bank_name: votes.put((bank_name, call)))
+            calls[bank_name] = call
+
+        rejected_by, error = None, None
+        for _ in calls:
+            bank_name, call = votes.get()
+            try:
+                response = call.result()
+                if response.success:
+                    continue
+                rejected_by = (bank_name, response.message)
+            except grpc.RpcError as e:
+                log.error("❌ %s: PREPARE FAILED! (%s)", bank_name, e.details())
+                self._on_rpc_error(bank_name, e)
+                error = e
+            break  # First NO vote or failure decides the outcome; don't wait for the rest
+        else:
+            return None
+
+        for call in calls.values():
+            call.cancel()
+        self.abort_participants(participants, prepare_request.transaction_id)
+        if error is not None:
+            raise error
+        return rejected_by
+
+    def commit_transaction(self, participants, transaction_id):
+        """Phase 2: sends CommitTransaction to every participant at once. True if all committed."""
+        commit_request = payment_pb2.CommitRequest(transaction_id=transaction_id)
+        calls = {bank_name: self.bank_channels.get_stub(bank_name).CommitTransaction.future(commit_request, timeout=TRANSACTION_TIMEOUT)
+                 for bank_name in participants}
+        committed = True
+        for bank_name, call in calls.items():
+            try:
+                committed = call.result().success and committed
+            except grpc.RpcError as e:
+                self._on_rpc_error(bank_name, e)
+                raise
+        return committed
+
+    def abort_participants(self, participants, transaction_id):
+        """Records the abort decision and tells every participant (not awaited; the recovery worker retries failures)."""
+        self.coordinator_log.abort(transaction_id)
+        abort_request = payment_pb2.AbortRequest(transaction_id=transaction_id)
+        calls = [self.bank_channels.get_stub(bank_name).AbortTransaction.future(abort_request, timeout=TRANSACTION_TIMEOUT)
+                 for bank_name in participants]
+
+        def on_done(_):
+            if all(call.done() for call in calls) and not any(call.exception() for call in calls):
+                self.coordinator_log.done(transaction_id)
+
+        for call in calls:
+            call.add_done_callback(on_done)
 
 def serve():
     """Starts the gRPC payment gateway server with SSL/TLS."""
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    configure_logging()
+    capture = TrafficCapture.from_env(verify_token)  # 🎥 Off unless STRIFE_CAPTURE_FILE is set
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=SERVER_THREADS), options=SERVER_OPTIONS,
+                         interceptors=[CallInterceptor(capture)])
 
     # Load TLS credentials (Server Certificate, Private Key, CA Certificate)
     with open("server.crt", "rb") as f:
@@ -263,12 +699,15 @@ def serve():
     credentials = grpc.ssl_server_credentials([(server_key, server_cert)], root_certificates=ca_cert)
 
     # Add PaymentGateway service
-    payment_pb2_grpc.add_PaymentGatewayServicer_to_server(PaymentGatewayServicer(), server)
+    servicer = PaymentGatewayServicer()
+    payment_pb2_grpc.add_PaymentGatewayServicer_to_server(servicer, server)
+    servicer.start_recovery()  # ♻️ Resolves in-doubt transactions in the background
 
     # Secure gRPC server with TLS
     server.add_secure_port("[::]:50051", credentials)
     server.start()
-    print("🚀 Payment Gateway Server running securely on port 50051...")
+    log.info("🚀 Payment Gateway Server running securely on port 50051...")
+    serve_metrics(METRICS_PORT)
     server.wait_for_termination()
 
 if __name__ == "__main__":
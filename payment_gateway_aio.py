@@ -0,0 +1,385 @@
+import asyncio
+import contextvars
+import functools
+import grpc
+import logging
+import os
+import uuid
+from concurrent import futures
+import payment_pb2
+import payment_pb2_grpc
+from utils import log_transaction, peer_ip, verify_token
+from account_locks import AsyncLockManager
+from channel_pool import SERVER_OPTIONS, AsyncBankChannelPool
+from coordinator_log import COMMITTED
+from server_logging import configure_logging
+from metrics import PAYMENTS_IN_FLIGHT, PHASE_LATENCY, serve_metrics
+from interceptors import AsyncBankCallInterceptor, AsyncCallInterceptor, authenticated_user
+from traffic_capture import TrafficCapture
+from payment_gateway import (BANKS, BATCH_PHASES, BATCH_REQUEST_TYPES, MAX_BATCH_SIZE, METRICS_PORT, PHASE_NAMES,
+                             RECOVERY_BATCH_SIZE, RECOVERY_INTERVAL, TRANSACTION_TIMEOUT, PaymentGatewayServicer)
+
+# Threads for coordinator log writes, fsync waits and SQLite lookups. A payment waiting for its fsync holds one,
+# so this bounds how many payments share a group commit; the loop's default executor (min(32, CPUs + 4)) is too small
+BLOCKING_THREADS = int(os.getenv("STRIFE_GATEWAY_BLOCKING_THREADS", "128"))
+
+log = logging.getLogger(__name__)
+
+class AsyncPaymentGatewayServicer(PaymentGatewayServicer):
+    """grpc.aio payment gateway: a payment waiting on its banks holds no thread.
+
+    Validation and bookkeeping are shared with PaymentGatewayServicer; only the
+    bank round trips are awaited, so one process can keep thousands of 2PC
+    transactions in flight.
+    """
+
+    def __init__(self, bank_channels=None, coordinator_log=None, idempotency_store=None):
+        super().__init__(bank_channels=bank_channels or AsyncBankChannelPool(BANKS, interceptor=AsyncBankCallInterceptor), coordinator_log=coordinator_log,
+                         idempotency_store=idempotency_store)
+        self.account_locks = AsyncLockManager()
+        self.transaction_locks = AsyncLockManager()
+        self.recovery_task = None
+        self.blocking_executor = futures.ThreadPoolExecutor(max_workers=BLOCKING_THREADS, thread_name_prefix="gateway-blocking")
+
+    async def _blocking(self, function, *args, **kwargs):
+        """Runs a call that may block (disk, fsync, SQLite) off the event loop, keeping the RPC's context for logging."""
+        call = functools.partial(contextvars.copy_context().run, function, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self.blocking_executor, call)
+
+    def _in_background(self, function, *args):
+        """Like _blocking, but not awaited, so a cancelled RPC can't skip it (e.g. handing a claim back)."""
+        self.blocking_executor.submit(contextvars.copy_context().run, function, *args)
+
+    async def _wait_durable(self, seq):
+        """Waits for a coordinator log fsync without blocking the event loop."""
+        await self._blocking(self.coordinator_log.wait_durable, seq)
+
+    async def AuthenticateClient(self, request, context):
+        """Authenticates a client with their bank and returns a JWT token if the bank is online."""
+        early_response = self._check_login(request)
+        if early_response is not None:
+            return early_response
+
+        user_bank = self.user_banks[request.username]
+        try:
+            response = await self.bank_channels.get_stub(user_bank).AuthenticateClient(request, timeout=TRANSACTION_TIMEOUT)
+        except grpc.RpcError as e:
+            self._on_rpc_error(user_bank, e)
+            return payment_pb2.AuthResponse(success=False, token="Bank is unreachable")
+        return self._login_result(request, response)
+
+    async def GenerateTransactionID(self, request, context):
+        return super().GenerateTransactionID(request, context)
+
+    async def GenerateTransactionIDs(self, request, context):
+        return super().GenerateTransactionIDs(request, context)
+
+    async def ViewBalance(self, request, context):
+        """Retrieves account balance from the user's bank using token authentication."""
+        user = authenticated_user(request.token)
+        if not user or user not in self.user_banks:
+            return payment_pb2.BalanceResponse(balance=-1)
+        try:
+            return await self.bank_channels.get_stub(self.user_banks[user]).ViewBalance(request, timeout=TRANSACTION_TIMEOUT)
+        except grpc.RpcError as e:
+            self._on_rpc_error(self.user_banks[user], e)
+            return payment_pb2.BalanceResponse(balance=-1)
+
+    async def Logout(self, request, context):
+        return super().Logout(request, context)
+
+    async def ProcessPayment(self, request, context):
+        """Processes a payment from sender to receiver, ensuring idempotency."""
+        transaction_id = request.transaction_id or str(uuid.uuid4())  # ✅ Generate if empty
+
+        with PAYMENTS_IN_FLIGHT.in_progress():
+            async with self.transaction_locks.hold(transaction_id):
+                return await self._process_payment(request, context, transaction_id)
+
+    async def _process_payment(self, request, context, transaction_id):
+        sender = authenticated_user(request.sender)
+        client_ip = peer_ip(context)
+
+        early_response = await self._blocking(self._check_payment, request, transaction_id, sender, client_ip)
+        if early_response is not None:
+            return early_response
+
+        async with self.account_locks.hold(sender, request.receiver):
+            return await self._transfer(sender, request.receiver, request.amount, transaction_id, client_ip)
+
+    async def ProcessPaymentBatch(self, request, context):
+        """Processes many payments with one batched 2PC round per bank, streaming back the results of each round."""
+        for start in range(0, len(request.payments), MAX_BATCH_SIZE):
+            for response in await self._process_batch(request.payments[start:start + MAX_BATCH_SIZE], context):
+                yield response
+
+    async def ProcessPaymentStream(self, request_iterator, context):
+        """Bidirectional variant of ProcessPaymentBatch: payments are grouped as they arrive."""
+        pending = asyncio.Queue()
+
+        async def read():
+            try:
+                async for request in request_iterator:
+                    pending.put_nowait(request)
+            finally:
+                pending.put_nowait(None)
+
+        reader = asyncio.ensure_future(read())
+        try:
+            finished = False
+            while not finished:
+                # Take whatever has arrived (at least one payment) without waiting for more
+                batch = [await pending.get()]
+                if batch[0] is None:
+                    break
+                while len(batch) < MAX_BATCH_SIZE and not pending.empty():
+                    request = pending.get_nowait()
+                    if request is None:
+                        finished = True
+                        break
+                    batch.append(request)
+                for response in await self._process_batch(batch, context):
+                    yield response
+        finally:
+            reader.cancel()
+
+    async def _process_batch(self, requests, context):
+        """Runs one batch of payments. Returns their responses once its locks are released, so a slow reader holds none."""
+        client_ip = peer_ip(context)
+        transaction_ids = [request.transaction_id or str(uuid.uuid4()) for request in requests]
+
+        with PAYMENTS_IN_FLIGHT.in_progress(len(requests)):
+            async with self.transaction_locks.hold(*transaction_ids):
+                candidates, responses = await self._blocking(self._select_batch, requests, transaction_ids, client_ip)
+
+                accounts = {account for request, _, sender in candidates for account in (sender, request.receiver)}
+                async with self.account_locks.hold(*accounts):
+                    payments, routing_responses = await self._blocking(self._route_batch, candidates, client_ip)
+                    responses += routing_responses
+
+                    await self._wait_durable(await self._blocking(self._start_batch, payments))
+                    started = [payment["transaction_id"] for payment in payments]
+                    try:
+                        # **🔹 PREPARE → COMMIT → INTERBANK TRANSFER**, one batched RPC per bank and phase
+                        for method in BATCH_PHASES:
+                            requests_by_bank = self._group_batch(method, payments)
+                            with PHASE_LATENCY.labels(PHASE_NAMES[method], "batch").time():
+                                results = await self._call_banks_batched(method, requests_by_bank)
+                            payments, failed, phase_responses = await self._blocking(self._settle_batch, method, payments,
+                                                                                     requests_by_bank, results, client_ip)
+                            responses += phase_responses
+                            if method == "PrepareTransactionBatch":
+                                if failed:
+                                    await self._abort_batch(failed)
+                                await self._wait_durable(await self._blocking(self._commit_batch, payments))
+                    finally:
+                        self._in_background(self.coordinator_log.release, *started)
+        return responses
+
+    async def _abort_batch(self, payments):
+        """Records the abort decisions and tells the participants. Returns how many were confirmed by every bank."""
+        await self._blocking(self._record_aborts, payments)
+        requests_by_bank = self._group_batch("AbortTransactionBatch", payments)
+        results = await self._call_banks_batched("AbortTransactionBatch", requests_by_bank)
+        return await self._blocking(self._aborted_batch, payments, requests_by_bank, results)
+
+    def start_recovery(self):
+        """Starts the background task that resolves in-doubt transactions alongside live traffic."""
+        self.recovery_task = asyncio.ensure_future(self._recovery_loop())
+
+    async def _recovery_loop(self):
+        while True:
+            try:
+                resolved = await self.resolve_in_doubt()
+            except Exception as e:
+                log.exception("❌ Recovery pass failed: %s", e)
+                resolved = 0
+            if not resolved:
+                await asyncio.sleep(RECOVERY_INTERVAL)
+
+    async def resolve_in_doubt(self):
+        """Drives one batch of in-doubt transactions to COMMIT or ABORT. Returns how many were finished."""
+        payments = await self._blocking(self.coordinator_log.claim, RECOVERY_BATCH_SIZE)
+        if not payments:
+            return 0
+        transaction_ids = [payment["transaction_id"] for payment in payments]
+        try:
+            async with self.transaction_locks.hold(*transaction_ids):
+                # Presumed abort: without a commit decision, nobody can have committed
+                aborting = [payment for payment in payments if payment["state"] != COMMITTED]
+                committing = [payment for payment in payments if payment["state"] == COMMITTED]
+                resolved = await self._abort_batch(aborting) if aborting else 0
+                if committing:
+                    resolved += await self._recommit_batch(committing)
+            log.info("♻️ Recovery: resolved %d of %d in-doubt transactions", resolved, len(payments))
+            return resolved
+        finally:
+            self._in_background(self.coordinator_log.release, *transaction_ids)
+
+    async def _recommit_batch(self, payments):
+        """Re-sends commits and interbank credits for committed payments. Returns how many completed."""
+        requests_by_bank = self._group_batch("CommitTransactionBatch", payments)
+        payments = self._past_commit(payments, requests_by_bank, await self._call_banks_batched("CommitTransactionBatch", requests_by_bank))
+        requests_by_bank = self._group_batch("InterbankTransferBatch", payments)
+        results = await self._call_banks_batched("InterbankTransferBatch", requests_by_bank)
+        return await self._blocking(self._credited_batch, payments, requests_by_bank, results)
+
+    async def _call_banks_batched(self, method, requests_by_bank):
+        """Sends one batched RPC per bank, concurrently. Returns {bank_name: responses or grpc.RpcError}."""
+        bank_names = list(requests_by_bank)
+        calls = [getattr(self.bank_channels.get_stub(bank_name), method)(
+                     BATCH_REQUEST_TYPES[method](requests=[request for _, request in requests_by_bank[bank_name]]),
+                     timeout=TRANSACTION_TIMEOUT)
+                 for bank_name in bank_names]
+        results = {}
+        for bank_name, response in zip(bank_names, await asyncio.gather(*calls, return_exceptions=True)):
+            if isinstance(response, grpc.RpcError):
+                self._on_rpc_error(bank_name, response)
+                results[bank_name] = response
+            else:
+                results[bank_name] = response.responses
+        return results
+
+    async def _transfer(self, sender, receiver, amount, transaction_id, client_ip):
+        """Runs 2PC for a validated payment. Caller holds the sender and receiver locks."""
+        early_response = await self._blocking(self._check_transfer, sender, receiver, amount, transaction_id, client_ip)
+        if early_response is not None:
+            return early_response
+
+        sender_bank = self.user_banks[sender]
+        receiver_bank = self.user_banks[receiver]
+        participants = self._participants(sender_bank, receiver_bank)
+
+        # ✅ Logged before any bank hears of it, so a crash can't leave funds held forever
+        await self._blocking(self.coordinator_log.start, transaction_id, sender, receiver, amount, participants, receiver_bank)
+        try:
+            # **🔹 PHASE 1: PREPARE PHASE** (all participant banks vote in parallel)
+            with PHASE_LATENCY.labels("prepare", "single").time():
+                rejected_by = await self.prepare_transaction(participants, payment_pb2.PrepareRequest(
+                    transaction_id=transaction_id, sender=sender, receiver=receiver, amount=amount))
+
+            if rejected_by:
+                return await self._blocking(self._prepare_rejected, sender, receiver, amount, transaction_id, client_ip,
+                                            *rejected_by)
+
+            # **🔹 PHASE 2: COMMIT PHASE** (from here on the payment completes, if need be in the background)
+            await self._blocking(self.coordinator_log.commit, transaction_id)
+            with PHASE_LATENCY.labels("commit", "single").time():
+                committed = await self.commit_transaction(participants, transaction_id)
+            if committed:
+                # ✅ Ensure funds are credited to the receiver
+                with PHASE_LATENCY.labels("interbank_transfer", "single").time():
+                    interbank_response = await self.bank_channels.get_stub(receiver_bank).InterbankTransfer(
+                        payment_pb2.BankTransferRequest(sender=sender, receiver=receiver, amount=amount, transaction_id=transaction_id),
+                        timeout=TRANSACTION_TIMEOUT
+                    )
+
+                if not interbank_response.success:
+                    log.warning("❌ Interbank Transfer Failed: %s", interbank_response.message)
+                    return await self._blocking(self._completion_pending, sender, receiver, amount, transaction_id,
+                                                client_ip, "Interbank transfer failed")
+
+                return await self._blocking(self._finish_payment, sender, receiver, amount, transaction_id, client_ip)
+
+            return await self._blocking(self._completion_pending, sender, receiver, amount, transaction_id, client_ip,
+                                        "Commit phase failed")
+
+        except grpc.RpcError as e:
+            error_message = f"Timeout in transaction: {e.details()}"
+            if await self._blocking(self.coordinator_log.state, transaction_id) == COMMITTED:
+                return await self._blocking(self._completion_pending, sender, receiver, amount, transaction_id,
+                                            client_ip, error_message)
+
+            await self._blocking(log_transaction, sender, "interbank_transfer", amount, "FAILED: Timeout in transaction",
+                                 transaction_id, receiver=receiver, sender_bank=sender_bank, receiver_bank=receiver_bank,
+                                 sender_ip=client_ip)
+
+            return payment_pb2.PaymentResponse(success=False, message=error_message, transaction_id=transaction_id)
+        finally:
+            self._in_background(self.coordinator_log.release, transaction_id)  # Whatever is unfinished goes to the recovery worker
+
+    async def prepare_transaction(self, participants, prepare_request):
+        """Phase 1: prepares all participants concurrently; see PaymentGatewayServicer.prepare_transaction."""
+        calls = {asyncio.ensure_future(self.bank_channels.get_stub(bank_name).PrepareTransaction(
+                     prepare_request, timeout=TRANSACTION_TIMEOUT)): bank_name
+                 for bank_name in participants}
+
+        rejected_by, error, pending = None, None, set(calls)
+        while pending and rejected_by is None and error is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for call in done:
+                try:
+                    response = call.result()
+                    if not response.success:
+                        rejected_by = (calls[call], response.message)
+                except grpc.RpcError as e:
+                    log.error("❌ %s: PREPARE FAILED! (%s)", calls[call], e.details())
+                    self._on_rpc_error(calls[call], e)
+                    error = e
+        if rejected_by is None and error is None:
+            return None
+
+        for call in pending:
+            call.cancel()
+        await self.abort_participants(participants, prepare_request.transaction_id)
+        if error is not None:
+            raise error
+        return rejected_by
+
+    async def commit_transaction(self, participants, transaction_id):
+        """Phase 2: commits all participants concurrently. True if all committed."""
+        commit_request = payment_pb2.CommitRequest(transaction_id=transaction_id)
+        calls = [self.bank_channels.get_stub(bank_name).CommitTransaction(commit_request, timeout=TRANSACTION_TIMEOUT)
+                 for bank_name in participants]
+        responses = await asyncio.gather(*calls, return_exceptions=True)
+        for bank_name, response in zip(participants, responses):
+            if isinstance(response, grpc.RpcError):
+                self._on_rpc_error(bank_name, response)
+                raise response
+        return all(response.success for response in responses)
+
+    async def abort_participants(self, participants, transaction_id):
+        """Records the abort decision and tells every participant (not awaited; the recovery worker retries failures)."""
+        await self._blocking(self.coordinator_log.abort, transaction_id)
+        abort_request = payment_pb2.AbortRequest(transaction_id=transaction_id)
+        calls = [asyncio.ensure_future(self.bank_channels.get_stub(bank_name).AbortTransaction(
+                     abort_request, timeout=TRANSACTION_TIMEOUT))
+                 for bank_name in participants]
+
+        def on_done(_):
+            # Retrieving every exception also keeps asyncio from warning about expected failures
+            if all(call.done() for call in calls) and not any(call.cancelled() or call.exception() for call in calls):
+                self._in_background(self.coordinator_log.done, transaction_id)
+
+        for call in calls:
+            call.add_done_callback(on_done)
+
+async def serve():
+    """Starts the grpc.aio payment gateway server with SSL/TLS."""
+    configure_logging()
+    capture = TrafficCapture.from_env(verify_token)  # 🎥 Off unless STRIFE_CAPTURE_FILE is set
+    server = grpc.aio.server(options=SERVER_OPTIONS, interceptors=[AsyncCallInterceptor(capture)])
+
+    # Load TLS credentials (Server Certificate, Private Key, CA Certificate)
+    with open("server.crt", "rb") as f:
+        server_cert = f.read()
+    with open("server.key", "rb") as f:
+        server_key = f.read()
+    with open("ca.crt", "rb") as f:
+        ca_cert = f.read()
+
+    credentials = grpc.ssl_server_credentials([(server_key, server_cert)], root_certificates=ca_cert)
+
+    # Channels to the banks are bound to this event loop, so the servicer is built inside it
+    servicer = AsyncPaymentGatewayServicer()
+    payment_pb2_grpc.add_PaymentGatewayServicer_to_server(servicer, server)
+    servicer.start_recovery()  # ♻️ Resolves in-doubt transactions in the background
+
+    server.add_secure_port("[::]:50051", credentials)
+    await server.start()
+    log.info("🚀 Async Payment Gateway Server running securely on port 50051...")
+    serve_metrics(METRICS_PORT)
+    await server.wait_for_termination()
+
+if __name__ == "__main__":
+    asyncio.run(serve())
@@ -25,7 +25,7 @@ _sym_db = _symbol_database.Default()
 from google.protobuf import empty_pb2 as google_dot_protobuf_dot_empty__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rpayment.proto\x12\x07payment\x1a\x1bgoogle/protobuf/empty.proto\"C\n\nClientInfo\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x10\n\x08password\x18\x02 \x01(\t\x12\x11\n\tbank_name\x18\x03 \x01(\t\"4\n\x10RegisterResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"5\n\x0fUserCredentials\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x10\n\x08password\x18\x02 \x01(\t\".\n\x0c\x41uthResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\r\n\x05token\x18\x02 \x01(\t\"-\n\x13TransactionResponse\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\"Z\n\x0ePaymentRequest\x12\x0e\n\x06sender\x18\x01 \x01(\t\x12\x10\n\x08receiver\x18\x02 \x01(\t\x12\x0e\n\x06\x61mount\x18\x03 \x01(\x01\x12\x16\n\x0etransaction_id\x18\x04 \x01(\t\"\x89\x01\n\x0fPaymentResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x16\n\x0etransaction_id\x18\x03 \x01(\t\x12\x10\n\x08receiver\x18\x04 \x01(\t\x12\x13\n\x0bsender_bank\x18\x05 \x01(\t\x12\x15\n\rreceiver_bank\x18\x06 \x01(\t\"_\n\x13\x42\x61nkTransferRequest\x12\x0e\n\x06sender\x18\x01 \x01(\t\x12\x10\n\x08receiver\x18\x02 \x01(\t\x12\x0e\n\x06\x61mount\x18\x03 \x01(\x01\x12\x16\n\x0etransaction_id\x18\x04 \x01(\t\"P\n\x14\x42\x61nkTransferResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x16\n\x0etransaction_id\x18\x03 \x01(\t\"Z\n\x0ePrepareRequest\x12\x0e\n\x06sender\x18\x01 \x01(\t\x12\x10\n\x08receiver\x18\x02 \x01(\t\x12\x0e\n\x06\x61mount\x18\x03 \x01(\x01\x12\x16\n\x0etransaction_id\x18\x04 \x01(\t\"3\n\x0fPrepareResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"\'\n\rCommitRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\"2\n\x0e\x43ommitResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"&\n\x0c\x41\x62ortRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\"1\n\rAbortResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"\x1f\n\x0e\x42\x61lanceRequest\x12\r\n\x05token\x18\x01 \x01(\t\"D\n\x0f\x42\x61lanceResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07\x62\x61lance\x18\x02 \x01(\x01\x12\x0f\n\x07message\x18\x03 \x01(\t2\xef\x02\n\x0ePaymentGateway\x12@\n\x0eRegisterClient\x12\x13.payment.ClientInfo\x1a\x19.payment.RegisterResponse\x12\x45\n\x12\x41uthenticateClient\x12\x18.payment.UserCredentials\x1a\x15.payment.AuthResponse\x12M\n\x15GenerateTransactionID\x12\x16.google.protobuf.Empty\x1a\x1c.payment.TransactionResponse\x12\x43\n\x0eProcessPayment\x12\x17.payment.PaymentRequest\x1a\x18.payment.PaymentResponse\x12@\n\x0bViewBalance\x12\x17.payment.BalanceRequest\x1a\x18.payment.BalanceResponse2\xb1\x02\n\x0b\x42\x61nkService\x12P\n\x11InterbankTransfer\x12\x1c.payment.BankTransferRequest\x1a\x1d.payment.BankTransferResponse\x12G\n\x12PrepareTransaction\x12\x17.payment.PrepareRequest\x1a\x18.payment.PrepareResponse\x12\x44\n\x11\x43ommitTransaction\x12\x16.payment.CommitRequest\x1a\x17.payment.CommitResponse\x12\x41\n\x10\x41\x62ortTransaction\x12\x15.payment.AbortRequest\x1a\x16.payment.AbortResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rpayment.proto\x12\x07payment\x1a\x1bgoogle/protobuf/empty.proto\"C\n\nClientInfo\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x10\n\x08password\x18\x02 \x01(\t\x12\x11\n\tbank_name\x18\x03 \x01(\t\"4\n\x10RegisterResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"5\n\x0fUserCredentials\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x10\n\x08password\x18\x02 \x01(\t\".\n\x0c\x41uthResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\r\n\x05token\x18\x02 \x01(\t\"-\n\x13TransactionResponse\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\"*\n\x19TransactionIDRangeRequest\x12\r\n\x05\x63ount\x18\x01 \x01(\x05\"5\n\x12TransactionIDRange\x12\x10\n\x08\x66irst_id\x18\x01 \x01(\x04\x12\r\n\x05\x63ount\x18\x02 \x01(\x05\"Z\n\x0ePaymentRequest\x12\x0e\n\x06sender\x18\x01 \x01(\t\x12\x10\n\x08receiver\x18\x02 \x01(\t\x12\x0e\n\x06\x61mount\x18\x03 \x01(\x01\x12\x16\n\x0etransaction_id\x18\x04 \x01(\t\"\x89\x01\n\x0fPaymentResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x16\n\x0etransaction_id\x18\x03 \x01(\t\x12\x10\n\x08receiver\x18\x04 \x01(\t\x12\x13\n\x0bsender_bank\x18\x05 \x01(\t\x12\x15\n\rreceiver_bank\x18\x06 \x01(\t\"@\n\x13PaymentBatchRequest\x12)\n\x08payments\x18\x01 \x03(\x0b\x32\x17.payment.PaymentRequest\"_\n\x13\x42\x61nkTransferRequest\x12\x0e\n\x06sender\x18\x01 \x01(\t\x12\x10\n\x08receiver\x18\x02 \x01(\t\x12\x0e\n\x06\x61mount\x18\x03 \x01(\x01\x12\x16\n\x0etransaction_id\x18\x04 \x01(\t\"P\n\x14\x42\x61nkTransferResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x16\n\x0etransaction_id\x18\x03 \x01(\t\"Z\n\x0ePrepareRequest\x12\x0e\n\x06sender\x18\x01 \x01(\t\x12\x10\n\x08receiver\x18\x02 \x01(\t\x12\x0e\n\x06\x61mount\x18\x03 \x01(\x01\x12\x16\n\x0etransaction_id\x18\x04 \x01(\t\"3\n\x0fPrepareResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"\'\n\rCommitRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\"2\n\x0e\x43ommitResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"&\n\x0c\x41\x62ortRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\"1\n\rAbortResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"J\n\x18\x42\x61nkTransferBatchRequest\x12.\n\x08requests\x18\x01 \x03(\x0b\x32\x1c.payment.BankTransferRequest\"M\n\x19\x42\x61nkTransferBatchResponse\x12\x30\n\tresponses\x18\x01 \x03(\x0b\x32\x1d.payment.BankTransferResponse\"@\n\x13PrepareBatchRequest\x12)\n\x08requests\x18\x01 \x03(\x0b\x32\x17.payment.PrepareRequest\"C\n\x14PrepareBatchResponse\x12+\n\tresponses\x18\x01 \x03(\x0b\x32\x18.payment.PrepareResponse\">\n\x12\x43ommitBatchRequest\x12(\n\x08requests\x18\x01 \x03(\x0b\x32\x16.payment.CommitRequest\"A\n\x13\x43ommitBatchResponse\x12*\n\tresponses\x18\x01 \x03(\x0b\x32\x17.payment.CommitResponse\"<\n\x11\x41\x62ortBatchRequest\x12\'\n\x08requests\x18\x01 \x03(\x0b\x32\x15.payment.AbortRequest\"?\n\x12\x41\x62ortBatchResponse\x12)\n\tresponses\x18\x01 \x03(\x0b\x32\x16.payment.AbortResponse\"\x1f\n\x0e\x42\x61lanceRequest\x12\r\n\x05token\x18\x01 \x01(\t\"D\n\x0f\x42\x61lanceResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07\x62\x61lance\x18\x02 \x01(\x01\x12\x0f\n\x07message\x18\x03 \x01(\t\"\x1e\n\rLogoutRequest\x12\r\n\x05token\x18\x01 \x01(\t2\xa4\x05\n\x0ePaymentGateway\x12@\n\x0eRegisterClient\x12\x13.payment.ClientInfo\x1a\x19.payment.RegisterResponse\x12\x45\n\x12\x41uthenticateClient\x12\x18.payment.UserCredentials\x1a\x15.payment.AuthResponse\x12M\n\x15GenerateTransactionID\x12\x16.google.protobuf.Empty\x1a\x1c.payment.TransactionResponse\x12Y\n\x16GenerateTransactionIDs\x12\".payment.TransactionIDRangeRequest\x1a\x1b.payment.TransactionIDRange\x12\x43\n\x0eProcessPayment\x12\x17.payment.PaymentRequest\x1a\x18.payment.PaymentResponse\x12@\n\x0bViewBalance\x12\x17.payment.BalanceRequest\x1a\x18.payment.BalanceResponse\x12O\n\x13ProcessPaymentBatch\x12\x1c.payment.PaymentBatchRequest\x1a\x18.payment.PaymentResponse0\x01\x12M\n\x14ProcessPaymentStream\x12\x17.payment.PaymentRequest\x1a\x18.payment.PaymentResponse(\x01\x30\x01\x12\x38\n\x06Logout\x12\x16.payment.LogoutRequest\x1a\x16.google.protobuf.Empty2\x9a\x06\n\x0b\x42\x61nkService\x12P\n\x11InterbankTransfer\x12\x1c.payment.BankTransferRequest\x1a\x1d.payment.BankTransferResponse\x12G\n\x12PrepareTransaction\x12\x17.payment.PrepareRequest\x1a\x18.payment.PrepareResponse\x12\x44\n\x11\x43ommitTransaction\x12\x16.payment.CommitRequest\x1a\x17.payment.CommitResponse\x12\x41\n\x10\x41\x62ortTransaction\x12\x15.payment.AbortRequest\x1a\x16.payment.AbortResponse\x12_\n\x16InterbankTransferBatch\x12!.payment.BankTransferBatchRequest\x1a\".payment.BankTransferBatchResponse\x12V\n\x17PrepareTransactionBatch\x12\x1c.payment.PrepareBatchRequest\x1a\x1d.payment.PrepareBatchResponse\x12S\n\x16\x43ommitTransactionBatch\x12\x1b.payment.CommitBatchRequest\x1a\x1c.payment.CommitBatchResponse\x12P\n\x15\x41\x62ortTransactionBatch\x12\x1a.payment.AbortBatchRequest\x1a\x1b.payment.AbortBatchResponse\x12\x45\n\x12\x41uthenticateClient\x12\x18.payment.UserCredentials\x1a\x15.payment.AuthResponse\x12@\n\x0bViewBalance\x12\x17.payment.BalanceRequest\x1a\x18.payment.BalanceResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -42,32 +42,56 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_AUTHRESPONSE']._serialized_end=279
   _globals['_TRANSACTIONRESPONSE']._serialized_start=281
   _globals['_TRANSACTIONRESPONSE']._serialized_end=326
-  _globals['_PAYMENTREQUEST']._serialized_start=328
-  _globals['_PAYMENTREQUEST']._serialized_end=418
-  _globals['_PAYMENTRESPONSE']._serialized_start=421
-  _globals['_PAYMENTRESPONSE']._serialized_end=558
-  _globals['_BANKTRANSFERREQUEST']._serialized_start=560
-  _globals['_BANKTRANSFERREQUEST']._serialized_end=655
-  _globals['_BANKTRANSFERRESPONSE']._serialized_start=657
-  _globals['_BANKTRANSFERRESPONSE']._serialized_end=737
-  _globals['_PREPAREREQUEST']._serialized_start=739
-  _globals['_PREPAREREQUEST']._serialized_end=829
-  _globals['_PREPARERESPONSE']._serialized_start=831
-  _globals['_PREPARERESPONSE']._serialized_end=882
-  _globals['_COMMITREQUEST']._serialized_start=884
-  _globals['_COMMITREQUEST']._serialized_end=923
-  _globals['_COMMITRESPONSE']._serialized_start=925
-  _globals['_COMMITRESPONSE']._serialized_end=975
-  _globals['_ABORTREQUEST']._serialized_start=977
-  _globals['_ABORTREQUEST']._serialized_end=1015
-  _globals['_ABORTRESPONSE']._serialized_start=1017
-  _globals['_ABORTRESPONSE']._serialized_end=1066
-  _globals['_BALANCEREQUEST']._serialized_start=1068
-  _globals['_BALANCEREQUEST']._serialized_end=1099
-  _globals['_BALANCERESPONSE']._serialized_start=1101
-  _globals['_BALANCERESPONSE']._serialized_end=1169
-  _globals['_PAYMENTGATEWAY']._serialized_start=1172
-  _globals['_PAYMENTGATEWAY']._serialized_end=1539
-  _globals['_BANKSERVICE']._serialized_start=1542
-  _globals['_BANKSERVICE']._serialized_end=1847
+  _globals['_TRANSACTIONIDRANGEREQUEST']._serialized_start=328
+  _globals['_TRANSACTIONIDRANGEREQUEST']._serialized_end=370
+  _globals['_TRANSACTIONIDRANGE']._serialized_start=372
+  _globals['_TRANSACTIONIDRANGE']._serialized_end=425
+  _globals['_PAYMENTREQUEST']._serialized_start=427
+  _globals['_PAYMENTREQUEST']._serialized_end=517
+  _globals['_PAYMENTRESPONSE']._serialized_start=520
+  _globals['_PAYMENTRESPONSE']._serialized_end=657
+  _globals['_PAYMENTBATCHREQUEST']._serialized_start=659
+  _globals['_PAYMENTBATCHREQUEST']._serialized_end=723
+  _globals['_BANKTRANSFERREQUEST']._serialized_start=725
+  _globals['_BANKTRANSFERREQUEST']._serialized_end=820
+  _globals['_BANKTRANSFERRESPONSE']._serialized_start=822
+  _globals['_BANKTRANSFERRESPONSE']._serialized_end=902
+  _globals['_PREPAREREQUEST']._serialized_start=904
+  _globals['_PREPAREREQUEST']._serialized_end=994
+  _globals['_PREPARERESPONSE']._serialized_start=996
+  _globals['_PREPARERESPONSE']._serialized_end=1047
+  _globals['_COMMITREQUEST']._serialized_start=1049
+  _globals['_COMMITREQUEST']._serialized_end=1088
+  _globals['_COMMITRESPONSE']._serialized_start=1090
+  _globals['_COMMITRESPONSE']._serialized_end=1140
+  _globals['_ABORTREQUEST']._serialized_start=1142
+  _globals['_ABORTREQUEST']._serialized_end=1180
+  _globals['_ABORTRESPONSE']._serialized_start=1182
+  _globals['_ABORTRESPONSE']._serialized_end=1231
+  _globals['_BANKTRANSFERBATCHREQUEST']._serialized_start=1233
+  _globals['_BANKTRANSFERBATCHREQUEST']._serialized_end=1307
+  _globals['_BANKTRANSFERBATCHRESPONSE']._serialized_start=1309
+  _globals['_BANKTRANSFERBATCHRESPONSE']._serialized_end=1386
+  _globals['_PREPAREBATCHREQUEST']._serialized_start=1388
+  _globals['_PREPAREBATCHREQUEST']._serialized_end=1452
+  _globals['_PREPAREBATCHRESPONSE']._serialized_start=1454
+  _globals['_PREPAREBATCHRESPONSE']._serialized_end=1521
+  _globals['_COMMITBATCHREQUEST']._serialized_start=1523
+  _globals['_COMMITBATCHREQUEST']._serialized_end=1585
+  _globals['_COMMITBATCHRESPONSE']._serialized_start=1587
+  _globals['_COMMITBATCHRESPONSE']._serialized_end=1652
+  _globals['_ABORTBATCHREQUEST']._serialized_start=1654
+  _globals['_ABORTBATCHREQUEST']._serialized_end=1714
+  _globals['_ABORTBATCHRESPONSE']._serialized_start=1716
+  _globals['_ABORTBATCHRESPONSE']._serialized_end=1779
+  _globals['_BALANCEREQUEST']._serialized_start=1781
+  _globals['_BALANCEREQUEST']._serialized_end=1812
+  _globals['_BALANCERESPONSE']._serialized_start=1814
+  _globals['_BALANCERESPONSE']._serialized_end=1882
+  _globals['_LOGOUTREQUEST']._serialized_start=1884
+  _globals['_LOGOUTREQUEST']._serialized_end=1914
+  _globals['_PAYMENTGATEWAY']._serialized_start=1917
+  _globals['_PAYMENTGATEWAY']._serialized_end=2593
+  _globals['_BANKSERVICE']._serialized_start=2596
+  _globals['_BANKSERVICE']._serialized_end=3390
 # @@protoc_insertion_point(module_scope)
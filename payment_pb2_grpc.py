@@ -51,6 +51,11 @@ class PaymentGatewayStub(object):
                 request_serializer=google_dot_protobuf_dot_empty__pb2.Empty.SerializeToString,
                 response_deserializer=payment__pb2.TransactionResponse.FromString,
                 _registered_method=True)
+        self.GenerateTransactionIDs = channel.unary_unary(
+                '/payment.PaymentGateway/GenerateTransactionIDs',
+                request_serializer=payment__pb2.TransactionIDRangeRequest.SerializeToString,
+                response_deserializer=payment__pb2.TransactionIDRange.FromString,
+                _registered_method=True)
         self.ProcessPayment = channel.unary_unary(
                 '/payment.PaymentGateway/ProcessPayment',
                 request_serializer=payment__pb2.PaymentRequest.SerializeToString,
@@ -61,6 +66,21 @@ class PaymentGatewayStub(object):
                 request_serializer=payment__pb2.BalanceRequest.SerializeToString,
                 response_deserializer=payment__pb2.BalanceResponse.FromString,
                 _registered_method=True)
+        self.ProcessPaymentBatch = channel.unary_stream(
+                '/payment.PaymentGateway/ProcessPaymentBatch',
+                request_serializer=payment__pb2.PaymentBatchRequest.SerializeToString,
+                response_deserializer=payment__pb2.PaymentResponse.FromString,
+                _registered_method=True)
+        self.ProcessPaymentStream = channel.stream_stream(
+                '/payment.PaymentGateway/ProcessPaymentStream',
+                request_serializer=payment__pb2.PaymentRequest.SerializeToString,
+                response_deserializer=payment__pb2.PaymentResponse.FromString,
+                _registered_method=True)
+        self.Logout = channel.unary_unary(
+                '/payment.PaymentGateway/Logout',
+                request_serializer=payment__pb2.LogoutRequest.SerializeToString,
+                response_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
+                _registered_method=True)
 
 
 class PaymentGatewayServicer(object):
@@ -85,6 +105,13 @@ class PaymentGatewayServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GenerateTransactionIDs(self, request, context):
+        """✅ Many IDs per round trip
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def ProcessPayment(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -97,6 +124,27 @@ class PaymentGatewayServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def ProcessPaymentBatch(self, request, context):
+        """✅ One response per payment
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ProcessPaymentStream(self, request_iterator, context):
+        """✅ Bidirectional variant
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Logout(self, request, context):
+        """✅ Revokes the session token
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_PaymentGatewayServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -115,6 +163,11 @@ def add_PaymentGatewayServicer_to_server(servicer, server):
                     request_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
                     response_serializer=payment__pb2.TransactionResponse.SerializeToString,
             ),
+            'GenerateTransactionIDs': grpc.unary_unary_rpc_method_handler(
+                    servicer.GenerateTransactionIDs,
+                    request_deserializer=payment__pb2.TransactionIDRangeRequest.FromString,
+                    response_serializer=payment__pb2.TransactionIDRange.SerializeToString,
+            ),
             'ProcessPayment': grpc.unary_unary_rpc_method_handler(
                     servicer.ProcessPayment,
                     request_deserializer=payment__pb2.PaymentRequest.FromString,
@@ -125,6 +178,21 @@ def add_PaymentGatewayServicer_to_server(servicer, server):
                     request_deserializer=payment__pb2.BalanceRequest.FromString,
                     response_serializer=payment__pb2.BalanceResponse.SerializeToString,
             ),
+            'ProcessPaymentBatch': grpc.unary_stream_rpc_method_handler(
+                    servicer.ProcessPaymentBatch,
+                    request_deserializer=payment__pb2.PaymentBatchRequest.FromString,
+                    response_serializer=payment__pb2.PaymentResponse.SerializeToString,
+            ),
+            'ProcessPaymentStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.ProcessPaymentStream,
+                    request_deserializer=payment__pb2.PaymentRequest.FromString,
+                    response_serializer=payment__pb2.PaymentResponse.SerializeToString,
+            ),
+            'Logout': grpc.unary_unary_rpc_method_handler(
+                    servicer.Logout,
+                    request_deserializer=payment__pb2.LogoutRequest.FromString,
+                    response_serializer=google_dot_protobuf_dot_empty__pb2.Empty.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'payment.PaymentGateway', rpc_method_handlers)
@@ -218,6 +286,33 @@ class PaymentGateway(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def GenerateTransactionIDs(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/payment.PaymentGateway/GenerateTransactionIDs',
+            payment__pb2.TransactionIDRangeRequest.SerializeToString,
+            payment__pb2.TransactionIDRange.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def ProcessPayment(request,
             target,
@@ -272,6 +367,87 @@ class PaymentGateway(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def ProcessPaymentBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/payment.PaymentGateway/ProcessPaymentBatch',
+            payment__pb2.PaymentBatchRequest.SerializeToString,
+            payment__pb2.PaymentResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ProcessPaymentStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/payment.PaymentGateway/ProcessPaymentStream',
+            payment__pb2.PaymentRequest.SerializeToString,
+            payment__pb2.PaymentResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Logout(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/payment.PaymentGateway/Logout',
+            payment__pb2.LogoutRequest.SerializeToString,
+            google_dot_protobuf_dot_empty__pb2.Empty.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
 
 class BankServiceStub(object):
     """🔹 Bank Service for Interbank Transfers with 2PC
@@ -303,6 +479,36 @@ class BankServiceStub(object):
                 request_serializer=payment__pb2.AbortRequest.SerializeToString,
                 response_deserializer=payment__pb2.AbortResponse.FromString,
                 _registered_method=True)
+        self.InterbankTransferBatch = channel.unary_unary(
+                '/payment.BankService/InterbankTransferBatch',
+                request_serializer=payment__pb2.BankTransferBatchRequest.SerializeToString,
+                response_deserializer=payment__pb2.BankTransferBatchResponse.FromString,
+                _registered_method=True)
+        self.PrepareTransactionBatch = channel.unary_unary(
+                '/payment.BankService/PrepareTransactionBatch',
+                request_serializer=payment__pb2.PrepareBatchRequest.SerializeToString,
+                response_deserializer=payment__pb2.PrepareBatchResponse.FromString,
+                _registered_method=True)
+        self.CommitTransactionBatch = channel.unary_unary(
+                '/payment.BankService/CommitTransactionBatch',
+                request_serializer=payment__pb2.CommitBatchRequest.SerializeToString,
+                response_deserializer=payment__pb2.CommitBatchResponse.FromString,
+                _registered_method=True)
+        self.AbortTransactionBatch = channel.unary_unary(
+                '/payment.BankService/AbortTransactionBatch',
+                request_serializer=payment__pb2.AbortBatchRequest.SerializeToString,
+                response_deserializer=payment__pb2.AbortBatchResponse.FromString,
+                _registered_method=True)
+        self.AuthenticateClient = channel.unary_unary(
+                '/payment.BankService/AuthenticateClient',
+                request_serializer=payment__pb2.UserCredentials.SerializeToString,
+                response_deserializer=payment__pb2.AuthResponse.FromString,
+                _registered_method=True)
+        self.ViewBalance = channel.unary_unary(
+                '/payment.BankService/ViewBalance',
+                request_serializer=payment__pb2.BalanceRequest.SerializeToString,
+                response_deserializer=payment__pb2.BalanceResponse.FromString,
+                _registered_method=True)
 
 
 class BankServiceServicer(object):
@@ -336,6 +542,44 @@ class BankServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def InterbankTransferBatch(self, request, context):
+        """✅ Batched variants: responses are returned in request order
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def PrepareTransactionBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CommitTransactionBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def AbortTransactionBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def AuthenticateClient(self, request, context):
+        """✅ Each bank owns its customers' accounts; the gateway forwards logins and balance checks
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ViewBalance(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_BankServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -359,6 +603,36 @@ def add_BankServiceServicer_to_server(servicer, server):
                     request_deserializer=payment__pb2.AbortRequest.FromString,
                     response_serializer=payment__pb2.AbortResponse.SerializeToString,
             ),
+            'InterbankTransferBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.InterbankTransferBatch,
+                    request_deserializer=payment__pb2.BankTransferBatchRequest.FromString,
+                    response_serializer=payment__pb2.BankTransferBatchResponse.SerializeToString,
+            ),
+            'PrepareTransactionBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.PrepareTransactionBatch,
+                    request_deserializer=payment__pb2.PrepareBatchRequest.FromString,
+                    response_serializer=payment__pb2.PrepareBatchResponse.SerializeToString,
+            ),
+            'CommitTransactionBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.CommitTransactionBatch,
+                    request_deserializer=payment__pb2.CommitBatchRequest.FromString,
+                    response_serializer=payment__pb2.CommitBatchResponse.SerializeToString,
+            ),
+            'AbortTransactionBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.AbortTransactionBatch,
+                    request_deserializer=payment__pb2.AbortBatchRequest.FromString,
+                    response_serializer=payment__pb2.AbortBatchResponse.SerializeToString,
+            ),
+            'AuthenticateClient': grpc.unary_unary_rpc_method_handler(
+                    servicer.AuthenticateClient,
+                    request_deserializer=payment__pb2.UserCredentials.FromString,
+                    response_serializer=payment__pb2.AuthResponse.SerializeToString,
+            ),
+            'ViewBalance': grpc.unary_unary_rpc_method_handler(
+                    servicer.ViewBalance,
+                    request_deserializer=payment__pb2.BalanceRequest.FromString,
+                    response_serializer=payment__pb2.BalanceResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'payment.BankService', rpc_method_handlers)
@@ -478,3 +752,165 @@ class BankService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def InterbankTransferBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/payment.BankService/InterbankTransferBatch',
+            payment__pb2.BankTransferBatchRequest.SerializeToString,
+            payment__pb2.BankTransferBatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def PrepareTransactionBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/payment.BankService/PrepareTransactionBatch',
+            payment__pb2.PrepareBatchRequest.SerializeToString,
+            payment__pb2.PrepareBatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def CommitTransactionBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/payment.BankService/CommitTransactionBatch',
+            payment__pb2.CommitBatchRequest.SerializeToString,
+            payment__pb2.CommitBatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def AbortTransactionBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/payment.BankService/AbortTransactionBatch',
+            payment__pb2.AbortBatchRequest.SerializeToString,
+            payment__pb2.AbortBatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def AuthenticateClient(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/payment.BankService/AuthenticateClient',
+            payment__pb2.UserCredentials.SerializeToString,
+            payment__pb2.AuthResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ViewBalance(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/payment.BankService/ViewBalance',
+            payment__pb2.BalanceRequest.SerializeToString,
+            payment__pb2.BalanceResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
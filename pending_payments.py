@@ -1,54 +1,201 @@
-import os
+import contextlib
+import fcntl
 import json
+import os
+import threading
+import uuid
+from urllib.parse import quote
 
-PENDING_PAYMENTS_FILE = "pending_payments.json"
-
-def load_pending_payments():
-    """Loads pending payments from file, returning a dict of {username: [transactions]}."""
-    if not os.path.exists(PENDING_PAYMENTS_FILE):
-        with open(PENDING_PAYMENTS_FILE, "w") as f:
-            json.dump({}, f)  # ✅ Store transactions per user
-    try:
-        with open(PENDING_PAYMENTS_FILE, "r") as f:
-            data = json.load(f)
-            return data if isinstance(data, dict) else {}  # ✅ Ensure data is a dictionary
-    except json.JSONDecodeError:
-        return {}  # If file is corrupted, reset it
-
-def save_pending_payments(pending_payments):
-    """Saves pending transactions to the file."""
-    with open(PENDING_PAYMENTS_FILE, "w") as f:
-        json.dump(pending_payments, f, indent=4)
+PENDING_PAYMENTS_FILE = "pending_payments.json"  # Legacy single-file queue, imported once
+PENDING_PAYMENTS_DIR = "pending_payments"  # One journal segment per user
+COMPACT_AFTER = 1000  # Records in a segment before it is rewritten with only the queued payments
 
-def save_pending_payment(username, payment_data):
-    """Save a pending payment under the specific username."""
-    pending_payments = load_pending_payments()
+class PendingPaymentQueue:
+    """Journaled offline-payment queue with one append-only segment per user.
+
+    Each segment line is a JSON record:
+      ["Q", payment_data]       queued
+      ["A", transaction_id]     acknowledged (a tombstone)
+      ["A", null]               drops every payment queued without a transaction ID
+      ["S", generation]         first line of a compacted segment
+    Enqueue and acknowledge append one record under an flock on the user's segment, so
+    their cost doesn't depend on anyone else's queue and concurrent clients can't lose
+    each other's writes. Once a segment holds more than COMPACT_AFTER records (and
+    twice the queued payments), it is atomically rewritten with just the queued ones.
+    """
+
+    def __init__(self, queue_dir=PENDING_PAYMENTS_DIR, legacy_file=PENDING_PAYMENTS_FILE, compact_after=COMPACT_AFTER):
+        self.queue_dir = queue_dir
+        self.compact_after = compact_after
+        self.segments = {}  # username -> {"generation", "offset", "records", "payments", "by_id"}, caught up lazily
+        self.lock = threading.Lock()
+        if not os.path.isdir(queue_dir):
+            self._import_legacy(legacy_file)
+
+    def _import_legacy(self, legacy_file):
+        """Moves a pending_payments.json queue into per-user segments (the directory marks it as done)."""
+        tmp_dir = f"{self.queue_dir}.{os.getpid()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        try:
+            with open(legacy_file, "r") as f:
+                legacy = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            legacy = {}
+        for username, payments in (legacy if isinstance(legacy, dict) else {}).items():
+            with open(os.path.join(tmp_dir, self._segment_name(username)), "w") as f:
+                f.writelines(json.dumps(["Q", payment]) + "\n" for payment in payments)
+        try:
+            os.rename(tmp_dir, self.queue_dir)
+        except OSError:
+            # Another client imported it first
+            for name in os.listdir(tmp_dir):
+                os.remove(os.path.join(tmp_dir, name))
+            os.rmdir(tmp_dir)
+
+    @staticmethod
+    def _segment_name(username):
+        return quote(username, safe="") + ".log"
+
+    @contextlib.contextmanager
+    def _locked_segment(self, username):
+        """Opens the user's segment for appending and holds its flock (retrying if it was compacted meanwhile)."""
+        path = os.path.join(self.queue_dir, self._segment_name(username))
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                break
+            os.close(fd)
+        try:
+            with self.lock:
+                yield path, fd, self._catch_up(username, fd)
+        finally:
+            os.close(fd)
+
+    def _catch_up(self, username, fd):
+        """Applies records appended since this process last read the segment."""
+        # Inodes get reused, so a compacted segment is recognised by its generation header instead
+        head = os.pread(fd, 64, 0).partition(b"\n")[0]
+        generation = json.loads(head)[1] if head.startswith(b'["S"') else None
+        segment = self.segments.get(username)
+        if segment is None or segment["generation"] != generation:
+            segment = self.segments[username] = self._new_segment(None, 0, [])
+
+        size = os.fstat(fd).st_size
+        if size > segment["offset"]:
+            chunk = os.pread(fd, size - segment["offset"], segment["offset"])
+            end = chunk.rfind(b"\n") + 1
+            for raw in chunk[:end].splitlines():
+                try:
+                    self._apply(segment, json.loads(raw))
+                except (ValueError, IndexError, TypeError):
+                    continue  # Skip corrupted lines
+            segment["offset"] += end
+            if end < len(chunk):
+                os.ftruncate(fd, segment["offset"])  # Torn write from a crashed client; we hold the flock
+        return segment
+
+    def _new_segment(self, generation, offset, payments):
+        segment = {"generation": generation, "offset": offset, "records": 0, "payments": {}, "by_id": {}}
+        for payment in payments:
+            self._apply(segment, ["Q", payment])
+        return segment
+
+    def _apply(self, segment, record):
+        kind, value = record[0], record[1]
+        if kind == "Q":
+            key = segment["records"]  # Position in the segment, since unassigned IDs aren't unique
+            segment["payments"][key] = value
+            segment["by_id"].setdefault(value.get("transaction_id"), []).append(key)
+        elif kind == "A":
+            for key in segment["by_id"].pop(value, ()):
+                segment["payments"].pop(key, None)
+        elif kind == "S":
+            segment["generation"] = value
+        else:
+            raise ValueError(f"Unknown pending-payment record: {kind!r}")
+        segment["records"] += 1
 
-    if username not in pending_payments:
-        pending_payments[username] = []  # ✅ Ensure user has a queue
+    def _append(self, path, fd, segment, records):
+        data = "".join(json.dumps(record) + "\n" for record in records).encode()
+        os.write(fd, data)
+        for record in records:
+            self._apply(segment, record)
+        segment["offset"] += len(data)
+        if segment["records"] >= max(self.compact_after, 2 * len(segment["payments"])):
+            self._compact(path, segment)
 
-    pending_payments[username].append(payment_data)
-    save_pending_payments(pending_payments)
+    def _compact(self, path, segment):
+        """Rewrites the segment with only the queued payments. Caller holds the segment's flock."""
+        tmp_file = f"{path}.{os.getpid()}.tmp"
+        generation = uuid.uuid4().hex
+        payments = list(segment["payments"].values())
+        with open(tmp_file, "w") as f:
+            f.write(json.dumps(["S", generation]) + "\n")
+            f.writelines(json.dumps(["Q", payment]) + "\n" for payment in payments)
+        os.replace(tmp_file, path)
+        # Writers still waiting on the old file notice the new inode and reopen
+        segment.update(self._new_segment(generation, os.path.getsize(path), payments))
+
+    def enqueue(self, username, payment_data):
+        with self._locked_segment(username) as (path, fd, segment):
+            self._append(path, fd, segment, [["Q", payment_data]])
+
+    def pending(self, username):
+        with self._locked_segment(username) as (_, _, segment):
+            return [dict(payment) for payment in segment["payments"].values()]
+
+    def assign_ids(self, username, transaction_ids):
+        """Gives each payment queued without a transaction ID one of `transaction_ids`.
+
+        The copies with IDs and the tombstone for the originals go in one append, so an
+        original can't be left behind to be sent again under another ID. Returns False,
+        changing nothing, if there are more such payments than IDs.
+        """
+        with self._locked_segment(username) as (path, fd, segment):
+            unassigned = [segment["payments"][key] for key in segment["by_id"].get(None, ())]
+            if len(unassigned) > len(transaction_ids):
+                return False
+            if unassigned:
+                records = [["Q", dict(payment, transaction_id=transaction_id)]
+                           for payment, transaction_id in zip(unassigned, transaction_ids)]
+                self._append(path, fd, segment, records + [["A", None]])
+            return True
+
+    def acknowledge(self, username, transaction_ids, drop_unassigned=True):
+        """Removes the given transactions (and, by default, payments queued without an ID)."""
+        records = [["A", transaction_id] for transaction_id in transaction_ids]
+        if drop_unassigned:
+            records.append(["A", None])
+        with self._locked_segment(username) as (path, fd, segment):
+            self._append(path, fd, segment, records)
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_pending_queue():
+    """Returns the process-wide pending payment queue, importing pending_payments.json on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = PendingPaymentQueue()
+    return _queue
+
+def save_pending_payment(username, payment_data):
+    """Save a pending payment under the specific username."""
+    get_pending_queue().enqueue(username, payment_data)
 
 def get_user_pending_payments(username):
     """Returns the pending payments for a specific user."""
-    pending_payments = load_pending_payments()
-    return pending_payments.get(username, [])  
-
-
-def remove_successful_payments(username, successful_transactions):
-    """Removes successfully processed transactions and transactions with `null` IDs for a specific user."""
-    pending_payments = load_pending_payments()
-    
-    if username in pending_payments:
-        # ✅ Remove transactions that were successfully processed OR have `null` transaction IDs
-        pending_payments[username] = [
-            p for p in pending_payments[username] if p["transaction_id"] not in successful_transactions and p["transaction_id"] is not None
-        ]
-
-        # ✅ If the user has no more pending transactions, remove their entry
-        if not pending_payments[username]:
-            del pending_payments[username]
-
-    save_pending_payments(pending_payments)
-    print(f"✅ Cleaned up {len(successful_transactions)} successful transactions and removed `null` IDs for {username}.")
\ No newline at end of file
+    return get_pending_queue().pending(username)
+
+def assign_pending_ids(username, transaction_ids):
+    """Gives a user's payments queued without a transaction ID one each; False if there are too few IDs."""
+    return get_pending_queue().assign_ids(username, transaction_ids)
+
+def remove_successful_payments(username, successful_transactions, drop_unassigned=True):
+    """Removes successfully processed transactions and (unless told not to) transactions with `null` IDs for a specific user."""
+    get_pending_queue().acknowledge(username, successful_transactions, drop_unassigned)
+    print(f"✅ Cleaned up {len(successful_transactions)} successful transactions"
+          f"{' and removed `null` IDs' if drop_unassigned else ''} for {username}.")
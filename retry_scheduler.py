@@ -0,0 +1,279 @@
+import random
+import threading
+import time
+from concurrent import futures
+import grpc
+import payment_pb2
+from pending_payments import assign_pending_ids, get_user_pending_payments, remove_successful_payments
+
+MAX_IN_FLIGHT = 4  # Concurrent ProcessPaymentBatch calls once the gateway has proven healthy
+CHUNK_SIZE = 100  # Payments per ProcessPaymentBatch call
+BASE_BACKOFF = 1.0  # Seconds before a failed payment's first retry; doubles per attempt
+MAX_BACKOFF = 300.0
+FAILURE_THRESHOLD = 3  # Consecutive unreachable results before a circuit opens
+OPEN_TIMEOUT = 5.0  # Seconds an open circuit waits before a probe; doubles while probes fail
+MAX_OPEN_TIMEOUT = 300.0
+RECOVERY_JITTER = 2.0  # Spreads out clients that all see the gateway come back at once
+IDLE_INTERVAL = 60.0  # Longest sleep between passes (catches payments queued by other processes)
+RPC_TIMEOUT = 30
+
+UNREACHABLE_CODES = (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED)
+# Rejections no retry can fix; such payments leave the queue instead of being retried forever
+PERMANENT_FAILURES = ("Insufficient funds", "Invalid account(s)", "Unknown bank")
+
+# Circuit states
+CLOSED = "CLOSED"
+OPEN = "OPEN"
+HALF_OPEN = "HALF_OPEN"  # One probe is let through
+
+class CircuitBreaker:
+    """Stops sending to an unreachable gateway or bank, then probes it after a growing cooldown."""
+
+    def __init__(self, name, threshold=FAILURE_THRESHOLD, cooldown=OPEN_TIMEOUT, max_cooldown=MAX_OPEN_TIMEOUT):
+        self.name = name
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.open_until = 0.0
+
+    def allow(self, now):
+        """True if a call may go out; an open circuit turns half-open once its cooldown is over."""
+        if self.state == OPEN and now >= self.open_until:
+            self.state = HALF_OPEN
+        return self.state != OPEN
+
+    def half_open(self):
+        """Skips the rest of the cooldown, e.g. when the channel reports it is connected again."""
+        if self.state == OPEN:
+            self.state = HALF_OPEN
+
+    def record_success(self):
+        if self.state != CLOSED:
+            print(f"✅ {self.name} is reachable again")
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = self.base_cooldown
+
+    def record_failure(self, now):
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            if self.state != OPEN:
+                print(f"⛔ {self.name} unreachable; pausing retries for {self.cooldown:.0f}s")
+            self.state = OPEN
+            self.open_until = now + self.cooldown * random.uniform(1, 1.5)
+
+    def next_probe(self):
+        return self.open_until if self.state == OPEN else None
+
+class RetryScheduler:
+    """Drains a user's offline payment queue in the background.
+
+    Due payments go out in chunks over up to `max_in_flight` concurrent
+    ProcessPaymentBatch calls. After a failure, a payment backs off exponentially
+    with jitter. Circuit breakers for the gateway and for each bank pause retries
+    while they are unreachable and let a single probe through after a cooldown.
+    Concurrency restarts at one call after an outage and doubles per clean round,
+    so a large backlog drains quickly without stampeding a gateway that just came
+    back. The scheduler sleeps until the next payment or probe is due, and wakes
+    as soon as the channel reconnects.
+    """
+
+    def __init__(self, stub, channel, token, username, id_pool, max_in_flight=MAX_IN_FLIGHT, chunk_size=CHUNK_SIZE):
+        self.stub = stub
+        self.token = token
+        self.username = username
+        self.id_pool = id_pool
+        self.max_in_flight = max_in_flight
+        self.chunk_size = chunk_size
+        self.window = 1  # Calls allowed in flight; grows while the gateway keeps up
+        self.retries = {}  # transaction_id -> {"attempts", "next_attempt", "bank"}
+        self.gateway = CircuitBreaker("Payment gateway")
+        self.banks = {}  # bank_name -> CircuitBreaker
+        self.lock = threading.Lock()  # One pass at a time (background and menu-triggered)
+        self.wakeup = threading.Event()
+        self.reconnected = False
+        self.connectivity = None
+        self.executor = futures.ThreadPoolExecutor(max_workers=max_in_flight)
+        self.thread = None
+        self.stopped = False
+        channel.subscribe(self._on_connectivity, try_to_connect=True)
+
+    def start(self):
+        """Starts draining in the background, beginning with a pass right away."""
+        self.wakeup.set()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def wake(self):
+        self.wakeup.set()
+
+    def stop(self):
+        """Waits out a pass in progress and stops retrying; queued payments stay queued for the next session."""
+        with self.lock:
+            self.stopped = True
+        self.wakeup.set()
+
+    def _on_connectivity(self, state):
+        if state == grpc.ChannelConnectivity.READY and self.connectivity not in (None, grpc.ChannelConnectivity.READY):
+            self.reconnected = True
+            self.wakeup.set()
+        self.connectivity = state
+
+    def _run(self):
+        while not self.stopped:
+            self.wakeup.wait(timeout=self._sleep_time())
+            self.wakeup.clear()
+            if self.reconnected:
+                self.reconnected = False
+                time.sleep(random.uniform(0, RECOVERY_JITTER))
+                self.gateway.half_open()
+            try:
+                self.drain()
+            except Exception as e:
+                print(f"❌ Pending payment retry failed: {e}")
+
+    def _sleep_time(self):
+        """Seconds until a payment or probe is due (at most IDLE_INTERVAL)."""
+        now = time.monotonic()
+        with self.lock:
+            wake_times = [retry["next_attempt"] for retry in self.retries.values()]
+            wake_times += [breaker.next_probe() or 0 for breaker in (self.gateway, *self.banks.values())]
+        upcoming = [wake_time - now for wake_time in wake_times if wake_time > now]
+        return min(upcoming + [IDLE_INTERVAL])
+
+    def drain(self):
+        """Retries every due payment once. Returns (succeeded, failed, rejected for good)."""
+        with self.lock:
+            if self.stopped:
+                return 0, 0, 0
+            now = time.monotonic()
+            self._assign_ids()
+            payments = [payment for payment in get_user_pending_payments(self.username) if payment.get("transaction_id")]
+            queued = {payment["transaction_id"] for payment in payments}
+            self.retries = {transaction_id: retry for transaction_id, retry in self.retries.items() if transaction_id in queued}
+
+            due = self._due(payments, now)
+            if not due or not self.gateway.allow(now):
+                return 0, 0, 0
+
+            print(f"🔄 Retrying {len(due)} pending payments for {self.username}...")
+            if self.gateway.state == HALF_OPEN:
+                # Probe with a single payment, then ramp up again from one call in flight
+                self.window = 1
+                completed, failed, rejected = self._send(due[:1])
+                due = due[1:] if self.gateway.state == CLOSED else []
+            else:
+                completed, failed, rejected = set(), 0, 0
+            more_completed, more_failed, more_rejected = self._send(due)
+            completed |= more_completed
+            remove_successful_payments(self.username, completed, drop_unassigned=False)
+            rejected += more_rejected
+            return len(completed) - rejected, failed + more_failed, rejected
+
+    def _assign_ids(self):
+        """Gives payments queued without a transaction ID one; they wait for a later pass if the gateway has none to give."""
+        unassigned = sum(not payment.get("transaction_id") for payment in get_user_pending_payments(self.username))
+        transaction_ids = []
+        while len(transaction_ids) < unassigned:
+            transaction_id = self.id_pool.get()
+            if not transaction_id:
+                return
+            transaction_ids.append(transaction_id)
+        if transaction_ids:
+            assign_pending_ids(self.username, transaction_ids)  # Payments queued meanwhile wait for the next pass
+
+    def _due(self, payments, now):
+        """Payments whose backoff is over and whose bank (if known to be down) is due a probe."""
+        due, probed_banks = [], set()
+        for payment in payments:
+            retry = self.retries.get(payment["transaction_id"])
+            if retry is None:
+                due.append(payment)
+                continue
+            if retry["next_attempt"] > now:
+                continue
+            breaker = self.banks.get(retry["bank"])
+            if breaker is not None and not breaker.allow(now):
+                continue
+            if breaker is not None and breaker.state == HALF_OPEN:
+                if retry["bank"] in probed_banks:
+                    continue
+                probed_banks.add(retry["bank"])
+            due.append(payment)
+        return due
+
+    def _send(self, payments):
+        """Sends chunks, at most `window` at a time. Returns (finished transaction IDs, failures, rejections among them)."""
+        chunks = [payments[i:i + self.chunk_size] for i in range(0, len(payments), self.chunk_size)]
+        completed, failed, rejected = set(), 0, 0
+        while chunks and self.gateway.state != OPEN:
+            round_chunks, chunks = chunks[:self.window], chunks[self.window:]
+            clean = True
+            for chunk, outcome in zip(round_chunks, self.executor.map(self._send_chunk, round_chunks)):
+                now = time.monotonic()
+                if isinstance(outcome, grpc.RpcError):
+                    clean = False
+                    if outcome.code() in UNREACHABLE_CODES:
+                        self.gateway.record_failure(now)
+                    print(f"❌ gRPC Error: {outcome.details()}")
+                    for payment in chunk:
+                        self._back_off(payment["transaction_id"], None, now)
+                    failed += len(chunk)
+                    continue
+
+                self.gateway.record_success()
+                for response in outcome:
+                    if self._handle(response, now):
+                        completed.add(response.transaction_id)
+                        rejected += response.message in PERMANENT_FAILURES
+                    else:
+                        clean = False
+                        failed += 1
+            if clean:
+                self.window = min(self.window * 2, self.max_in_flight)
+        return completed, failed, rejected
+
+    def _send_chunk(self, chunk):
+        requests = [payment_pb2.PaymentRequest(sender=self.token, receiver=payment["receiver"], amount=payment["amount"],
+                                               transaction_id=payment["transaction_id"])
+                    for payment in chunk]
+        try:
+            return list(self.stub.ProcessPaymentBatch(payment_pb2.PaymentBatchRequest(payments=requests),
+                                                      timeout=RPC_TIMEOUT))
+        except grpc.RpcError as e:
+            return e
+
+    def _handle(self, response, now):
+        """Updates backoff and the bank circuits for one result. Returns True if the payment is done (or can never be)."""
+        bank = response.receiver_bank or None
+        if (response.success or response.message == "Duplicate transaction detected!"
+                or response.message.endswith("will complete in the background")):
+            print(f"✅ Payment Successful! (Transaction ID: {response.transaction_id})")
+            if bank in self.banks:
+                self.banks[bank].record_success()
+            self.retries.pop(response.transaction_id, None)
+            return True
+
+        if response.message in PERMANENT_FAILURES:
+            print(f"❌ Payment Failed: {response.message}. Removed from the retry queue. "
+                  f"(Transaction ID: {response.transaction_id})")
+            self.retries.pop(response.transaction_id, None)
+            return True
+
+        print(f"❌ Payment Failed: {response.message}")
+        if bank and response.message == f"{bank} is offline":
+            self.banks.setdefault(bank, CircuitBreaker(bank)).record_failure(now)
+        self._back_off(response.transaction_id, bank, now)
+        return False
+
+    def _back_off(self, transaction_id, bank, now):
+        retry = self.retries.setdefault(transaction_id, {"attempts": 0, "next_attempt": now, "bank": None})
+        retry["attempts"] += 1
+        retry["bank"] = bank or retry["bank"]
+        delay = min(BASE_BACKOFF * 2 ** (retry["attempts"] - 1), MAX_BACKOFF)
+        retry["next_attempt"] = now + random.uniform(delay / 2, delay)  # Jitter keeps retries from bunching up
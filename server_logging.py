@@ -0,0 +1,135 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from metrics import Counter
+
+LOG_LEVEL = os.getenv("STRIFE_LOG_LEVEL", "INFO").upper()  # DEBUG also shows every payment's progress
+LOG_FORMAT = os.getenv("STRIFE_LOG_FORMAT", "text")  # "text" or "json" (one object per line)
+MAX_QUEUED = 10000  # Records waiting for the listener; further ones are dropped rather than block a payment
+RATE_LIMIT_BURST = 10  # Warnings and errors let through per call site and window
+RATE_LIMIT_WINDOW = 60.0  # Seconds
+
+LOG_RECORDS_DROPPED = Counter("strife_log_records_dropped_total", "Log records dropped because the log queue was full.")
+
+log_request_id = contextvars.ContextVar("log_request_id", default=None)  # Set by the server interceptor for each RPC
+
+class RateLimitFilter(logging.Filter):
+    """Lets through at most `burst` records per call site and window at `level` or above.
+
+    A failing bank can make every payment log the same error; once a call site has used
+    up its burst, the rest of the window is dropped and counted, and the next record
+    that gets through says how many were suppressed.
+    """
+
+    def __init__(self, burst=RATE_LIMIT_BURST, window=RATE_LIMIT_WINDOW, level=logging.WARNING):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.level = level
+        self.sites = {}  # (pathname, lineno) -> [window start, records let through, records suppressed]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < self.level:
+            return True
+        key = (record.pathname, record.lineno)
+        with self.lock:
+            site = self.sites.get(key)
+            if site is None or record.created - site[0] >= self.window:
+                suppressed = site[2] if site is not None else 0
+                self.sites[key] = [record.created, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} (and {suppressed} more like it in the last {self.window:.0f}s)"
+                return True
+            if site[1] < self.burst:
+                site[1] += 1
+                return True
+            site[2] += 1
+            return False
+
+class _RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = log_request_id.get()
+        return True
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread without formatting them or waiting for room."""
+
+    def prepare(self, record):
+        return record  # Same process: the listener formats it, off the payment thread
+
+    def enqueue(self, record):
+        # SimpleQueue has no lock for producers to contend on, so the bound is approximate
+        if self.queue.qsize() < MAX_QUEUED:
+            self.queue.put(record)
+        else:
+            LOG_RECORDS_DROPPED.inc()
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        rid = getattr(record, "request_id", None)
+        return f"{line} [request {rid}]" if rid else line
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                 "message": record.getMessage()}
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+_listener = None
+_configure_lock = threading.Lock()
+
+def configure_logging(level=LOG_LEVEL, log_format=LOG_FORMAT, stream=None):
+    """Routes all logging through a bounded queue to a background thread that writes to stdout.
+
+    Payment threads only pay for a level check (and, for records that pass it, a
+    queue put). Call once at server start; later calls are ignored.
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+
+        records = queue.SimpleQueue()
+        handler = _QueueHandler(records)
+        handler.addFilter(RateLimitFilter())
+        handler.addFilter(_RequestIdFilter())
+
+        root = logging.getLogger()
+        for old_handler in list(root.handlers):
+            root.removeHandler(old_handler)
+        root.addHandler(handler)
+        root.setLevel(level)
+
+        _listener = logging.handlers.QueueListener(records, output)
+        _listener.start()
+        atexit.register(stop_logging)
+
+def stop_logging():
+    """Writes out whatever is still queued and detaches the queue from the root logger."""
+    global _listener
+    with _configure_lock:
+        if _listener is None:
+            return
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, _QueueHandler):
+                root.removeHandler(handler)
+        _listener.stop()
+        _listener = None
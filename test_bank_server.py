@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+import unittest
+import payment_pb2
+from bank_server import PREPARE_EXPIRED, BankService
+from participant_log import ALREADY_ABORTED
+
+class _Context:
+    def __init__(self, time_remaining=None, active=True):
+        self.remaining = time_remaining
+        self.active = active
+
+    def is_active(self):
+        return self.active
+
+    def time_remaining(self):
+        return self.remaining
+
+class AbortBeforePrepareTest(unittest.TestCase):
+    """A prepare that reaches the bank after its abort must not leave funds held."""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        os.makedirs("logs")
+        with open("data.json", "w") as f:
+            json.dump({"alice": {"password": "pw", "account_no": "1", "balance": 81.0, "bank_name": "BankA"}}, f)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def _prepare_request(self, transaction_id):
+        return payment_pb2.PrepareRequest(transaction_id=transaction_id, sender="alice", receiver="bob", amount=81.0)
+
+    def test_prepare_after_abort_votes_no(self):
+        bank = BankService("BankA")
+        bank.AbortTransaction(payment_pb2.AbortRequest(transaction_id="t1"), _Context())
+        response = bank.PrepareTransaction(self._prepare_request("t1"), _Context())
+        self.assertFalse(response.success)
+        self.assertEqual(response.message, ALREADY_ABORTED)
+        self.assertEqual(bank.held, {})
+        self.assertIsNone(bank.participant_log.state("t1"))
+
+        # The tombstone survives a restart
+        bank.participant_log.sync()
+        restarted = BankService("BankA")
+        self.assertEqual(restarted.held, {})
+        self.assertFalse(restarted.PrepareTransaction(self._prepare_request("t1"), _Context()).success)
+
+    def test_tombstone_survives_compaction(self):
+        bank = BankService("BankA")
+        bank.AbortTransaction(payment_pb2.AbortRequest(transaction_id="t1"), _Context())
+        bank.participant_log._compact()
+        restarted = BankService("BankA")
+        self.assertTrue(restarted.participant_log.was_aborted("t1"))
+
+    def test_expired_tombstones_are_dropped(self):
+        bank = BankService("BankA")
+        bank.AbortTransaction(payment_pb2.AbortRequest(transaction_id="t1"), _Context())
+        bank.participant_log.aborted["t1"] -= bank.participant_log.abort_ttl + 1
+        bank.AbortTransaction(payment_pb2.AbortRequest(transaction_id="t2"), _Context())
+        self.assertEqual(list(bank.participant_log.aborted), ["t2"])
+
+    def test_prepare_past_its_deadline_votes_no(self):
+        bank = BankService("BankA")
+        for context in (_Context(time_remaining=0), _Context(active=False)):
+            response = bank.PrepareTransaction(self._prepare_request("t2"), context)
+            self.assertFalse(response.success)
+            self.assertEqual(response.message, PREPARE_EXPIRED)
+        self.assertEqual(bank.held, {})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import hashlib
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from metrics import TOKEN_CACHE_LOOKUPS
+
+class TokenCache:
+    """Bounded LRU cache of verified JWTs, keyed by the SHA-256 digest of the token.
+
+    Entries expire with the token's `exp` claim, and revoked tokens are remembered
+    until they would have expired anyway. Hits and misses are counted in
+    strife_token_cache_lookups_total.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.entries = OrderedDict()  # digest -> (username, exp)
+        self.revoked = {}  # digest -> exp
+        self.revocation_expiries = []  # Heap of (exp, digest), so expired revocations are found without a scan
+        self.lock = threading.Lock()
+        self.hits = TOKEN_CACHE_LOOKUPS.labels("hit")
+        self.misses = TOKEN_CACHE_LOOKUPS.labels("miss")
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        """Returns the cached username for a still-valid token, or None on a miss."""
+        key = self.digest(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses.inc()
+                return None
+            self.entries.move_to_end(key)
+            self.hits.inc()
+            return entry[0]
+
+    def put(self, token, username, exp):
+        """Caches a token that was just verified, unless it has been revoked."""
+        key = self.digest(token)
+        with self.lock:
+            if key in self.revoked:
+                return
+            self.entries[key] = (username, exp)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def is_revoked(self, token):
+        with self.lock:
+            return self.digest(token) in self.revoked
+
+    def revoke(self, token, exp):
+        """Rejects `token` from now on, even though its signature is still valid."""
+        key = self.digest(token)
+        now = time.time()
+        with self.lock:
+            self.entries.pop(key, None)
+            if key not in self.revoked:
+                self.revoked[key] = exp
+                heapq.heappush(self.revocation_expiries, (exp, key))
+            # Forget revocations of tokens that have expired on their own
+            while self.revocation_expiries and self.revocation_expiries[0][0] <= now:
+                del self.revoked[heapq.heappop(self.revocation_expiries)[1]]
+
+    def stats(self):
+        """Hits and misses are process-wide (they are the exported counters); sizes are this cache's."""
+        with self.lock:
+            return {"hits": self.hits.value, "misses": self.misses.value, "size": len(self.entries),
+                    "revoked": len(self.revoked)}
@@ -0,0 +1,158 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from google.protobuf import empty_pb2, json_format
+import payment_pb2
+from metrics import Counter
+
+CAPTURE_FILE = os.getenv("STRIFE_CAPTURE_FILE", "")  # e.g. logs/traffic.jsonl; empty turns capture off
+MAX_QUEUED = 10000  # Requests waiting for the writer; further ones are dropped rather than slow down an RPC
+MAX_BATCH = 1000  # Lines per write
+
+REDACTED = "<redacted>"
+# Session token fields (of each payment, for batches); a trace holds "<token:alice>" for a token of alice's
+TOKEN_FIELDS = {"ProcessPayment": "sender", "ProcessPaymentStream": "sender", "ProcessPaymentBatch": "sender",
+                "ViewBalance": "token", "Logout": "token"}
+PASSWORD_FIELDS = {"AuthenticateClient": "password", "RegisterClient": "password"}
+
+CAPTURE_RECORDS_DROPPED = Counter("strife_capture_records_dropped_total",
+                                  "Requests left out of the traffic capture because its queue was full.")
+
+log = logging.getLogger(__name__)
+
+def token_placeholder(username):
+    """What a trace holds instead of a session token; "<token:>" if it did not authenticate anyone."""
+    return f"<token:{username or ''}>"
+
+def placeholder_user(value):
+    """The username in a token placeholder ("" for an invalid token), or None if `value` is not one."""
+    if value.startswith("<token:") and value.endswith(">"):
+        return value[len("<token:"):-1]
+    return None
+
+def _credential_messages(method, request):
+    """The parts of a request (as a dict) that may hold credentials."""
+    return request.get("payments", []) if method == "ProcessPaymentBatch" else [request]
+
+class TrafficCapture:
+    """Appends the requests a server receives to a JSON-lines trace, for `benchmarks.py traffic` to replay.
+
+    Each line is {"t": wall-clock seconds, "method": ..., "request": the request as JSON}, plus
+    "call" (the request ID) for each message of a client stream. Session tokens are replaced
+    with the user they authenticated as and passwords with "<redacted>", so a trace holds no
+    credentials. A background thread converts and writes the requests; if it falls behind,
+    requests are dropped and counted instead of holding up RPCs.
+    """
+
+    def __init__(self, path, user_of):
+        self.path = path
+        self.user_of = user_of  # token -> username or None, e.g. utils.verify_token
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+        log.info("🎥 Capturing requests to %s (tokens and passwords redacted)", path)
+
+    @classmethod
+    def from_env(cls, user_of):
+        """A capture to STRIFE_CAPTURE_FILE, or None if it is not set."""
+        return cls(CAPTURE_FILE, user_of) if CAPTURE_FILE else None
+
+    def record(self, method, request, call=None):
+        # Handlers never modify their requests, so the writer can convert them later
+        if self.queue.qsize() < MAX_QUEUED:
+            self.queue.put((time.time(), method, request, call))
+        else:
+            CAPTURE_RECORDS_DROPPED.inc()
+
+    def stream(self, method, requests, call):
+        """Passes a client stream through, recording each message as it arrives."""
+        for request in requests:
+            self.record(method, request, call)
+            yield request
+
+    async def stream_async(self, method, requests, call):
+        async for request in requests:
+            self.record(method, request, call)
+            yield request
+
+    def close(self):
+        """Writes out whatever is still queued."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=5)
+
+    def _entry(self, t, method, request, call):
+        request = json_format.MessageToDict(request, preserving_proto_field_name=True)
+        for message in _credential_messages(method, request):
+            if method in TOKEN_FIELDS and TOKEN_FIELDS[method] in message:
+                message[TOKEN_FIELDS[method]] = token_placeholder(self.user_of(message[TOKEN_FIELDS[method]]))
+            if method in PASSWORD_FIELDS and PASSWORD_FIELDS[method] in message:
+                message[PASSWORD_FIELDS[method]] = REDACTED
+        entry = {"t": round(t, 6), "method": method, "request": request}
+        if call is not None:
+            entry["call"] = call
+        return entry
+
+    def _run(self):
+        with open(self.path, "a") as f:
+            while True:
+                batch = [self.queue.get()]
+                while batch[-1] is not None and len(batch) < MAX_BATCH:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    f.write("".join(json.dumps(self._entry(*record), separators=(",", ":")) + "\n"
+                                    for record in batch if record is not None))
+                    f.flush()
+                except Exception as e:
+                    log.error("❌ Failed to write traffic capture: %s", e)
+                if batch[-1] is None:
+                    return
+
+def request_type(method):
+    """The request message class of a PaymentGateway method."""
+    input_type = payment_pb2.DESCRIPTOR.services_by_name["PaymentGateway"].methods_by_name[method].input_type
+    return empty_pb2.Empty if input_type.full_name == "google.protobuf.Empty" else getattr(payment_pb2, input_type.name)
+
+def read_trace(path):
+    """The entries of a trace, oldest first."""
+    with open(path) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    return sorted(entries, key=lambda entry: entry["t"])
+
+def trace_users(entries):
+    """Every username a trace mentions: token owners, login names and payment receivers."""
+    users = set()
+    for entry in entries:
+        request = entry["request"]
+        if entry["method"] in PASSWORD_FIELDS and request.get("username"):
+            users.add(request["username"])
+        for message in _credential_messages(entry["method"], request):
+            token = message.get(TOKEN_FIELDS.get(entry["method"], ""), "")
+            if placeholder_user(token):
+                users.add(placeholder_user(token))
+            if message.get("receiver"):
+                users.add(message["receiver"])
+    return users
+
+def restore_request(entry, tokens, password):
+    """Rebuilds a traced request, with a fresh token for each placeholder and `password` for redacted ones.
+
+    `tokens` maps usernames to session tokens; an invalid token stays invalid.
+    """
+    method, request = entry["method"], copy.deepcopy(entry["request"])
+    for message in _credential_messages(method, request):
+        field = TOKEN_FIELDS.get(method)
+        if field in message and placeholder_user(message[field]) is not None:
+            message[field] = tokens.get(placeholder_user(message[field]), "invalid-token")
+        if message.get(PASSWORD_FIELDS.get(method)) == REDACTED:
+            message[PASSWORD_FIELDS[method]] = password
+    return json_format.ParseDict(request, request_type(method)())
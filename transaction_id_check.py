@@ -1,21 +1,119 @@
 import os
 import json
+import threading
 
 LOG_DIR = "logs"
 LOG_FILE = os.path.join(LOG_DIR, "transactions.log")
+INDEX_FILE = os.path.join(LOG_DIR, "replay.idx")
+CHECKPOINT_BYTES = 1 << 20  # Persist the log offset at least once per MiB of failed entries
 
-def is_transaction_replay(transaction_id):
-    """Check if the transaction ID exists in logs and was successful before."""
-    if not os.path.exists(LOG_FILE):
-        return False  # No logs exist yet
+class ReplayIndex:
+    """Set of successful transaction IDs, kept in sync with the transaction log.
+
+    The index is persisted as an append-only file of `<log_offset> <transaction_id>`
+    lines. On startup the file is loaded into memory and only the part of the log
+    written after the last recorded offset is parsed, so lookups are O(1) and the
+    log is never rescanned from the start.
+    """
+
+    def __init__(self, log_file=LOG_FILE, index_file=INDEX_FILE):
+        self.log_file = log_file
+        self.index_file = index_file
+        self.successful_ids = set()
+        self.log_offset = 0
+        self.persisted_offset = 0
+        self.lock = threading.Lock()
+        self._load_index()
+
+    def _load_index(self):
+        """Loads the persisted index and the log offset it covers."""
+        if not os.path.exists(self.index_file):
+            return
 
-    with open(LOG_FILE, "r") as f:
-        for line in f:
+        with open(self.index_file, "r") as f:
+            for line in f:
+                offset, _, transaction_id = line.rstrip("\n").partition(" ")
+                if not offset.isdigit():
+                    continue  # Skip torn writes
+                if transaction_id:
+                    self.successful_ids.add(transaction_id)
+                self.log_offset = max(self.log_offset, int(offset))
+        self.persisted_offset = self.log_offset
+
+    def _reset(self):
+        """Drops the index when the log was truncated or replaced."""
+        self.successful_ids.clear()
+        self.log_offset = 0
+        self.persisted_offset = 0
+        if os.path.exists(self.index_file):
+            os.remove(self.index_file)
+
+    def catch_up(self):
+        """Indexes log entries appended since the last call."""
+        with self.lock:
             try:
-                txn = json.loads(line.strip())
-                if txn["transaction_id"] == transaction_id and txn["status"].startswith("SUCCESS"):
-                    return True  # Replay attack detected
-            except json.JSONDecodeError:
-                continue  # Skip corrupted log lines
-    
-    return False  # Transaction ID is not a replay
+                size = os.path.getsize(self.log_file)
+            except OSError:
+                return  # No logs exist yet
+
+            if size < self.log_offset:
+                self._reset()
+            if size == self.log_offset:
+                return
+
+            new_entries = []
+            with open(self.log_file, "rb") as f:
+                f.seek(self.log_offset)
+                chunk = f.read(size - self.log_offset)
+
+            # Only consume complete lines; a partially written entry is picked up next time
+            end = chunk.rfind(b"\n") + 1
+            offset = self.log_offset
+            for raw in chunk[:end].splitlines(keepends=True):
+                offset += len(raw)
+                try:
+                    txn = json.loads(raw)
+                except json.JSONDecodeError:
+                    continue  # Skip corrupted log lines
+                if txn.get("status", "").startswith("SUCCESS") and txn.get("transaction_id"):
+                    self.successful_ids.add(txn["transaction_id"])
+                    new_entries.append(f"{offset} {txn['transaction_id']}\n")
+                    self.persisted_offset = offset
+
+            self.log_offset += end
+            if self.log_offset - self.persisted_offset >= CHECKPOINT_BYTES:
+                new_entries.append(f"{self.log_offset} \n")  # Offset-only checkpoint
+                self.persisted_offset = self.log_offset
+
+            if new_entries:
+                with open(self.index_file, "a") as f:
+                    f.writelines(new_entries)
+
+    def add(self, transaction_id):
+        """Marks a transaction as successful ahead of the log being re-read."""
+        with self.lock:
+            self.successful_ids.add(transaction_id)
+
+    def __contains__(self, transaction_id):
+        self.catch_up()
+        return transaction_id in self.successful_ids
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_replay_index():
+    """Returns the process-wide replay index, building it on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ReplayIndex()
+    return _index
+
+def record_successful_transaction(transaction_id):
+    """Adds a successfully processed transaction ID to the replay index."""
+    get_replay_index().add(transaction_id)
+
+def is_transaction_replay(transaction_id):
+    """Check if the transaction ID exists in logs and was successful before."""
+    return transaction_id in get_replay_index()
@@ -1,9 +1,31 @@
+import fcntl
+import os
 import time
 import threading
 
+LEASE_DIR = os.path.join("logs", "machine_ids")  # Lock files that hand out machine IDs to processes on this host
+BLOCK_SIZE = 256  # IDs a thread takes per lease
+MAX_DRIFT_MS = 1000  # How far leases may run ahead of the clock before they are throttled
+
 class TransactionIDGenerator:
-    """A scalable unique Transaction ID generator (Inspired by Twitter Snowflake)."""
-    
+    """A scalable unique Transaction ID generator (Inspired by Twitter Snowflake).
+
+    IDs keep the Snowflake layout (timestamp | datacenter | machine | sequence), but
+    each thread leases a block of consecutive sequence numbers and then hands out IDs
+    without taking a lock. When a millisecond's sequence numbers run out, the next
+    millisecond is borrowed instead of spinning until it arrives; only if leases get
+    MAX_DRIFT_MS ahead of the clock does the generator sleep. IDs are therefore unique
+    and roughly, not strictly, time-ordered.
+
+    Without a machine_id, the process leases a free one through a lock file in
+    `lease_dir`, so several gateways (or clients embedding the generator) on one host
+    never collide. Processes on different hosts need different datacenter IDs, or a
+    shared `lease_dir`. Create the generator after forking: the lease is per open file.
+    The lock file also records the last borrowed millisecond, and the next process to
+    lease that machine ID waits for the clock to pass it, so a quick restart cannot
+    reissue borrowed IDs.
+    """
+
     # Constants (Bit allocations)
     EPOCH = 1640995200000  # Custom epoch (e.g., 2022-01-01 00:00:00 UTC)
     DATACENTER_BITS = 5
@@ -14,51 +36,105 @@ class TransactionIDGenerator:
     MAX_MACHINE_ID = (1 << MACHINE_BITS) - 1
     MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
 
-    def __init__(self, datacenter_id: int, machine_id: int):
-        """Initialize with Datacenter ID & Machine ID."""
+    def __init__(self, datacenter_id: int, machine_id: int = None, block_size: int = BLOCK_SIZE,
+                 lease_dir: str = LEASE_DIR, max_drift_ms: int = MAX_DRIFT_MS):
+        """Initialize with Datacenter ID & Machine ID (leased automatically if omitted)."""
         if datacenter_id > self.MAX_DATACENTER_ID or datacenter_id < 0:
             raise ValueError(f"Datacenter ID must be between 0 and {self.MAX_DATACENTER_ID}")
-        if machine_id > self.MAX_MACHINE_ID or machine_id < 0:
+        if machine_id is not None and (machine_id > self.MAX_MACHINE_ID or machine_id < 0):
             raise ValueError(f"Machine ID must be between 0 and {self.MAX_MACHINE_ID}")
-        
+        if not 1 <= block_size <= self.MAX_SEQUENCE + 1:
+            raise ValueError(f"Block size must be between 1 and {self.MAX_SEQUENCE + 1}")
+
         self.datacenter_id = datacenter_id
-        self.machine_id = machine_id
+        self.max_drift_ms = max_drift_ms
+        self.lease_file = None
+        self.machine_id = machine_id if machine_id is not None else self._lease_machine_id(lease_dir)
+        self.block_size = block_size
         self.last_timestamp = -1
         self.sequence = 0
-        self.lock = threading.Lock()  # Ensure thread safety
+        self.borrowed_millis = 0  # Milliseconds leased ahead of the clock
+        self.throttled = 0  # Times a lease had to sleep because it got MAX_DRIFT_MS ahead
+        self.lock = threading.Lock()  # Guards leases only; IDs within a block need no lock
+        self.local = threading.local()
+
+    def _lease_machine_id(self, lease_dir):
+        """Claims the first machine ID no other live process holds; the OS frees it when the process exits."""
+        os.makedirs(lease_dir, exist_ok=True)
+        for machine_id in range(self.MAX_MACHINE_ID + 1):
+            path = os.path.join(lease_dir, f"{self.datacenter_id}-{machine_id}.lock")
+            # Not opened for appending: the high-water mark is rewritten in place
+            lease_file = open(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+b", buffering=0)
+            try:
+                fcntl.flock(lease_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lease_file.close()
+                continue
+            self.lease_file = lease_file
+            self._wait_for_high_water(machine_id)
+            return machine_id
+        raise RuntimeError(f"All {self.MAX_MACHINE_ID + 1} machine IDs in datacenter {self.datacenter_id} are in use")
+
+    def _wait_for_high_water(self, machine_id):
+        """Waits until the clock is past the last millisecond the previous holder of this machine ID borrowed."""
+        try:
+            high_water = int(os.pread(self.lease_file.fileno(), 32, 0) or 0)
+        except ValueError:
+            high_water = 0  # A lock file from before high-water marks were recorded
+        ahead = high_water - self._current_millis()
+        if ahead >= 0:
+            if ahead > self.max_drift_ms:
+                # Leases never run more than max_drift_ms ahead, so the clock itself must have moved back
+                raise RuntimeError(f"Clock is {ahead} ms behind IDs already issued as machine ID {machine_id} "
+                                   f"in datacenter {self.datacenter_id}; refusing to start")
+            time.sleep((ahead + 1) / 1000)
+
+    def _record_high_water(self, timestamp):
+        # Fixed width, so each write fully replaces the last one without truncating
+        os.pwrite(self.lease_file.fileno(), b"%20d\n" % timestamp, 0)
 
     def _current_millis(self) -> int:
         """Returns current timestamp in milliseconds."""
         return int(time.time() * 1000)
 
-    def _wait_for_next_millis(self, last_timestamp: int) -> int:
-        """Waits for the next millisecond if needed."""
-        timestamp = self._current_millis()
-        while timestamp <= last_timestamp:
-            timestamp = self._current_millis()
-        return timestamp
+    def lease(self, count: int):
+        """Reserves up to `count` consecutive IDs; returns (first_id, end_id) with end_id exclusive.
 
-    def generate_transaction_id(self) -> int:
-        """Generates a unique transaction ID."""
+        A lease never spans milliseconds, so it may be shorter than `count`.
+        """
         with self.lock:
             timestamp = self._current_millis()
+            if timestamp > self.last_timestamp:
+                self.last_timestamp = timestamp
+                self.sequence = 0
+            elif self.sequence > self.MAX_SEQUENCE:
+                # Borrow the next millisecond rather than spin; this also rides out a clock that moved backwards
+                self.last_timestamp += 1
+                self.sequence = 0
+                self.borrowed_millis += 1
+                if self.lease_file is not None:
+                    self._record_high_water(self.last_timestamp)
+                ahead = self.last_timestamp - timestamp
+                if ahead > self.max_drift_ms:
+                    self.throttled += 1
+                    time.sleep((ahead - self.max_drift_ms) / 1000)
 
-            # Ensure unique timestamp
-            if timestamp < self.last_timestamp:
-                raise Exception("Clock moved backwards. Refusing to generate ID.")
-
-            if timestamp == self.last_timestamp:
-                self.sequence = (self.sequence + 1) & self.MAX_SEQUENCE
-                if self.sequence == 0:
-                    timestamp = self._wait_for_next_millis(self.last_timestamp)
-            else:
-                self.sequence = 0  # Reset sequence if timestamp is new
-
-            self.last_timestamp = timestamp
-
-            # Construct 64-bit ID
-            transaction_id = ((timestamp - self.EPOCH) << (self.DATACENTER_BITS + self.MACHINE_BITS + self.SEQUENCE_BITS)) | \
-                             (self.datacenter_id << (self.MACHINE_BITS + self.SEQUENCE_BITS)) | \
-                             (self.machine_id << self.SEQUENCE_BITS) | \
-                             self.sequence
-            return transaction_id
+            count = min(count, self.MAX_SEQUENCE + 1 - self.sequence)
+            first_id = self._compose(self.last_timestamp, self.sequence)
+            self.sequence += count
+            return first_id, first_id + count
+
+    def _compose(self, timestamp, sequence):
+        # Construct 64-bit ID; the sequence is the low bits, so a lease is a contiguous range
+        return ((timestamp - self.EPOCH) << (self.DATACENTER_BITS + self.MACHINE_BITS + self.SEQUENCE_BITS)) | \
+               (self.datacenter_id << (self.MACHINE_BITS + self.SEQUENCE_BITS)) | \
+               (self.machine_id << self.SEQUENCE_BITS) | \
+               sequence
+
+    def generate_transaction_id(self) -> int:
+        """Generates a unique transaction ID from this thread's block, leasing a new block when it runs out."""
+        try:
+            return next(self.local.ids)
+        except (AttributeError, StopIteration):
+            self.local.ids = iter(range(*self.lease(self.block_size)))
+            return next(self.local.ids)
@@ -0,0 +1,69 @@
+import collections
+import threading
+import time
+import grpc
+import payment_pb2
+
+ID_BATCH_SIZE = 1024  # IDs requested per GenerateTransactionIDs call (the gateway returns at most 4096)
+REFILL_RETRY_INTERVAL = 1.0  # Seconds between refill attempts while the gateway is unreachable
+RPC_TIMEOUT = 5
+
+class TransactionIDPool:
+    """Client-side stock of transaction IDs, topped up in the background with GenerateTransactionIDs.
+
+    Payments take an ID locally, so submitting one costs a single RPC. A background
+    thread fetches a new range whenever fewer than `low_water` IDs are left; `get`
+    only waits for the gateway when the pool has run dry.
+    """
+
+    def __init__(self, stub, batch_size=ID_BATCH_SIZE, low_water=None):
+        self.stub = stub
+        self.batch_size = batch_size
+        self.low_water = low_water if low_water is not None else batch_size // 4
+        self.ranges = collections.deque()  # Unused IDs as range objects
+        self.available = 0
+        self.reachable = True  # Reports an outage once rather than on every retry
+        self.lock = threading.Lock()
+        self.refill_needed = threading.Condition(self.lock)
+        self.refiller = threading.Thread(target=self._refill_loop, daemon=True)
+        self.refiller.start()
+
+    def get(self):
+        """Takes an unused transaction ID (as a string), or None if the gateway can't be reached."""
+        while True:
+            with self.lock:
+                if self.ranges:
+                    ids = self.ranges[0]
+                    if len(ids) > 1:
+                        self.ranges[0] = ids[1:]
+                    else:
+                        self.ranges.popleft()
+                    self.available -= 1
+                    if self.available < self.low_water:
+                        self.refill_needed.notify()
+                    return str(ids[0])
+            if not self._refill():
+                return None
+
+    def _refill(self):
+        try:
+            response = self.stub.GenerateTransactionIDs(payment_pb2.TransactionIDRangeRequest(count=self.batch_size),
+                                                        timeout=RPC_TIMEOUT)
+        except grpc.RpcError as e:
+            if self.reachable:
+                print(f"❌ Failed to generate Transaction IDs: {e.details()}")
+            self.reachable = False
+            return False
+        self.reachable = True
+        with self.lock:
+            self.ranges.append(range(response.first_id, response.first_id + response.count))
+            self.available += response.count
+        return True
+
+    def _refill_loop(self):
+        while True:
+            with self.lock:
+                while self.available >= self.low_water:
+                    self.refill_needed.wait()
+            if not self._refill():
+                time.sleep(REFILL_RETRY_INTERVAL)
@@ -4,6 +4,11 @@ import logging
 import os
 from datetime import datetime, timedelta
 import uuid
+from urllib.parse import unquote
+from transaction_id_check import record_successful_transaction
+from log_writer import TransactionLogWriter
+from token_cache import TokenCache
+from metrics import TRANSACTIONS, status_label
 
 # Load SECRET_KEY from environment or use a fallback (Avoid hardcoding in production)
 SECRET_KEY = os.getenv("SECRET_KEY", "fallback_secret_key")
@@ -12,15 +17,26 @@ SECRET_KEY = os.getenv("SECRET_KEY", "fallback_secret_key")
 LOG_DIR = "logs"
 LOG_FILE = os.path.join(LOG_DIR, "transactions.log")
 USER_DATA_FILE = "data.json"
+ACCOUNTS_DIR = "accounts"  # Per-bank account shards, split out of data.json on first start
+ACCOUNT_INDEX_FILE = os.path.join(ACCOUNTS_DIR, "index.json")  # username -> bank_name routing index
+
+# Transaction log durability: "sync" (fsync per entry), "group" (fsync per time window) or "none"
+LOG_DURABILITY = os.getenv("STRIFE_LOG_DURABILITY", "group")
+LOG_GROUP_WINDOW = float(os.getenv("STRIFE_LOG_GROUP_WINDOW", "0.01"))  # Seconds
+LOG_ECHO = os.getenv("STRIFE_LOG_ECHO", "1") == "1"  # Also log entries at DEBUG level
+
+TOKEN_CACHE_SIZE = int(os.getenv("STRIFE_TOKEN_CACHE_SIZE", "10000"))  # Verified JWTs kept per process
 
 # Ensure log directory exists
 os.makedirs(LOG_DIR, exist_ok=True)
 
-# Configure logging
-logging.basicConfig(filename=LOG_FILE, level=logging.INFO, format="%(asctime)s | %(message)s")
+log = logging.getLogger(__name__)
+
+transaction_log = TransactionLogWriter(LOG_FILE, durability=LOG_DURABILITY, group_window=LOG_GROUP_WINDOW,
+                                       echo=LOG_ECHO)
 
 def load_users():
-    """Load user data from JSON file safely and ensure all users have a bank_name."""
+    """Load the accounts in data.json (for splitting into shards) and ensure all users have a bank_name."""
     try:
         with open(USER_DATA_FILE, "r") as file:
             users = json.load(file)
@@ -34,42 +50,114 @@ def load_users():
     except (FileNotFoundError, json.JSONDecodeError):
         return {}  # Return an empty dictionary if file doesn't exist or has errors
 
-def save_users(data):
-    """Save user data to JSON file safely with error handling."""
+def bank_accounts_file(bank_name):
+    return os.path.join(ACCOUNTS_DIR, f"{bank_name}.json")
+
+def _write_json(path, data):
+    """Atomically replaces `path`; the temp name is per process since several servers may split at once."""
+    tmp_file = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+def split_users():
+    """Splits data.json into one account shard per bank plus the routing index. Returns the index."""
+    shards = {}
+    for username, data in load_users().items():
+        shards.setdefault(data["bank_name"], {})[username] = data
+
+    os.makedirs(ACCOUNTS_DIR, exist_ok=True)
+    for bank_name, accounts in shards.items():
+        _write_json(bank_accounts_file(bank_name), accounts)
+    index = {username: bank_name for bank_name, accounts in shards.items() for username in accounts}
+    _write_json(ACCOUNT_INDEX_FILE, index)  # Written last: its presence means the split is complete
+    return index
+
+def load_account_index():
+    """Load the username -> bank_name index the gateway routes by (no balances or passwords)."""
+    try:
+        with open(ACCOUNT_INDEX_FILE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return split_users()
+
+def load_bank_users(bank_name):
+    """Load only the accounts owned by `bank_name`."""
+    if not os.path.exists(ACCOUNT_INDEX_FILE):
+        split_users()
     try:
-        with open(USER_DATA_FILE, "w") as file:
-            json.dump(data, file, indent=4)
-    except Exception as e:
-        logging.error(f"❌ Failed to save users: {e}")
+        with open(bank_accounts_file(bank_name), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}  # A bank with no customers yet
 
 def generate_token(username):
     """Generate a JWT token for authentication."""
     payload = {
         "username": username,
-        "exp": datetime.utcnow() + timedelta(hours=1)  # Token expires in 1 hour
+        "exp": datetime.utcnow() + timedelta(hours=1),  # Token expires in 1 hour
+        "jti": uuid.uuid4().hex,  # Unique per login, so logging out never revokes a later session
     }
     return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
 
+# Shared by PaymentGatewayServicer and BankService so a session token is HMAC-checked once per process
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
 def verify_token(token):
     """Verify JWT token and return username if valid."""
+    username = token_cache.get(token)
+    if username is not None:
+        return username
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        return payload["username"]
     except jwt.ExpiredSignatureError:
-        logging.warning("⚠️ Token expired! Please log in again.")
+        log.warning("⚠️ Token expired! Please log in again.")
         return None
     except jwt.InvalidTokenError:
-        logging.warning("⚠️ Invalid token! Authentication failed.")
+        log.warning("⚠️ Invalid token! Authentication failed.")
         return None
 
+    if token_cache.is_revoked(token):
+        log.warning("⚠️ Revoked token! Authentication failed.")
+        return None
+    token_cache.put(token, payload["username"], payload["exp"])
+    return payload["username"]
+
+def revoke_token(token):
+    """Revoke a token (e.g. on logout) so verify_token rejects it before it expires."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return  # Expired or forged tokens are rejected anyway
+    token_cache.revoke(token, payload["exp"])
+
 import socket  # ✅ Import for getting IP
 
-def log_transaction(username, transaction_type, amount, status, transaction_id=None, receiver=None, sender_bank=None, receiver_bank=None):
+def _resolve_host_ip():
+    """Resolves this machine's IP once; log entries must never wait on DNS."""
+    try:
+        return socket.gethostbyname(socket.gethostname())
+    except OSError:
+        return "127.0.0.1"
+
+HOST_IP = _resolve_host_ip()
+
+def peer_ip(context):
+    """Extracts the client IP from a gRPC context's peer string (e.g. `ipv4:10.0.0.5:51234`)."""
+    peer = context.peer() if context is not None else ""
+    kind, _, address = unquote(peer).partition(":")  # IPv6 peers are percent-encoded
+    if kind == "ipv4":
+        return address.rsplit(":", 1)[0]
+    if kind == "ipv6":
+        return address.rsplit(":", 1)[0].strip("[]")
+    return address or HOST_IP  # e.g. `unix:/path` sockets
+
+def log_transaction(username, transaction_type, amount, status, transaction_id=None, receiver=None, sender_bank=None, receiver_bank=None, sender_ip=None):
     """Logs transaction details including sender IP and receiver."""
     
-    # Get sender's IP Address
-    sender_ip = socket.gethostbyname(socket.gethostname())  # ✅ Gets machine's local IP
-    
     # Ensure transaction_id is valid
     transaction_id = transaction_id or str(uuid.uuid4())
 
@@ -78,7 +166,8 @@ def log_transaction(username, transaction_type, amount, status, transaction_id=N
         "transaction_id": transaction_id,
         "username": username,  # ✅ Sender
         "receiver": receiver,  # ✅ Receiver (new)
-        "sender_ip": sender_ip,  # ✅ Sender's IP (new)
+        "sender_ip": sender_ip or HOST_IP,  # ✅ Client's IP from the RPC peer, if known
+        "host_ip": HOST_IP,  # ✅ Server that wrote the entry (resolved once at startup)
         "transaction_type": transaction_type,
         "amount": amount,
         "status": status,
@@ -86,11 +175,9 @@ def log_transaction(username, transaction_type, amount, status, transaction_id=N
         "receiver_bank": receiver_bank if receiver_bank else "N/A",
     }
 
-    try:
-        with open(LOG_FILE, "a") as file:
-            file.write(json.dumps(log_entry) + "\n")
-    except Exception as e:
-        logging.error(f"❌ Failed to write to log file: {e}")
+    transaction_log.write(log_entry)
+    TRANSACTIONS.labels(transaction_type, status_label(status)).inc()
 
-    # Print log to console for debugging
-    print(json.dumps(log_entry, indent=4))  # ✅ Pretty print log
+    # Keep replay detection in sync without waiting for the log to be re-read
+    if status.startswith("SUCCESS"):
+        record_successful_transaction(transaction_id)
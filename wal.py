@@ -0,0 +1,179 @@
+import abc
+import json
+import os
+import threading
+import time
+
+FSYNC_INTERVAL = 0.05  # Seconds between fsyncs of records nobody is waiting on
+COMPACT_AFTER = 100000  # Minimum records written before the log is rewritten with only live state
+
+class WriteAheadLog(abc.ABC):
+    """Append-only JSON-lines log with group-committed fsyncs and compaction.
+
+    Subclasses keep the live state in memory (`_reset`, `_apply`) and say how to
+    write it back out (`_snapshot`). Callers that pass `wait` return only once their
+    record is fsynced, and concurrent callers share one fsync; everything else is
+    fsynced in the background. Once the log holds more than `compact_after` records
+    (and twice the live state), the flusher thread atomically rewrites it with just the
+    live state, so recovery time does not grow with the log's history.
+    """
+
+    def __init__(self, log_file, fsync_interval=FSYNC_INTERVAL, compact_after=COMPACT_AFTER, durable=True):
+        self.log_file = log_file
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+        self.durable = durable
+        self.lock = threading.Lock()  # In-memory state and buffered writes
+        self.synced = threading.Condition(self.lock)
+        self.sync_lock = threading.Lock()  # One flush, fsync or compaction at a time
+        self.recovered = False
+        self.file = None
+        self.records = 0
+        self.valid_bytes = 0
+        self.written_seq = 0
+        self.synced_seq = 0
+        self.flusher = None
+        self.wake_flusher = False
+        self.compacting = None
+        self.recovery_stats = None
+
+    @abc.abstractmethod
+    def _reset(self):
+        """Clears the in-memory state before recovery."""
+
+    @abc.abstractmethod
+    def _apply(self, record):
+        """Applies one record to the in-memory state; raises ValueError for unknown records."""
+
+    @abc.abstractmethod
+    def _snapshot(self):
+        """Records that rebuild the current in-memory state."""
+
+    @abc.abstractmethod
+    def _live_size(self):
+        """Rough number of records `_snapshot` would write."""
+
+    def recover(self):
+        """Rebuilds the in-memory state from disk, stopping at a torn final record."""
+        with self.lock:
+            start = time.perf_counter()
+            self._reset()
+            records = 0
+            valid_bytes = 0
+            if os.path.exists(self.log_file):
+                with open(self.log_file, "rb") as f:
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break  # Torn write from a crash
+                        try:
+                            self._apply(json.loads(line))
+                        except (ValueError, IndexError):
+                            break
+                        valid_bytes += len(line)
+                        records += 1
+            self.records = records
+            self.valid_bytes = valid_bytes
+            self.recovered = True
+            self.recovery_stats = {"records": records, "seconds": time.perf_counter() - start}
+
+    def _append(self, record, wait):
+        """Writes a record; returns its sequence number for `wait_durable`."""
+        with self.lock:
+            if not self.recovered:
+                raise RuntimeError(f"{type(self).__name__}.recover() must be called before writing")
+            self._open()
+            line = (json.dumps(record) + "\n").encode()
+            self.file.write(line)
+            if self.compacting is not None:
+                self.compacting.append(line)
+            self._apply(record)
+            self.records += 1
+            self.written_seq += 1
+            seq = self.written_seq
+
+            if self._compaction_due():
+                self.wake_flusher = True  # The flusher compacts; appends never wait for a rewrite
+                self.synced.notify_all()
+
+            if wait:
+                self._wait(seq)
+            return seq
+
+    def _compaction_due(self):
+        # Scaling the threshold with the live state keeps amortized compaction cost per record constant
+        return self.compacting is None and self.records >= max(self.compact_after, 2 * self._live_size())
+
+    def wait_durable(self, seq):
+        """Blocks until every record up to `seq` is fsynced."""
+        with self.lock:
+            self._wait(seq)
+
+    def _wait(self, seq):
+        while self.durable and self.synced_seq < seq:
+            self.wake_flusher = True  # Sync now instead of at the next interval
+            self.synced.notify_all()
+            self.synced.wait()
+
+    def _open(self):
+        if self.file is None:
+            # Drop any torn tail so new appends don't land behind it
+            if os.path.exists(self.log_file) and os.path.getsize(self.log_file) != self.valid_bytes:
+                os.truncate(self.log_file, self.valid_bytes)
+            self.file = open(self.log_file, "ab")
+        if self.flusher is None:
+            self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self.flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            with self.lock:
+                if not self.wake_flusher:
+                    self.synced.wait(timeout=self.fsync_interval)
+                self.wake_flusher = False
+                compact = self._compaction_due()
+            self._sync()
+            if compact:
+                self._compact()
+
+    def sync(self):
+        """Flushes and fsyncs every record written so far."""
+        self._sync()
+
+    def _sync(self):
+        # Appenders only need `lock` to buffer a record, so they keep going while the flush and fsync run
+        with self.sync_lock:
+            with self.lock:
+                if self.file is None or self.synced_seq >= self.written_seq:
+                    return
+                seq, file = self.written_seq, self.file
+            file.flush()  # Buffered binary files lock internally, so this is safe alongside writes
+            if self.durable:
+                os.fsync(file.fileno())
+            with self.lock:
+                self.synced_seq = max(self.synced_seq, seq)
+                self.synced.notify_all()
+
+    def _compact(self):
+        """Atomically rewrites the log with only the live state, without holding up appends while it writes."""
+        with self.sync_lock:  # The file is swapped under the flusher's feet otherwise
+            with self.lock:
+                lines = [(json.dumps(record) + "\n").encode() for record in self._snapshot()]
+                seq = self.written_seq
+                self.compacting = []  # Records appended while the snapshot is written, to carry over
+            tmp_file = self.log_file + ".tmp"
+            with open(tmp_file, "wb") as f:
+                f.writelines(lines)
+                f.flush()
+                if self.durable:
+                    os.fsync(f.fileno())
+                with self.lock:
+                    # The carried-over tail is fsynced by the next sync, like any other new record
+                    tail, self.compacting = self.compacting, None
+                    f.writelines(tail)
+                    f.flush()
+                    self.file.close()
+                    os.replace(tmp_file, self.log_file)
+                    self.file = open(self.log_file, "ab")
+                    self.records = len(lines) + len(tail)
+                    self.synced_seq = max(self.synced_seq, seq)
+                    self.synced.notify_all()